@@ -1,4 +1,7 @@
+from typing import Optional
+
 from structlog import get_logger
+from gitential2.kvstore import KeyValueStore
 from gitential2.settings import GitentialSettings, BackendType
 from .base import GitentialBackend
 from .in_memory import InMemGitentialBackend
@@ -8,12 +11,12 @@ from .sql import SQLGitentialBackend
 logger = get_logger(__name__)
 
 
-def init_backend(settings: GitentialSettings) -> GitentialBackend:
+def init_backend(settings: GitentialSettings, kvstore: Optional[KeyValueStore] = None) -> GitentialBackend:
     if settings.backend == BackendType.in_memory:
         logger.debug("Creating in memory backend")
         return InMemGitentialBackend(settings)
     elif settings.backend == BackendType.sql:
         logger.debug("Creating SQL backend")
-        return SQLGitentialBackend(settings)
+        return SQLGitentialBackend(settings, kvstore=kvstore)
     else:
         raise ValueError("Cannot initialize backend")
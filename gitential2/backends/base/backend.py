@@ -1,11 +1,11 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import Tuple, Set, Optional
+from typing import Any, Tuple, Set, Optional
 
 import pandas as pd
 from ibis.expr.types import TableExpr
 
-from gitential2.datatypes.stats import IbisTables
+from gitential2.datatypes.stats import IbisPoolMetrics, IbisTables
 from gitential2.extraction.output import OutputHandler
 from gitential2.settings import GitentialSettings
 from .repositories import (
@@ -402,3 +402,11 @@ class GitentialBackend(ABC):
     @abstractmethod
     def get_ibis_table(self, workspace_id: int, source_name: str) -> TableExpr:
         pass
+
+    @abstractmethod
+    def execute_ibis_query(self, ibis_query: Any) -> Any:
+        pass
+
+    @abstractmethod
+    def get_ibis_pool_metrics(self) -> Optional[IbisPoolMetrics]:
+        pass
@@ -620,6 +620,12 @@ class ExtractedCommitBranchRepository(
     def delete_extracted_commit_branches(self, workspace_id: int, commit_ids: List[str]) -> int:
         pass
 
+    @abstractmethod
+    def delete_branches_of_repository(
+        self, workspace_id: int, repository_id: int, branches: Optional[List[str]] = None
+    ) -> int:
+        pass
+
 
 class ExtractedPatchRewriteRepository(
     RepoDFMixin,
@@ -805,6 +811,13 @@ class AuthorRepository(BaseWorkspaceScopedRepository[int, AuthorCreate, AuthorUp
     def get_by_name_pattern(self, workspace_id: int, author_name: str) -> List[AuthorInDB]:
         pass
 
+    @abstractmethod
+    def create_and_update_many(
+        self, workspace_id: int, authors_to_create: List[AuthorCreate], authors_to_update: Dict[int, AuthorUpdate]
+    ) -> Tuple[List[AuthorInDB], List[AuthorInDB]]:
+        """Creates and updates the authors in one transaction, returns the created and the updated authors
+        in the order of the arguments"""
+
 
 class TeamRepository(BaseWorkspaceScopedRepository[int, TeamCreate, TeamUpdate, TeamInDB]):
     @abstractmethod
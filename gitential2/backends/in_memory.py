@@ -1,7 +1,7 @@
 import datetime as dt
 from collections import defaultdict
 from threading import Lock
-from typing import Iterable, Optional, Callable, List, cast, Dict, Tuple, Union, Set
+from typing import Any, Iterable, Optional, Callable, List, cast, Dict, Tuple, Union, Set
 
 import pandas as pd
 from ibis.expr.types import TableExpr
@@ -41,7 +41,7 @@ from gitential2.datatypes.project_repositories import (
 from gitential2.datatypes.projects import ProjectCreate, ProjectUpdate, ProjectInDB
 from gitential2.datatypes.repositories import RepositoryCreate, RepositoryUpdate, RepositoryInDB
 from gitential2.datatypes.sprints import Sprint
-from gitential2.datatypes.stats import IbisTables
+from gitential2.datatypes.stats import IbisPoolMetrics, IbisTables
 from gitential2.datatypes.workspacemember import WorkspaceMemberCreate, WorkspaceMemberUpdate, WorkspaceMemberInDB
 from gitential2.extraction.output import DataCollector, OutputHandler
 from gitential2.settings import GitentialSettings
@@ -544,5 +544,11 @@ class InMemGitentialBackend(WithRepositoriesMixin, GitentialBackend):
     def get_ibis_table(self, workspace_id: int, source_name: str) -> TableExpr:
         return TableExpr(None)
 
+    def execute_ibis_query(self, ibis_query: Any) -> Any:
+        return ibis_query.execute()
+
+    def get_ibis_pool_metrics(self) -> Optional[IbisPoolMetrics]:
+        return None
+
     def get_commit_ids_for_repository(self, workspace_id: int, repository_id: int) -> Set[str]:
         return set()
@@ -1,7 +1,7 @@
 import json
 from datetime import datetime
 from threading import Lock
-from typing import Any, Tuple, Set, Optional, List
+from typing import Any, Dict, Tuple, Set, Optional, List
 
 import ibis
 import pandas as pd
@@ -52,12 +52,13 @@ from gitential2.datatypes.its_projects import ITSProjectInDB
 from gitential2.datatypes.project_its_projects import ProjectITSProjectInDB
 from gitential2.datatypes.pull_requests import PullRequest, PullRequestComment, PullRequestCommit, PullRequestLabel
 from gitential2.datatypes.reseller_codes import ResellerCode
-from gitential2.datatypes.stats import IbisTables
+from gitential2.datatypes.stats import IbisPoolMetrics, IbisTables
 from gitential2.datatypes.subscriptions import SubscriptionInDB
 from gitential2.datatypes.teammembers import TeamMemberInDB
 from gitential2.datatypes.teams import TeamInDB
 from gitential2.datatypes.workspace_invitations import WorkspaceInvitationInDB
 from gitential2.extraction.output import OutputHandler
+from gitential2.kvstore import KeyValueStore
 from gitential2.settings import GitentialSettings
 from .materialized_views import (
     _create_commits_v,
@@ -75,7 +76,10 @@ from .migrations import (
     migrate_workspace,
     delete_schema_revision,
 )
+from .copy import copy_upsert
+from .ibis_pool import IbisConnectionPool, create_ibis_pool_engine
 from .repositories import (
+    convert_times_to_utc,
     SQLAccessApprovalRepository,
     SQLAccessLogRepository,
     SQLAuthorRepository,
@@ -127,6 +131,7 @@ from .repositories_its import (
     SQLITSSprintRepository,
 )
 from .reset_workspace import reset_workspace
+from .schema_cache import workspace_schema_cache
 from .tables import (
     access_log_table,
     email_log_table,
@@ -142,7 +147,6 @@ from .tables import (
     workspace_members_table,
     metadata,
     subscriptions_table,
-    get_workspace_metadata,
     WorkspaceTableNames,
     MaterializedViewNames,
     auto_export_table,
@@ -168,9 +172,12 @@ def json_dumps(obj):
 
 
 class SQLGitentialBackend(WithRepositoriesMixin, GitentialBackend):
-    def __init__(self, settings: GitentialSettings):
+    def __init__(self, settings: GitentialSettings, kvstore: Optional[KeyValueStore] = None):
         super().__init__(settings)
+        if kvstore is not None:
+            workspace_schema_cache.share_revision(kvstore)
         self._ibis_conn = None
+        self._ibis_pool: Optional[IbisConnectionPool] = None
         self._ibis_lock = Lock()
         self._engine = sa.create_engine(
             settings.connections.database_url,
@@ -233,7 +240,7 @@ class SQLGitentialBackend(WithRepositoriesMixin, GitentialBackend):
             in_db_cls=UserITSProjectCacheInDB,
         )
 
-        self._workspace_tables, _ = get_workspace_metadata(schema=None)
+        self._workspace_tables, _ = workspace_schema_cache.get_metadata(schema=None)
 
         self._projects = SQLProjectRepository(
             table=self._workspace_tables.tables["projects"],
@@ -456,8 +463,9 @@ class SQLGitentialBackend(WithRepositoriesMixin, GitentialBackend):
     def initialize_workspace(self, workspace_id: int, workspace_duplicate: Optional[WorkspaceDuplicate] = None):
         schema_name = self._workspace_schema_name(workspace_id)
         self._engine.execute(f"CREATE SCHEMA IF NOT EXISTS {schema_name};")
+        workspace_schema_cache.invalidate(schema_name)
 
-        workspace_metadata, _ = get_workspace_metadata(schema_name)
+        workspace_metadata, _ = workspace_schema_cache.get_metadata(schema_name)
         workspace_metadata.create_all(self._engine)
 
         if workspace_duplicate:
@@ -473,6 +481,7 @@ class SQLGitentialBackend(WithRepositoriesMixin, GitentialBackend):
         schema_name = self._workspace_schema_name(workspace_id)
         query = f"DROP SCHEMA IF EXISTS {schema_name} CASCADE;"
         self._engine.execute(query)
+        workspace_schema_cache.invalidate(schema_name)
 
     def delete_workspace_sql(self, workspace_id: int):
         logger.info("Deleting rows for workspace in auto_export table...", workspace_id=workspace_id)
@@ -510,9 +519,11 @@ class SQLGitentialBackend(WithRepositoriesMixin, GitentialBackend):
 
     def migrate(self):
         migrate_database(self._engine, [w.id for w in self.workspaces.all()])
+        workspace_schema_cache.invalidate()
 
     def migrate_workspace(self, workspace_id: int):
         migrate_workspace(self._engine, workspace_id)
+        workspace_schema_cache.invalidate(self._workspace_schema_name(workspace_id))
 
     def reset_workspace(self, workspace_id: int):
         reset_workspace(engine=self._engine, workspace_id=workspace_id)
@@ -655,11 +666,19 @@ class SQLGitentialBackend(WithRepositoriesMixin, GitentialBackend):
             logger.exception("Collaborator workspace membership delete was unsuccessful.", user_id=user_id)
 
     def output_handler(self, workspace_id: int) -> OutputHandler:
+        # COPY is PostgreSQL only
+        if self.settings.output.bulk_copy and self._engine.dialect.name == "postgresql":
+            return BulkSQLOutputHandler(
+                workspace_id=workspace_id,
+                backend=self,
+                flush_rows=self.settings.output.flush_rows,
+                flush_bytes=self.settings.output.flush_memory_mb * 1024 * 1024,
+            )
         return SQLOutputHandler(workspace_id=workspace_id, backend=self)
 
     def get_commit_ids_for_repository(self, workspace_id: int, repository_id: int) -> Set[str]:
         schema_name = self._workspace_schema_name(workspace_id)
-        workspace_metadata, _ = get_workspace_metadata(schema_name)
+        workspace_metadata, _ = workspace_schema_cache.get_metadata(schema_name)
         extracted_commits_table = workspace_metadata.tables[f"{schema_name}.extracted_commits"]
         query = select([extracted_commits_table.c.commit_id]).where(extracted_commits_table.c.repo_id == repository_id)
         with self._engine.connect() as connection:
@@ -675,7 +694,7 @@ class SQLGitentialBackend(WithRepositoriesMixin, GitentialBackend):
         #     return df[df["repo_id"] == repo_id]
 
         schema_name = self._workspace_schema_name(workspace_id)
-        workspace_metadata, _ = get_workspace_metadata(schema_name)
+        workspace_metadata, _ = workspace_schema_cache.get_metadata(schema_name)
         extracted_commits_table = workspace_metadata.tables[f"{schema_name}.extracted_commits"]
         extracted_patches_table = workspace_metadata.tables[f"{schema_name}.extracted_patches"]
         extracted_patch_rewrites_table = workspace_metadata.tables[f"{schema_name}.extracted_patch_rewrites"]
@@ -757,38 +776,52 @@ class SQLGitentialBackend(WithRepositoriesMixin, GitentialBackend):
         return extracted_commits_df, extracted_patches_df, extracted_patch_rewrites_df, pull_request_commits_df
 
     def get_ibis_tables(self, workspace_id: int) -> Any:
-        with self._ibis_lock:
-            ibis_conn = self._get_ibis_conn()
-            # ibis_schema = ibis_conn.schema(self._workspace_schema_name(workspace_id))
-            # ret = IbisTables()
-            # ret.conn = ibis_conn
-            # ret.pull_requests = ibis_schema.pull_requests
-            # ret.commits = ibis_schema.calculated_commits
-            # ret.patches = ibis_schema.calculated_patches
-            # ret.authors = ibis_schema.authors
-            # ret.pull_request_comments = ibis_schema.pull_request_comments
-            ret = IbisTables()
-            ret.conn = ibis_conn
-            ret.pull_requests = ibis_conn.table("pull_requests", schema=self._workspace_schema_name(workspace_id))
-            ret.commits = ibis_conn.table("calculated_commits", schema=self._workspace_schema_name(workspace_id))
-            ret.patches = ibis_conn.table("calculated_patches", schema=self._workspace_schema_name(workspace_id))
-            ret.authors = ibis_conn.table("authors", schema=self._workspace_schema_name(workspace_id))
-            ret.pull_request_comments = ibis_conn.table(
-                "pull_request_comments", schema=self._workspace_schema_name(workspace_id)
-            )
-            ret.deploy_commits = ibis_conn.table("deploy_commits", schema=self._workspace_schema_name(workspace_id))
-            return ret
+        ret = IbisTables()
+        ret.conn = self._get_ibis_pool()
+        ret.pull_requests = self.get_ibis_table(workspace_id, "pull_requests")
+        ret.commits = self.get_ibis_table(workspace_id, "calculated_commits")
+        ret.patches = self.get_ibis_table(workspace_id, "calculated_patches")
+        ret.authors = self.get_ibis_table(workspace_id, "authors")
+        ret.pull_request_comments = self.get_ibis_table(workspace_id, "pull_request_comments")
+        ret.deploy_commits = self.get_ibis_table(workspace_id, "deploy_commits")
+        return ret
 
     def get_ibis_table(self, workspace_id: int, source_name: str) -> TableExpr:
+        return workspace_schema_cache.get_ibis_table(
+            self._workspace_schema_name(workspace_id), source_name, reflect=self._reflect_ibis_table
+        )
+
+    def execute_ibis_query(self, ibis_query: Any) -> Any:
+        # The data queries and exports are not limited by the timeout of the stats
+        return self._get_ibis_pool().execute(ibis_query, with_timeout=False)
+
+    def get_ibis_pool_metrics(self) -> Optional[IbisPoolMetrics]:
+        return self._get_ibis_pool().metrics()
+
+    def _reflect_ibis_table(self, table_name: str, schema: str) -> TableExpr:
+        # The reflection shares the metadata of the ibis client, the queries run on the pool without this lock
         with self._ibis_lock:
-            ibis_conn = self._get_ibis_conn()
-            return ibis_conn.table(source_name, schema=self._workspace_schema_name(workspace_id))
+            return self._get_ibis_conn().table(table_name, schema=schema)
 
     def _get_ibis_conn(self):
         if not self._ibis_conn:
             self._ibis_conn = ibis.postgres.connect(url=self.settings.connections.database_url)
         return self._ibis_conn
 
+    def _get_ibis_pool(self) -> IbisConnectionPool:
+        with self._ibis_lock:
+            if not self._ibis_pool:
+                database_url = self.settings.connections.database_url
+                if not database_url:
+                    raise ValueError("connections.database_url is required for the ibis connection pool")
+                self._ibis_pool = IbisConnectionPool(
+                    ibis_backend=self._get_ibis_conn(),
+                    engine=create_ibis_pool_engine(database_url, self.settings.stats),
+                    capacity=self.settings.stats.ibis_pool_size + self.settings.stats.ibis_pool_max_overflow,
+                    statement_timeout_seconds=self.settings.stats.query_timeout_seconds,
+                )
+            return self._ibis_pool
+
     def save_calculated_dataframes(
         self,
         workspace_id: int,
@@ -799,7 +832,7 @@ class SQLGitentialBackend(WithRepositoriesMixin, GitentialBackend):
         to_: datetime,
     ):
         schema_name = self._workspace_schema_name(workspace_id)
-        workspace_metadata, _ = get_workspace_metadata(schema_name)
+        workspace_metadata, _ = workspace_schema_cache.get_metadata(schema_name)
         calculated_commits_table = workspace_metadata.tables[f"{schema_name}.calculated_commits"]
         calculated_patches_table = workspace_metadata.tables[f"{schema_name}.calculated_patches"]
         # print(calculated_commits_table.delete().where(calculated_commits_table.c.repo_id == repository_id))
@@ -867,3 +900,98 @@ class SQLOutputHandler(OutputHandler):
             return kind_to_backend_repository[kind]
         else:
             raise ValueError("invalid kind")
+
+
+class BulkSQLOutputHandler(SQLOutputHandler):
+    """Buffers the rows by kind and writes them with COPY into staging tables, then merges them
+    into the workspace tables with one upsert per table, instead of an upsert and a read-back per row.
+
+    The buffer is flushed when it reaches the configured row count or estimated size,
+    the users of the handler have to call flush() at the end, or use it as a context manager.
+    """
+
+    # Types which cannot be written with the CSV formatting of COPY, these go row by row
+    UNSUPPORTED_COLUMN_TYPES = (sa.ARRAY, sa.LargeBinary)
+
+    def __init__(self, workspace_id: int, backend: "SQLGitentialBackend", flush_rows: int, flush_bytes: int):
+        super().__init__(workspace_id, backend)
+        self.flush_rows = flush_rows
+        self.flush_bytes = flush_bytes
+        # (kind, columns, updated columns) -> primary key -> row
+        self._buffer: Dict[Tuple[str, Tuple[str, ...], Tuple[str, ...]], Dict[tuple, tuple]] = {}
+        self._buffered_rows = 0
+        self._buffered_bytes = 0
+
+    def write(self, kind, value):
+        table = self._get_repository(kind).table
+        if not getattr(value, "id_", None) or not self._is_copy_supported(table):
+            return super().write(kind, value)
+
+        # Same values as create_or_update() would insert, and update on conflict
+        values_dict = convert_times_to_utc(value.dict(exclude_unset=True))
+        if "updated_at" in table.columns.keys() and "updated_at" not in values_dict:
+            values_dict["updated_at"] = datetime.utcnow()
+        primary_key_columns = [c.name for c in table.primary_key.columns]
+        updated_columns = tuple(
+            c.name for c in table.columns if c.name in values_dict and c.name not in primary_key_columns
+        )
+        for column in table.columns:
+            if column.name not in values_dict and column.default is not None and column.default.is_scalar:
+                values_dict[column.name] = column.default.arg
+            elif column.name not in values_dict and column.default is not None and column.default.is_callable:
+                values_dict[column.name] = column.default.arg(None)
+
+        columns = tuple(c.name for c in table.columns if c.name in values_dict)
+        row = tuple(values_dict[c] for c in columns)
+        primary_key = tuple(values_dict[c] for c in primary_key_columns)
+        # Upserting the same row twice in one statement is an error, the last version wins like before
+        self._buffer.setdefault((kind, columns, updated_columns), {})[primary_key] = row
+        self._buffered_rows += 1
+        self._buffered_bytes += sum(len(v) if isinstance(v, str) else 8 for v in row)
+        if self._buffered_rows >= self.flush_rows or self._buffered_bytes >= self.flush_bytes:
+            self.flush()
+        return value
+
+    def flush(self):
+        if not self._buffer:
+            return
+        buffer = self._buffer
+        self.clear()
+
+        engine = self.backend._engine  # pylint: disable=protected-access
+        dialect = engine.dialect
+        schema_name = get_schema_name(self.workspace_id)
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for (kind, columns, updated_columns), rows in buffer.items():
+                table = self._get_repository(kind).table
+                processors = [table.columns[c].type.bind_processor(dialect) for c in columns]
+                processed_rows = (
+                    [processor(v) if processor else v for processor, v in zip(processors, row)] for row in rows.values()
+                )
+                copy_upsert(
+                    cursor,
+                    dialect.identifier_preparer,
+                    schema_name,
+                    table,
+                    list(columns),
+                    list(updated_columns),
+                    processed_rows,
+                )
+                logger.debug("Bulk upserted rows", kind=kind, table=table.name, count=len(rows))
+            cursor.close()
+            connection.commit()
+        except:  # pylint: disable=bare-except
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def clear(self):
+        self._buffer = {}
+        self._buffered_rows = 0
+        self._buffered_bytes = 0
+
+    def _is_copy_supported(self, table: sa.Table) -> bool:
+        return not any(isinstance(c.type, self.UNSUPPORTED_COLUMN_TYPES) for c in table.columns)
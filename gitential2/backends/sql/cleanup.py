@@ -6,6 +6,8 @@ from structlog import get_logger
 from sqlalchemy import select, and_, exists
 
 from gitential2.core import GitentialContext
+from gitential2.core.branch_tips import delete_branch_tips
+from gitential2.core.stats_cache import bump_data_version
 from gitential2.datatypes.cli_v2 import CleanupType
 
 logger = get_logger(__name__)
@@ -90,6 +92,9 @@ def perform_data_cleanup(
                     repo_ids_to_delete,
                     CleaningGroup("commits"),
                 )
+                # The branch tips are not valid anymore without the deleted commit branches
+                for repository in g.backend.repositories.all(workspace_id):
+                    delete_branch_tips(g, workspace_id, repository.id)
         if cleanup_type in (CleanupType.full, CleanupType.pull_requests):
             if date_to or repo_ids_to_delete:
                 __remove_redundant_data(
@@ -118,6 +123,8 @@ def perform_data_cleanup(
                 )
             if cleanup_type == CleanupType.full:
                 __delete_repositories_or_itsp_projects(g, workspace_id, repo_ids_to_delete, itsp_ids_to_delete)
+        # The cached stats of the deleted data are not served anymore
+        bump_data_version(g, workspace_id)
 
 
 def __get_keys_to_be_deleted(
@@ -0,0 +1,71 @@
+import datetime as dt
+import io
+import math
+from itertools import count
+from typing import Any, Iterable, List, Sequence
+
+import sqlalchemy as sa
+
+_staging_table_counter = count()
+
+
+def format_csv_value(value: Any) -> str:
+    """Formats a value for COPY ... WITH (FORMAT csv): NULL is an unquoted empty string,
+    every other string is quoted, so an empty string stays an empty string."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return "NaN" if math.isnan(value) else repr(value)
+    if isinstance(value, dt.datetime):
+        value = value.isoformat(sep=" ")
+    elif isinstance(value, dt.date):
+        value = value.isoformat()
+    elif not isinstance(value, str):
+        value = str(value)
+    return '"' + value.replace('"', '""') + '"'
+
+
+def format_csv(rows: Iterable[Sequence[Any]]) -> io.StringIO:
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(",".join(format_csv_value(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+def copy_upsert(
+    cursor,
+    preparer: sa.sql.compiler.IdentifierPreparer,
+    schema: str,
+    table: sa.Table,
+    columns: List[str],
+    update_columns: List[str],
+    rows: Iterable[Sequence[Any]],
+):
+    """Streams the rows into a temporary staging table with COPY, then merges them into the
+    table with a single INSERT ... ON CONFLICT DO UPDATE statement.
+
+    Must be called in a transaction, the staging table is dropped when it's committed.
+    """
+    target = f"{preparer.quote_schema(schema)}.{preparer.quote(table.name)}"
+    staging = preparer.quote(f"staging_{table.name}_{next(_staging_table_counter)}")
+    column_list = ", ".join(preparer.quote(c) for c in columns)
+
+    cursor.execute(
+        f"CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS SELECT {column_list} FROM {target} WITH NO DATA"
+    )
+    cursor.copy_expert(f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv)", format_csv(rows))
+    if update_columns:
+        update_list = ", ".join(f"{preparer.quote(c)} = EXCLUDED.{preparer.quote(c)}" for c in update_columns)
+        on_conflict = f"DO UPDATE SET {update_list}"
+    else:
+        on_conflict = "DO NOTHING"
+    cursor.execute(
+        f"INSERT INTO {target} ({column_list}) SELECT {column_list} FROM {staging} "
+        f"ON CONFLICT ON CONSTRAINT {preparer.quote(table.name + '_pkey')} {on_conflict}"
+    )
@@ -0,0 +1,122 @@
+import time
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Iterator, Optional
+
+import pandas as pd
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection, Engine
+from structlog import get_logger
+
+from gitential2.datatypes.stats import IbisPoolMetrics
+from gitential2.settings import StatsSettings
+
+logger = get_logger(__name__)
+
+
+def create_ibis_pool_engine(database_url: str, stats_settings: StatsSettings) -> Engine:
+    return sa.create_engine(
+        database_url,
+        pool_size=stats_settings.ibis_pool_size,
+        max_overflow=stats_settings.ibis_pool_max_overflow,
+        pool_timeout=stats_settings.ibis_pool_timeout_seconds,
+        pool_pre_ping=True,
+    )
+
+
+class IbisConnectionPool:
+    """Executes ibis expressions on a connection checked out of a pool, one connection per query.
+
+    `ibis_backend` is only used for compiling the expressions and for the schemas of their results, the compiled
+    queries run on the connections of `engine`, so they are not serialized by a shared client.
+
+    The stats queries are stopped by the database after `statement_timeout_seconds`, so the ones the API gave
+    up waiting for don't keep a pooled connection. The other queries, e.g. the data exports, run without it.
+    """
+
+    def __init__(
+        self,
+        ibis_backend: Any,
+        engine: Engine,
+        capacity: Optional[int] = None,
+        statement_timeout_seconds: Optional[float] = None,
+    ):
+        self._ibis_backend = ibis_backend
+        self._engine = engine
+        # The pool size plus the max overflow of the engine, the pool itself doesn't tell the latter
+        self._capacity = capacity if capacity is not None else engine.pool.size()
+        self._statement_timeout_seconds = statement_timeout_seconds
+        self._metrics_lock = Lock()
+        self._waiting = 0
+        self._checkouts = 0
+        self._saturated_checkouts = 0
+        self._total_wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @contextmanager
+    def checkout(self) -> Iterator[Connection]:
+        with self._metrics_lock:
+            self._waiting += 1
+            saturated = self._engine.pool.checkedout() >= self.capacity
+        started_at = time.monotonic()
+        try:
+            connection = self._engine.connect()
+        finally:
+            wait_seconds = time.monotonic() - started_at
+            with self._metrics_lock:
+                self._waiting -= 1
+                self._checkouts += 1
+                self._saturated_checkouts += int(saturated)
+                self._total_wait_seconds += wait_seconds
+                self._max_wait_seconds = max(self._max_wait_seconds, wait_seconds)
+        logger.debug("Ibis connection checked out", wait_seconds=wait_seconds, saturated=saturated)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def execute(self, expr, limit: Optional[str] = "default", with_timeout: bool = True, params=None) -> Any:
+        with self.checkout() as connection:
+            if not with_timeout or not self._statement_timeout_seconds or connection.dialect.name != "postgresql":
+                return self._execute_on(connection, expr, limit=limit, params=params)
+            with connection.begin():
+                # Only for the transaction of this query, the connection goes back to the pool without it
+                statement_timeout_ms = int(self._statement_timeout_seconds * 1000)
+                connection.execute(f"SET LOCAL statement_timeout = {statement_timeout_ms}")
+                return self._execute_on(connection, expr, limit=limit, params=params)
+
+    def _execute_on(self, connection: Connection, expr, limit: Optional[str], params) -> Any:
+        query_ast = self._ibis_backend.compiler.to_ast_ensure_limit(expr, limit, params=params)
+        schema = self._ibis_backend.ast_schema(query_ast)
+        result_proxy = connection.execute(query_ast.compile())
+        try:
+            # The same conversion as the backend's own fetch, typed by the schema of the expression
+            result = schema.apply_to(
+                pd.DataFrame.from_records(result_proxy.fetchall(), columns=result_proxy.keys(), coerce_float=True)
+            )
+        finally:
+            result_proxy.close()
+        # The scalar and column expressions are unwrapped from the dataframe
+        dml = getattr(query_ast, "dml", query_ast)
+        return dml.result_handler(result) if hasattr(dml, "result_handler") else result
+
+    def metrics(self) -> IbisPoolMetrics:
+        pool = self._engine.pool
+        with self._metrics_lock:
+            checked_out = pool.checkedout()
+            return IbisPoolMetrics(
+                pool_size=pool.size(),
+                capacity=self.capacity,
+                checked_out=checked_out,
+                waiting=self._waiting,
+                saturation=checked_out / self.capacity if self.capacity else 0.0,
+                checkouts=self._checkouts,
+                saturated_checkouts=self._saturated_checkouts,
+                total_wait_seconds=self._total_wait_seconds,
+                max_wait_seconds=self._max_wait_seconds,
+                avg_wait_seconds=self._total_wait_seconds / self._checkouts if self._checkouts else 0.0,
+            )
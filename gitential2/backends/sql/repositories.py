@@ -1120,6 +1120,27 @@ class SQLAuthorRepository(AuthorRepository, SQLWorkspaceScopedRepository[int, Au
         rows = self._execute_query(query, workspace_id=workspace_id, callback_fn=fetchall_)
         return [AuthorInDB(**row) for row in rows]
 
+    def create_and_update_many(
+        self, workspace_id: int, authors_to_create: List[AuthorCreate], authors_to_update: Dict[int, AuthorUpdate]
+    ) -> Tuple[List[AuthorInDB], List[AuthorInDB]]:
+        created_ids: List[int] = []
+        with self._connection_with_schema(workspace_id) as connection:
+            with connection.begin():
+                for author_create in authors_to_create:
+                    insert_query = self.table.insert().values(**convert_times_to_utc(author_create.dict()))
+                    created_ids.append(connection.execute(insert_query).inserted_primary_key[0])
+                for id_, author_update in authors_to_update.items():
+                    update_query = (
+                        self.table.update()
+                        .where(self.identity(id_))
+                        .values(**convert_times_to_utc(author_update.dict(exclude_unset=True)))
+                    )
+                    connection.execute(update_query)
+                ids = created_ids + list(authors_to_update.keys())
+                rows = connection.execute(self.table.select().where(self.table.c.id.in_(ids))).fetchall() if ids else []
+        authors_by_id = {row["id"]: AuthorInDB(**row) for row in rows}
+        return [authors_by_id[id_] for id_ in created_ids], [authors_by_id[id_] for id_ in authors_to_update]
+
 
 class SQLTeamRepository(TeamRepository, SQLWorkspaceScopedRepository[int, TeamCreate, TeamUpdate, TeamInDB]):
     def get_teams_by_team_ids(self, workspace_id: int, team_ids: List[int]) -> List[TeamInDB]:
@@ -1290,6 +1311,17 @@ class SQLExtractedCommitBranchRepository(
             return self._execute_query(query, workspace_id=workspace_id, callback_fn=rowcount_)
         return 0
 
+    def delete_branches_of_repository(
+        self, workspace_id: int, repository_id: int, branches: Optional[List[str]] = None
+    ) -> int:
+        # Without the branches all the branches of the repository are deleted
+        query = self.table.delete().where(self.table.c.repo_id == repository_id)
+        if branches is not None:
+            if not is_list_not_empty(branches):
+                return 0
+            query = query.where(self.table.c.branch.in_(branches))
+        return self._execute_query(query, workspace_id=workspace_id, callback_fn=rowcount_)
+
 
 class SQLExtractedPatchRepository(
     SQLRepoDFMixin,
@@ -0,0 +1,103 @@
+import time
+from threading import RLock
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import sqlalchemy as sa
+from ibis.expr.types import TableExpr
+from structlog import get_logger
+
+from gitential2.kvstore import KeyValueStore
+from .tables import get_workspace_metadata
+
+logger = get_logger(__name__)
+
+# Bumped on every schema change, the processes sharing the kvstore drop their cached objects when it changes
+SCHEMA_REVISION_KEY = "workspace-schema-revision"
+SCHEMA_REVISION_CHECK_INTERVAL_SECONDS = 10
+
+
+class WorkspaceSchemaCache:
+    """Schema objects of the workspace schemas, built once per schema and shared by the whole process.
+
+    Both the SQLAlchemy metadata and the reflected ibis tables only change when the schema itself changes,
+    so the entries are dropped by the migrations and when a workspace is created or deleted. With a shared
+    kvstore the other processes drop all of their entries too, within SCHEMA_REVISION_CHECK_INTERVAL_SECONDS.
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._metadata: Dict[Optional[str], Tuple[sa.MetaData, Dict[Any, sa.Table]]] = {}
+        self._ibis_tables: Dict[Tuple[str, str], TableExpr] = {}
+        self._kvstore: Optional[KeyValueStore] = None
+        self._revision: Optional[int] = None
+        self._revision_checked_at = 0.0
+
+    def share_revision(self, kvstore: KeyValueStore):
+        """Keeps the cache in sync with the schema changes of the other processes using the same kvstore"""
+        with self._lock:
+            if self._kvstore is not kvstore:
+                self._kvstore = kvstore
+                self._revision_checked_at = 0.0
+
+    def get_metadata(self, schema: Optional[str] = None) -> Tuple[sa.MetaData, Dict[Any, sa.Table]]:
+        with self._lock:
+            self._check_revision()
+            if schema not in self._metadata:
+                self._metadata[schema] = get_workspace_metadata(schema)
+            return self._metadata[schema]
+
+    def get_ibis_table(self, schema: str, table_name: str, reflect: Callable[[str, str], TableExpr]) -> TableExpr:
+        key = (schema, table_name)
+        with self._lock:
+            self._check_revision()
+            table = self._ibis_tables.get(key)
+        if table is None:
+            # Reflecting outside of the lock, a concurrent duplicate reflection is cheaper than serializing them
+            table = reflect(table_name, schema)
+            with self._lock:
+                table = self._ibis_tables.setdefault(key, table)
+        return table
+
+    def invalidate(self, schema: Optional[str] = None):
+        """Drops the cached objects of a schema, or of every schema when it's not given"""
+        with self._lock:
+            if self._kvstore is None:
+                self._clear(schema)
+            else:
+                previous_revision = self._revision
+                revision = self._kvstore.increment_value(SCHEMA_REVISION_KEY)
+                if previous_revision is None or revision != previous_revision + 1:
+                    # The revisions in between are schema changes of other processes, not checked yet
+                    schema = None
+                self._clear(schema)
+                self._revision = revision
+                self._revision_checked_at = time.monotonic()
+        logger.debug("Workspace schema cache invalidated", schema=schema)
+
+    def _clear(self, schema: Optional[str] = None):
+        if schema is None:
+            self._metadata.clear()
+            self._ibis_tables.clear()
+        else:
+            self._metadata.pop(schema, None)
+            for key in [key for key in self._ibis_tables if key[0] == schema]:
+                del self._ibis_tables[key]
+
+    def _check_revision(self):
+        if (
+            self._kvstore is None
+            or time.monotonic() - self._revision_checked_at < SCHEMA_REVISION_CHECK_INTERVAL_SECONDS
+        ):
+            return
+        revision = self._kvstore.get_value(SCHEMA_REVISION_KEY)
+        # None is kept for the revision never read
+        revision = int(revision) if revision is not None else 0
+        self._revision_checked_at = time.monotonic()
+        if revision != self._revision:
+            # The changed schema is not known, another process migrated, created or deleted one
+            self._clear()
+            self._revision = revision
+            logger.info("Workspace schema cache invalidated by another process", revision=revision)
+
+
+workspace_schema_cache = WorkspaceSchemaCache()
@@ -11,10 +11,11 @@ from gitential2.core.api_keys import (
     create_workspace_api_key,
 )
 from gitential2.core.authors import fix_author_aliases, fix_author_names
-from gitential2.core.deduplication import deduplicate_authors
+from gitential2.core.deduplication import deduplicate_authors, deduplicate_changed_authors
 from gitential2.core.emails import send_email_to_user
 from gitential2.core.maintenance import maintenance
 from gitential2.core.quick_login import generate_quick_login
+from gitential2.core.stats_cache import bump_data_version
 from gitential2.core.tasks import configure_celery
 from gitential2.core.users import get_user
 from gitential2.logging import initialize_logging
@@ -123,6 +124,8 @@ def refresh_materialized_views(workspace_id: Optional[int] = typer.Argument(None
     def refresh_matview_in_workspaces(wid_list: List[int]):
         for wid in wid_list:
             result = g.backend.refresh_materialized_views_in_workspace(workspace_id=wid)
+            if result:
+                bump_data_version(g, wid)
             logger.info(
                 f"Refreshing materialized views in workspace was {'successful' if result else 'failed'}.",
                 workspace_id=wid,
@@ -155,11 +158,14 @@ def maintenance_():
 
 
 @app.command("deduplicate-authors")
-def deduplicate_authors_(workspace_id: int, dry_run: bool = False):
+def deduplicate_authors_(workspace_id: int, dry_run: bool = False, changed_only: bool = False):
     g = get_context()
     configure_celery(g.settings)
 
-    results = deduplicate_authors(g, workspace_id, dry_run)
+    if changed_only:
+        results = deduplicate_changed_authors(g, workspace_id, dry_run)
+    else:
+        results = deduplicate_authors(g, workspace_id, dry_run)
 
     for result in results:
 
@@ -17,6 +17,7 @@ def extract_branches(
     workspace_id: int,
     project_id: int,
     strategy: RefreshStrategy = RefreshStrategy.parallel,
+    force: bool = False,
 ):
     g = get_context()
     configure_celery(g.settings)
@@ -28,7 +29,8 @@ def extract_branches(
                 "workspace_id": workspace_id,
                 "project_id": project_id,
                 "strategy": strategy,
+                "force": force,
             },
         )
     else:
-        extract_project_branches(g, workspace_id, project_id, strategy=strategy)
+        extract_project_branches(g, workspace_id, project_id, strategy=strategy, force=force)
@@ -8,6 +8,8 @@ from gitential2.core.users import get_user
 from .common import get_context
 from ..backends.sql.cleanup import perform_data_cleanup
 from ..core.api_keys import delete_api_keys_for_workspace
+from ..core.branch_tips import delete_branch_tips
+from ..core.stats_cache import bump_data_version
 from ..core.workspace_common import duplicate_workspace
 from ..datatypes import UserInDB, WorkspaceMemberInDB
 from ..datatypes.cli_v2 import ResetType, CleanupType
@@ -38,10 +40,14 @@ def reset_workspace(workspace_id: int, reset_type: ResetType = typer.Option("ful
         if workspace:
             if reset_type in (ResetType.full, ResetType.sql_only):
                 logger.info("Starting to truncate all of the tables for workspace!", workspace_id=workspace.id)
+                for repository in g.backend.repositories.all(workspace_id):
+                    delete_branch_tips(g, workspace_id, repository.id)
                 g.backend.reset_workspace(workspace_id=workspace_id)
             if reset_type in (ResetType.full, ResetType.redis_only):
                 logger.info("Starting to remove all data from Redis related to workspace!", workspace_id=workspace.id)
                 g.kvstore.delete_values_for_workspace(workspace_id=workspace_id)
+            # The cached stats of the truncated data are not served anymore
+            bump_data_version(g, workspace_id)
         else:
             logger.exception("Failed to reset workspace! Workspace not found by the provided workspace id!")
 
@@ -1,6 +1,7 @@
 from typing import List, Optional
 from gitential2.datatypes.access_approvals import AccessApprovalCreate, AccessApprovalInDB
 
+from gitential2.datatypes.stats import IbisPoolMetrics
 from gitential2.datatypes.users import UserInAdminRepr, UserInDB
 from .context import GitentialContext
 from .users import list_users
@@ -46,3 +47,7 @@ def admin_create_access_approval(
     access_approval_create.created_at = g.current_time()
     print(access_approval_create, access_approval_create.dict())
     return g.backend.access_approvals.create(access_approval_create)
+
+
+def admin_get_ibis_pool_metrics(g: GitentialContext) -> Optional[IbisPoolMetrics]:
+    return g.backend.get_ibis_pool_metrics()
@@ -0,0 +1,119 @@
+import json
+from typing import Dict, Iterable, List, Optional, cast
+
+from structlog import get_logger
+
+from gitential2.datatypes.authors import AuthorAlias, AuthorInDB
+from .context import GitentialContext
+
+logger = get_logger(__name__)
+
+_BUILD_BATCH_SIZE = 1000
+# The index is rebuilt periodically, so the authors written directly to the database are picked up too
+_INDEX_BUILT_TTL_SECONDS = 24 * 60 * 60
+
+
+def _aliases_key(workspace_id: int) -> str:
+    # alias field -> author id
+    return f"ws-{workspace_id}:author-aliases"
+
+
+def _authors_key(workspace_id: int) -> str:
+    # author id -> author
+    return f"ws-{workspace_id}:author-records"
+
+
+def _built_key(workspace_id: int) -> str:
+    return f"ws-{workspace_id}:author-aliases-built"
+
+
+def alias_field(alias: AuthorAlias) -> str:
+    # An alias resolves to the author having exactly the same alias
+    return json.dumps([alias.name, alias.email, alias.login])
+
+
+def _alias_fields(author: AuthorInDB) -> List[str]:
+    return [alias_field(alias) for alias in author.aliases or [] if not alias.is_empty()]
+
+
+def _ensure_built(g: GitentialContext, workspace_id: int):
+    if g.kvstore.get_value(_built_key(workspace_id)):
+        return
+    reset_alias_index(g, workspace_id)
+    authors = list(g.backend.authors.all(workspace_id))
+    for start in range(0, len(authors), _BUILD_BATCH_SIZE):
+        _set_authors(g, workspace_id, authors[start : start + _BUILD_BATCH_SIZE])
+    g.kvstore.set_value(_built_key(workspace_id), 1, ex=_INDEX_BUILT_TTL_SECONDS)
+    logger.info("Built author alias index", workspace_id=workspace_id, authors=len(authors))
+
+
+def _set_authors(g: GitentialContext, workspace_id: int, authors: List[AuthorInDB]):
+    g.kvstore.set_hash_values(
+        _aliases_key(workspace_id), {field: author.id for author in authors for field in _alias_fields(author)}
+    )
+    g.kvstore.set_hash_values(_authors_key(workspace_id), {str(author.id): author.dict() for author in authors})
+
+
+def get_authors_by_aliases(
+    g: GitentialContext, workspace_id: int, aliases: List[AuthorAlias]
+) -> List[Optional[AuthorInDB]]:
+    """The author of every alias, None if no author has exactly that alias.
+
+    An alias is looked up by its own hash field, the index is built on the first lookup after a reset or expiry.
+    """
+    # The fields left from an expired index are not updated anymore, these are rebuilt before reading
+    _ensure_built(g, workspace_id)
+    author_ids = g.kvstore.get_hash_values(_aliases_key(workspace_id), [alias_field(alias) for alias in aliases])
+    authors = {author.id: author for author in _get_authors(g, workspace_id, [cast(int, i) for i in author_ids if i])}
+    return [authors.get(cast(int, author_id)) if author_id else None for author_id in author_ids]
+
+
+def get_author_by_alias(g: GitentialContext, workspace_id: int, alias: AuthorAlias) -> Optional[AuthorInDB]:
+    return get_authors_by_aliases(g, workspace_id, [alias])[0]
+
+
+def get_indexed_authors(g: GitentialContext, workspace_id: int, author_ids: Iterable[int]) -> List[AuthorInDB]:
+    """The authors with the given ids, the deleted ones are skipped"""
+    author_ids = list(author_ids)
+    if not author_ids:
+        return []
+    _ensure_built(g, workspace_id)
+    return _get_authors(g, workspace_id, author_ids)
+
+
+def _get_authors(g: GitentialContext, workspace_id: int, author_ids: Iterable[int]) -> List[AuthorInDB]:
+    author_ids = sorted(set(author_ids))
+    if not author_ids:
+        return []
+    values = g.kvstore.get_hash_values(_authors_key(workspace_id), [str(author_id) for author_id in author_ids])
+    return [AuthorInDB(**cast(dict, value)) for value in values if value]
+
+
+def add_authors_to_alias_index(g: GitentialContext, workspace_id: int, authors: Iterable[AuthorInDB]):
+    """Adds the new authors or the new state of the updated ones. The caller holds the authors_change_lock."""
+    if g.kvstore.get_value(_built_key(workspace_id)):
+        _set_authors(g, workspace_id, list(authors))
+
+
+def remove_authors_from_alias_index(g: GitentialContext, workspace_id: int, authors: Iterable[AuthorInDB]):
+    """Removes the deleted authors or the previous state of the updated ones. The caller holds the
+    authors_change_lock."""
+    if not g.kvstore.get_value(_built_key(workspace_id)):
+        return
+    authors = list(authors)
+    fields = [field for author in authors for field in _alias_fields(author)]
+    indexed_author_ids = g.kvstore.get_hash_values(_aliases_key(workspace_id), fields)
+    author_id_by_field: Dict[str, int] = {field: author.id for author in authors for field in _alias_fields(author)}
+    # An alias can be recorded for another author too, only the fields pointing to these authors are removed
+    g.kvstore.delete_hash_values(
+        _aliases_key(workspace_id),
+        [field for field, author_id in zip(fields, indexed_author_ids) if author_id == author_id_by_field[field]],
+    )
+    g.kvstore.delete_hash_values(_authors_key(workspace_id), [str(author.id) for author in authors])
+
+
+def reset_alias_index(g: GitentialContext, workspace_id: int):
+    """The next lookup rebuilds the index"""
+    g.kvstore.delete_value(_built_key(workspace_id))
+    g.kvstore.delete_value(_aliases_key(workspace_id))
+    g.kvstore.delete_value(_authors_key(workspace_id))
@@ -0,0 +1,304 @@
+import math
+import re
+import zlib
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union, cast
+
+from structlog import get_logger
+from unidecode import unidecode
+
+from gitential2.datatypes.authors import AuthorAlias, AuthorInDB
+from gitential2.kvstore import JsonableType
+from gitential2.utils import levenshtein_ratio
+from .context import GitentialContext
+
+logger = get_logger(__name__)
+
+# Two alias tokens are similar above this levenshtein_ratio
+TOKEN_SIMILARITY_THRESHOLD = 0.8
+_NGRAM_SIZE = 3
+
+# The index is rebuilt periodically, so the posting lists of the removed aliases don't grow forever
+_INDEX_BUILT_TTL_SECONDS = 7 * 24 * 60 * 60
+_BUILD_BATCH_SIZE = 1000
+
+# The posting list of an n-gram of more authors than this, e.g. "son", is kept apart from the others,
+# it is only read for the aliases having that n-gram
+MAX_AUTHORS_PER_NGRAM = 100
+_COMMON_NGRAM = "common"
+
+_COMMON_WORDS = ["mail", "info", "noreply", "email", "user", "test", "github", "github com"]
+
+Ngram = Tuple[str, int]
+
+
+def tokenize_alias(alias: AuthorAlias) -> List[str]:
+    def _tokenize_str(s: str) -> str:
+        _lower_ascii = unidecode(s.lower())
+        _replaced_special = re.sub(r"\W+", " ", _lower_ascii)
+        _splitted = _replaced_special.split()
+        return " ".join(sorted(_splitted))
+
+    def _remove_duplicates(l: List[str]) -> List[str]:
+        ret = []
+        for s in l:
+            if s not in ret:
+                ret.append(s)
+        return ret
+
+    def _remove_common_words(l: List[str]) -> List[str]:
+        return [s for s in l if s not in _COMMON_WORDS]
+
+    ret = []
+    if alias.name:
+        ret.append(_tokenize_str(alias.name))
+    if alias.email:
+        email_first_part = _tokenize_str(alias.email.split("@")[0])
+        if len(_remove_common_words(email_first_part.split())) > 1 or len(email_first_part) >= 10:
+            ret.append(email_first_part)
+    if alias.login:
+        ret.append(_tokenize_str(alias.login))
+    ret = _remove_common_words(_remove_duplicates(ret))
+    # logger.debug("Tokenized alias", alias=alias, tokens=ret)
+    return ret
+
+
+def _max_distance(length: int) -> int:
+    # The largest distance with a levenshtein_ratio above the threshold, length is the longer string's
+    distance = math.ceil((1 - TOKEN_SIMILARITY_THRESHOLD) * length)
+    while distance > 0 and 1.0 - (distance / length) <= TOKEN_SIMILARITY_THRESHOLD:
+        distance -= 1
+    return distance
+
+
+def _min_shared_ngrams(length: int) -> int:
+    # Every edit changes at most _NGRAM_SIZE of the n-grams of the longer string
+    return length - _NGRAM_SIZE + 1 - _NGRAM_SIZE * _max_distance(length)
+
+
+def _ngrams(token: str) -> List[Ngram]:
+    # The repeated n-grams are numbered, so the shared n-grams are counted as a multiset
+    seen: Counter = Counter()
+    ret = []
+    for start in range(len(token) - _NGRAM_SIZE + 1):
+        ngram = token[start : start + _NGRAM_SIZE]
+        ret.append((ngram, seen[ngram]))
+        seen[ngram] += 1
+    return ret
+
+
+def _prefix_ngrams(token: str, order_key: Callable[[Ngram], tuple]) -> List[Ngram]:
+    """The first n-grams of the token in the order of order_key, two similar tokens share at least one of them.
+
+    A similar token pair shares at least _min_shared_ngrams n-grams, so the n-grams after the prefix cannot hold
+    all the shared ones (prefix filtering). Any order works, the same one has to be used for every token.
+    """
+    ngrams = sorted(_ngrams(token), key=order_key)
+    # The longer token of a similar pair is at most this long, its required shared n-gram count is the lowest
+    max_partner_length = int(len(token) / TOKEN_SIMILARITY_THRESHOLD) + 1
+    min_shared = min(_min_shared_ngrams(length) for length in range(len(token), max_partner_length + 1))
+    return ngrams[: max(len(ngrams) - max(min_shared, 1) + 1, 1)]
+
+
+def find_similar_tokens(tokens: List[str]) -> Iterable[Tuple[str, str]]:
+    """The pairs of different tokens with a levenshtein_ratio above the threshold.
+
+    The n-grams are ordered by their frequency, so the prefixes hold the rarest n-grams, and only the tokens
+    sharing one of those are compared.
+    """
+    long_tokens = [token for token in tokens if len(token) >= _NGRAM_SIZE]
+    frequencies = Counter(ngram for token in long_tokens for ngram in _ngrams(token))
+
+    index: Dict[Ngram, List[str]] = defaultdict(list)
+    for token in sorted(long_tokens, key=len):
+        candidates: Set[str] = set()
+        for ngram in _prefix_ngrams(token, lambda ngram: (frequencies[ngram], ngram)):
+            candidates.update(index[ngram])
+            index[ngram].append(token)
+        for candidate in candidates:
+            if levenshtein_ratio(candidate, token) > TOKEN_SIMILARITY_THRESHOLD:
+                yield candidate, token
+
+
+def _stable_order(ngram: Ngram) -> tuple:
+    # The persisted signatures need an order which doesn't depend on the other tokens
+    return (zlib.crc32(ngram[0].encode("utf-8")), ngram)
+
+
+def alias_signatures(alias: AuthorAlias) -> Set[str]:
+    """The blocking keys of an alias, a matching alias (see aliases_matching) shares at least one of them"""
+    ret = set()
+    if alias.email:
+        ret.add(f"email:{alias.email}")
+    if alias.login:
+        ret.add(f"login:{alias.login}")
+    for token in tokenize_alias(alias):
+        if token:
+            # The tokens shorter than an n-gram are similar only to themselves
+            ret.add(f"token:{token}")
+            ret.update(f"ngram:{ngram}:{n}" for ngram, n in _prefix_ngrams(token, _stable_order))
+    return ret
+
+
+def _author_signatures(author: AuthorInDB) -> Set[str]:
+    return set().union(*(alias_signatures(alias) for alias in author.aliases))
+
+
+def _index_version_key(workspace_id: int) -> str:
+    return f"ws-{workspace_id}:author-similarity-version"
+
+
+def _index_key(workspace_id: int, version: int) -> str:
+    # signature -> author ids
+    return f"ws-{workspace_id}:author-similarity-v{version}"
+
+
+def _common_index_key(workspace_id: int, version: int) -> str:
+    # signature -> author ids, for the signatures stored as _COMMON_NGRAM in the index
+    return f"ws-{workspace_id}:author-similarity-v{version}-common"
+
+
+def _built_key(workspace_id: int, version: int) -> str:
+    return f"ws-{workspace_id}:author-similarity-v{version}-built"
+
+
+def _get_index_version(g: GitentialContext, workspace_id: int):
+    version = g.kvstore.get_value(_index_version_key(workspace_id))
+    if version is not None and g.kvstore.get_value(_built_key(workspace_id, int(cast(int, version)))):
+        return int(cast(int, version))
+    return None
+
+
+def _posting_list(signature: str, author_ids: List[int]) -> Union[List[int], str]:
+    if signature.startswith("ngram:") and len(author_ids) > MAX_AUTHORS_PER_NGRAM:
+        return _COMMON_NGRAM
+    return author_ids
+
+
+def _set_posting_lists(g: GitentialContext, workspace_id: int, version: int, posting_lists: Dict[str, List[int]]):
+    index_values: Dict[str, JsonableType] = {
+        signature: _posting_list(signature, author_ids) for signature, author_ids in posting_lists.items()
+    }
+    common_values: Dict[str, JsonableType] = {
+        signature: posting_lists[signature] for signature, value in index_values.items() if value == _COMMON_NGRAM
+    }
+    g.kvstore.set_hash_values(_index_key(workspace_id, version), index_values)
+    if common_values:
+        g.kvstore.set_hash_values(_common_index_key(workspace_id, version), common_values)
+
+
+def _build_index(g: GitentialContext, workspace_id: int) -> int:
+    # Built in a new version, the previous one is dropped
+    previous_version = g.kvstore.get_value(_index_version_key(workspace_id))
+    version = g.kvstore.increment_value(_index_version_key(workspace_id))
+    if previous_version is not None:
+        g.kvstore.delete_value(_index_key(workspace_id, int(cast(int, previous_version))))
+        g.kvstore.delete_value(_common_index_key(workspace_id, int(cast(int, previous_version))))
+    index: Dict[str, List[int]] = defaultdict(list)
+    for author in g.backend.authors.all(workspace_id):
+        for signature in _author_signatures(author):
+            index[signature].append(author.id)
+    signatures = list(index.keys())
+    for start in range(0, len(signatures), _BUILD_BATCH_SIZE):
+        _set_posting_lists(
+            g,
+            workspace_id,
+            version,
+            {signature: index[signature] for signature in signatures[start : start + _BUILD_BATCH_SIZE]},
+        )
+    g.kvstore.set_value(_built_key(workspace_id, version), 1, ex=_INDEX_BUILT_TTL_SECONDS)
+    logger.info("Built author similarity index", workspace_id=workspace_id, version=version, signatures=len(index))
+    return version
+
+
+def get_similar_author_ids(g: GitentialContext, workspace_id: int, aliases: Iterable[AuthorAlias]) -> Set[int]:
+    """The ids of the authors possibly matching any of the aliases, a superset of the matching ones.
+
+    The index is built on the first query after a reset. The caller holds the authors_change_lock.
+    """
+    version = _get_index_version(g, workspace_id)
+    if version is None:
+        version = _build_index(g, workspace_id)
+    signatures = list(set().union(*(alias_signatures(alias) for alias in aliases)))
+    posting_lists = _get_posting_lists(g, workspace_id, version, signatures)
+    if posting_lists is None:
+        # Built without the full posting lists of the common n-grams
+        posting_lists = _get_posting_lists(g, workspace_id, _build_index(g, workspace_id), signatures) or {}
+    return set().union(*posting_lists.values())
+
+
+def _get_posting_lists(
+    g: GitentialContext, workspace_id: int, version: int, signatures: List[str]
+) -> Optional[Dict[str, List[int]]]:
+    """The author ids of the signatures in the index, None when the full list of a common n-gram is missing"""
+    values = dict(zip(signatures, g.kvstore.get_hash_values(_index_key(workspace_id, version), signatures)))
+    common_signatures = [signature for signature, value in values.items() if value == _COMMON_NGRAM]
+    if common_signatures:
+        common_values = g.kvstore.get_hash_values(_common_index_key(workspace_id, version), common_signatures)
+        if not all(isinstance(value, list) for value in common_values):
+            return None
+        values.update(zip(common_signatures, common_values))
+    return {signature: cast(List[int], value) for signature, value in values.items() if isinstance(value, list)}
+
+
+def add_authors_to_similarity_index(g: GitentialContext, workspace_id: int, authors: Iterable[AuthorInDB]):
+    """Adds the new authors and the new aliases of the existing ones. The caller holds the authors_change_lock."""
+    version = _get_index_version(g, workspace_id)
+    if version is None:
+        # The next query builds the index with these authors
+        return
+    new_author_ids: Dict[str, List[int]] = defaultdict(list)
+    for author in authors:
+        for signature in _author_signatures(author):
+            new_author_ids[signature].append(author.id)
+    signatures = list(new_author_ids.keys())
+    if not signatures:
+        return
+    posting_lists = _get_posting_lists(g, workspace_id, version, signatures)
+    if posting_lists is None:
+        # The next query rebuilds the index with these authors
+        reset_similarity_index(g, workspace_id)
+        return
+    updates: Dict[str, List[int]] = {}
+    for signature in signatures:
+        author_ids = posting_lists.get(signature, [])
+        missing = [author_id for author_id in new_author_ids[signature] if author_id not in author_ids]
+        if missing:
+            updates[signature] = author_ids + missing
+    if updates:
+        _set_posting_lists(g, workspace_id, version, updates)
+
+
+def reset_similarity_index(g: GitentialContext, workspace_id: int):
+    """Needed after removing aliases or authors, the next query rebuilds the index"""
+    version = g.kvstore.get_value(_index_version_key(workspace_id))
+    if version is not None:
+        g.kvstore.delete_value(_built_key(workspace_id, int(cast(int, version))))
+        g.kvstore.delete_value(_index_key(workspace_id, int(cast(int, version))))
+        g.kvstore.delete_value(_common_index_key(workspace_id, int(cast(int, version))))
+
+
+def _authors_to_deduplicate_key(workspace_id: int) -> str:
+    return f"ws-{workspace_id}:authors-to-deduplicate"
+
+
+def get_authors_to_deduplicate(g: GitentialContext, workspace_id: int) -> Set[int]:
+    value = g.kvstore.get_value(_authors_to_deduplicate_key(workspace_id))
+    return set(value) if isinstance(value, list) else set()
+
+
+def add_authors_to_deduplicate(g: GitentialContext, workspace_id: int, author_ids: Iterable[int]):
+    """The authors got new aliases, these may match other authors now. The caller holds the authors_change_lock."""
+    author_ids = set(author_ids)
+    if author_ids:
+        to_deduplicate = get_authors_to_deduplicate(g, workspace_id) | author_ids
+        g.kvstore.set_value(_authors_to_deduplicate_key(workspace_id), sorted(to_deduplicate))
+
+
+def remove_authors_to_deduplicate(g: GitentialContext, workspace_id: int, author_ids: Iterable[int]):
+    """The caller holds the authors_change_lock"""
+    to_deduplicate = get_authors_to_deduplicate(g, workspace_id) - set(author_ids)
+    if to_deduplicate:
+        g.kvstore.set_value(_authors_to_deduplicate_key(workspace_id), sorted(to_deduplicate))
+    else:
+        g.kvstore.delete_value(_authors_to_deduplicate_key(workspace_id))
@@ -1,10 +1,8 @@
 import contextlib
-import re
 from itertools import product
 from typing import Iterable, Dict, List, Optional, cast, Tuple, Union
 
 from structlog import get_logger
-from unidecode import unidecode
 
 from gitential2.datatypes.authors import (
     AuthorAlias,
@@ -14,13 +12,33 @@ from gitential2.datatypes.authors import (
     AuthorNamesAndEmails,
 )
 from gitential2.utils import levenshtein_ratio, is_list_not_empty, is_email_valid, is_string_not_empty
+from .alias_index import (
+    add_authors_to_alias_index,
+    get_author_by_alias,
+    get_authors_by_aliases,
+    get_indexed_authors,
+    remove_authors_from_alias_index,
+    reset_alias_index,
+)
+from .author_similarity import (
+    TOKEN_SIMILARITY_THRESHOLD,
+    add_authors_to_deduplicate,
+    add_authors_to_similarity_index,
+    get_similar_author_ids,
+    reset_similarity_index,
+    tokenize_alias,
+)
+from .calculation_intervals import mark_all_intervals_dirty
 from .context import GitentialContext
+from .stats_cache import bump_data_version
 from ..datatypes.teammembers import TeamMemberInDB
 from ..datatypes.teams import TeamInDB
 from ..exceptions import NotFoundException
 
 logger = get_logger(__name__)
 
+AliasKey = Tuple[Optional[str], Optional[str], Optional[str]]
+
 
 def list_active_authors(g: GitentialContext, workspace_id: int) -> List[AuthorInDB]:
     return [author for author in list_authors(g, workspace_id) if author.active]
@@ -91,8 +109,11 @@ def update_author(g: GitentialContext, workspace_id: int, author_id: int, author
     # existing_author = g.backend.authors.get_or_error(workspace_id, author_id)
     logger.debug("Updating author.", workspace_id=workspace_id, author_id=author_id, author_update=author_update)
     with authors_change_lock(g, workspace_id):
-        _reset_all_authors_from_cache(g, workspace_id)
-        return g.backend.authors.update(workspace_id, author_id, author_update)
+        previous = g.backend.authors.get(workspace_id, author_id)
+        updated = g.backend.authors.update(workspace_id, author_id, author_update)
+        _authors_changed(g, workspace_id, changed=[updated], previous=[previous] if previous else [])
+        _author_ids_changed(g, workspace_id)
+        return updated
 
 
 def merge_authors(g: GitentialContext, workspace_id: int, authors: List[AuthorInDB]) -> AuthorInDB:
@@ -105,12 +126,14 @@ def merge_authors(g: GitentialContext, workspace_id: int, authors: List[AuthorIn
             # delete_author(g, workspace_id, other.id)
             author_ids_to_be_deleted.append(other.id)
         author_update.aliases = _remove_duplicate_aliases(author_update.aliases)
-        _reset_all_authors_from_cache(g, workspace_id)
 
     # delete function has been taken out of the with block due lock error - not able to acquire lock
     for author_id in author_ids_to_be_deleted:
         delete_author(g, workspace_id, author_id)
-    return g.backend.authors.update(workspace_id, first.id, author_update)
+    with authors_change_lock(g, workspace_id):
+        merged = g.backend.authors.update(workspace_id, first.id, author_update)
+        _authors_changed(g, workspace_id, changed=[merged], previous=[first])
+    return merged
 
 
 def retrieve_and_merge_authors_by_id(g: GitentialContext, workspace_id: int, author_ids: List[int]) -> AuthorInDB:
@@ -137,13 +160,19 @@ def delete_author(g: GitentialContext, workspace_id: int, author_id: int) -> int
         team_ids = g.backend.team_members.get_author_team_ids(workspace_id, author_id)
         for team_id in team_ids:
             g.backend.team_members.remove_members_from_team(workspace_id, team_id, [author_id])
-        _reset_all_authors_from_cache(g, workspace_id)
-        return g.backend.authors.delete(workspace_id, author_id)
+        previous = g.backend.authors.get(workspace_id, author_id)
+        deleted = g.backend.authors.delete(workspace_id, author_id)
+        _authors_changed(g, workspace_id, previous=[previous] if previous else [])
+        _author_ids_changed(g, workspace_id)
+        return deleted
 
 
 def create_author(g: GitentialContext, workspace_id: int, author_create: AuthorCreate):
-    _reset_all_authors_from_cache(g, workspace_id)
-    return g.backend.authors.create(workspace_id, author_create)
+    with authors_change_lock(g, workspace_id):
+        created = g.backend.authors.create(workspace_id, author_create)
+        _authors_changed(g, workspace_id, changed=[created])
+        _author_ids_changed(g, workspace_id)
+        return created
 
 
 def get_author(g: GitentialContext, workspace_id: int, author_id: int) -> Optional[AuthorInDB]:
@@ -171,7 +200,7 @@ def fix_author_names(g: GitentialContext, workspace_id: int):
                 g.backend.authors.update(workspace_id, author.id, cast(AuthorUpdate, author))
                 fixed_count += 1
         if fixed_count > 0:
-            _reset_all_authors_from_cache(g, workspace_id)
+            reset_author_indexes(g, workspace_id)
 
 
 def fix_author_aliases(g: GitentialContext, workspace_id: int):
@@ -185,54 +214,146 @@ def fix_author_aliases(g: GitentialContext, workspace_id: int):
                 logger.info("Fixed author aliases", workspace_id=workspace_id, author=author)
                 fixed_count += 1
         if fixed_count > 0:
-            _reset_all_authors_from_cache(g, workspace_id)
+            reset_author_indexes(g, workspace_id)
 
 
-def _get_all_authors_from_cache(g: GitentialContext, workspace_id: int) -> List[AuthorInDB]:
-    def _to_list(authors: List[AuthorInDB]) -> List[dict]:
-        return [a.dict() for a in authors]
+def _authors_changed(
+    g: GitentialContext,
+    workspace_id: int,
+    changed: Iterable[AuthorInDB] = (),
+    previous: Iterable[AuthorInDB] = (),
+):
+    """Updates the author indexes, previous holds the deleted authors and the previous state of the changed ones.
 
-    def _from_list(l: list) -> List[AuthorInDB]:
-        return [AuthorInDB(**author_dict) for author_dict in l]
+    The caller holds the authors_change_lock.
+    """
+    changed = list(changed)
+    # the stats are joined with the authors
+    bump_data_version(g, workspace_id)
+    remove_authors_from_alias_index(g, workspace_id, previous)
+    add_authors_to_alias_index(g, workspace_id, changed)
+    # the similarity index only filters the candidates, the removed aliases can stay in it
+    add_authors_to_similarity_index(g, workspace_id, changed)
 
-    cache_key = f"authors_ws_{workspace_id}"
 
-    from_cache = g.kvstore.get_value(cache_key)
-    if from_cache:
-        return _from_list(cast(list, from_cache))
-    else:
-        all_authors = list(g.backend.authors.all(workspace_id))
-        g.kvstore.set_value(cache_key, _to_list(all_authors))
-        return all_authors
+def _author_ids_changed(g: GitentialContext, workspace_id: int):
+    # The edits of the users change the author ids of the already calculated commits, these are recalculated
+    # by the next refresh. The authors created and extended by the extraction only affect the new commits.
+    mark_all_intervals_dirty(g, workspace_id)
 
 
-def _reset_all_authors_from_cache(g: GitentialContext, workspace_id: int):
-    cache_key = f"authors_ws_{workspace_id}"
-    return g.kvstore.delete_value(cache_key)
+def reset_author_indexes(g: GitentialContext, workspace_id: int):
+    """For the bulk changes and the authors written directly, the indexes are rebuilt on the next lookup"""
+    bump_data_version(g, workspace_id)
+    reset_alias_index(g, workspace_id)
+    reset_similarity_index(g, workspace_id)
 
 
 def get_or_create_author_for_alias(g: GitentialContext, workspace_id: int, alias: AuthorAlias) -> AuthorInDB:
     with authors_change_lock(g, workspace_id):
-        all_authors = _get_all_authors_from_cache(g, workspace_id)
-        alias_to_author_map = _build_alias_author_map(all_authors)
-        alias_tuple = (alias.name, alias.email, alias.login)
-        if alias_tuple in alias_to_author_map:
-            return alias_to_author_map[alias_tuple]
+        author = get_author_by_alias(g, workspace_id, alias)
+        if author:
+            return author
         else:
-            _reset_all_authors_from_cache(g, workspace_id)
-            for author in all_authors:
+            similar_authors = get_indexed_authors(g, workspace_id, get_similar_author_ids(g, workspace_id, [alias]))
+            for author in similar_authors:
                 if alias_matching_author(alias, author):
                     logger.debug(
                         "Matching author for alias by L-distance", alias=alias, author=author, workspace_id=workspace_id
                     )
-                    return add_alias_to_author(g, workspace_id, author, alias)
+                    updated_author = add_alias_to_author(g, workspace_id, author, alias)
+                    _authors_changed(g, workspace_id, changed=[updated_author], previous=[author])
+                    if updated_author.aliases != author.aliases:
+                        add_authors_to_deduplicate(g, workspace_id, [updated_author.id])
+                    return updated_author
 
             new_author = g.backend.authors.create(workspace_id, _new_author_from_alias(alias))
+            _authors_changed(g, workspace_id, changed=[new_author])
             logger.debug("Creating new author for alias", alias=alias, author=new_author)
 
             return new_author
 
 
+def get_or_create_authors_for_aliases(
+    g: GitentialContext, workspace_id: int, aliases: Iterable[AuthorAlias]
+) -> Dict[AliasKey, AuthorInDB]:
+    """Bulk version of get_or_create_author_for_alias, returns the author of every alias.
+
+    The aliases are matched in order the same way, but the known aliases are looked up at once, and the new
+    aliases and authors are saved in one transaction at the end.
+    """
+    aliases_by_key = {_alias_key(alias): alias for alias in aliases}
+    with authors_change_lock(g, workspace_id, timeout_seconds=300):
+        found = dict(zip(aliases_by_key, get_authors_by_aliases(g, workspace_id, list(aliases_by_key.values()))))
+        missing_aliases = [aliases_by_key[key] for key, author in found.items() if author is None]
+        if not missing_aliases:
+            return cast(Dict[AliasKey, AuthorInDB], found)
+
+        matched, existing_authors, new_authors, updated_ids = _match_missing_aliases(g, workspace_id, missing_aliases)
+
+        created: List[AuthorInDB] = []
+        updated: List[AuthorInDB] = []
+        if updated_ids or new_authors:
+            created, updated = g.backend.authors.create_and_update_many(
+                workspace_id,
+                authors_to_create=new_authors,
+                authors_to_update={
+                    author_id: AuthorUpdate(**existing_authors[author_id].dict()) for author_id in updated_ids
+                },
+            )
+            # The aliases were only added, the previous states of the updated authors need no removal
+            _authors_changed(g, workspace_id, changed=created + updated)
+            add_authors_to_deduplicate(g, workspace_id, updated_ids)
+
+    created_by_new_author = {id(new_author): author for new_author, author in zip(new_authors, created)}
+    updated_by_id = {author.id: author for author in updated}
+    ret = {}
+    for key in aliases_by_key:
+        alias_author: Union[AuthorInDB, AuthorCreate] = found[key] or matched[key]
+        if isinstance(alias_author, AuthorInDB):
+            ret[key] = updated_by_id.get(alias_author.id, alias_author)
+        else:
+            ret[key] = created_by_new_author[id(alias_author)]
+    return ret
+
+
+def _match_missing_aliases(
+    g: GitentialContext, workspace_id: int, missing_aliases: List[AuthorAlias]
+) -> Tuple[Dict[AliasKey, Union[AuthorInDB, AuthorCreate]], Dict[int, AuthorInDB], List[AuthorCreate], List[int]]:
+    """Matches the aliases to the similar authors or to the new authors of the earlier aliases, returns the
+    matched authors, the existing authors looked up, the new authors and the ids of the extended authors"""
+    existing_authors: Dict[int, AuthorInDB] = {}
+    new_authors: List[AuthorCreate] = []
+    updated_ids: List[int] = []
+    matched: Dict[AliasKey, Union[AuthorInDB, AuthorCreate]] = {}
+    for alias in missing_aliases:
+        # The aliases added during the batch are not in the similarity index yet
+        similar_ids = get_similar_author_ids(g, workspace_id, [alias]) | set(updated_ids)
+        for author in get_indexed_authors(g, workspace_id, similar_ids - existing_authors.keys()):
+            existing_authors[author.id] = author
+        # The existing authors first, then the ones created for the earlier aliases of the batch
+        candidates: List[Union[AuthorInDB, AuthorCreate]] = [
+            existing_authors[author_id] for author_id in sorted(similar_ids) if author_id in existing_authors
+        ]
+        candidates += new_authors
+        for candidate in candidates:
+            if alias_matching_author(alias, candidate):
+                logger.debug("Matching author for alias by L-distance", alias=alias, workspace_id=workspace_id)
+                aliases_of_candidate = _remove_duplicate_aliases(candidate.aliases + [alias])
+                # An alias with the same email or login as an existing one is not stored again
+                if aliases_of_candidate != candidate.aliases:
+                    candidate.aliases = aliases_of_candidate
+                    if isinstance(candidate, AuthorInDB) and candidate.id not in updated_ids:
+                        updated_ids.append(candidate.id)
+                break
+        else:
+            logger.debug("Creating new author for alias", alias=alias, workspace_id=workspace_id)
+            candidate = _new_author_from_alias(alias)
+            new_authors.append(candidate)
+        matched[_alias_key(alias)] = candidate
+    return matched, existing_authors, new_authors, updated_ids
+
+
 def get_or_create_optional_author_for_alias(
     g: GitentialContext, workspace_id: int, alias: AuthorAlias
 ) -> Optional[AuthorInDB]:
@@ -249,22 +370,15 @@ def add_alias_to_author(g: GitentialContext, workspace_id: int, author: AuthorIn
     return g.backend.authors.update(workspace_id, author.id, author_update)
 
 
-def _build_alias_author_map(
-    author_list: Iterable[AuthorInDB],
-) -> Dict[Tuple[Optional[str], Optional[str], Optional[str]], AuthorInDB]:
-    ret = {}
-    for author in author_list:
-        for alias in author.aliases or []:
-            if not alias.is_empty():
-                ret[(alias.name, alias.email, alias.login)] = author
-    return ret
+def _alias_key(alias: AuthorAlias) -> AliasKey:
+    return (alias.name, alias.email, alias.login)
 
 
 def _new_author_from_alias(alias: AuthorAlias) -> AuthorCreate:
     return AuthorCreate(active=True, name=alias.name, email=alias.email, aliases=[alias])
 
 
-def alias_matching_author(alias: AuthorAlias, author: AuthorInDB):
+def alias_matching_author(alias: AuthorAlias, author: Union[AuthorInDB, AuthorCreate]):
     return any(aliases_matching(author_alias, alias) for author_alias in author.aliases)
 
 
@@ -275,7 +389,7 @@ def aliases_matching(first: AuthorAlias, second: AuthorAlias) -> bool:
         return True
     for first_token, second_token in product(tokenize_alias(first), tokenize_alias(second)):
         if first_token and second_token:
-            if levenshtein_ratio(first_token, second_token) > 0.8:
+            if levenshtein_ratio(first_token, second_token) > TOKEN_SIMILARITY_THRESHOLD:
                 return True
     return False
 
@@ -287,37 +401,6 @@ def authors_matching(first: AuthorInDB, second: AuthorInDB):
     return False
 
 
-def tokenize_alias(alias: AuthorAlias) -> List[str]:
-    def _tokenize_str(s: str) -> str:
-        _lower_ascii = unidecode(s.lower())
-        _replaced_special = re.sub(r"\W+", " ", _lower_ascii)
-        _splitted = _replaced_special.split()
-        return " ".join(sorted(_splitted))
-
-    def _remove_duplicates(l: List[str]) -> List[str]:
-        ret = []
-        for s in l:
-            if s not in ret:
-                ret.append(s)
-        return ret
-
-    def _remove_common_words(l: List[str]) -> List[str]:
-        return [s for s in l if s not in _COMMON_WORDS]
-
-    ret = []
-    if alias.name:
-        ret.append(_tokenize_str(alias.name))
-    if alias.email:
-        email_first_part = _tokenize_str(alias.email.split("@")[0])
-        if len(_remove_common_words(email_first_part.split())) > 1 or len(email_first_part) >= 10:
-            ret.append(email_first_part)
-    if alias.login:
-        ret.append(_tokenize_str(alias.login))
-    ret = _remove_common_words(_remove_duplicates(ret))
-    # logger.debug("Tokenized alias", alias=alias, tokens=ret)
-    return ret
-
-
 def move_emails_and_logins_to_author(
     g: GitentialContext, workspace_id: int, emails_and_logins: List[str], destination_author_id: int
 ) -> List[AuthorInDB]:
@@ -450,8 +533,11 @@ def force_filling_of_author_names(g: GitentialContext, workspace_id: int):
     logger.info(
         "Authors found with null name or email.", authors_with_null_name_or_email=authors_with_null_name_or_email
     )
-    for author in authors_with_null_name_or_email:
-        g.backend.authors.update(workspace_id=workspace_id, id_=author.id, obj=get_author_update(author))
-
-
-_COMMON_WORDS = ["mail", "info", "noreply", "email", "user", "test", "github", "github com"]
+    if not authors_with_null_name_or_email:
+        return
+    with authors_change_lock(g, workspace_id):
+        updated = [
+            g.backend.authors.update(workspace_id=workspace_id, id_=author.id, obj=get_author_update(author))
+            for author in authors_with_null_name_or_email
+        ]
+        _authors_changed(g, workspace_id, changed=updated, previous=authors_with_null_name_or_email)
@@ -0,0 +1,21 @@
+from typing import Dict, Optional
+
+from .context import GitentialContext
+
+
+def _branch_tips_key(workspace_id: int, repository_id: int) -> str:
+    return f"ws-{workspace_id}:r-{repository_id}:branch-tips"
+
+
+def get_previous_branch_tips(g: GitentialContext, workspace_id: int, repository_id: int) -> Optional[Dict[str, str]]:
+    previous_tips = g.kvstore.get_value(_branch_tips_key(workspace_id, repository_id))
+    return previous_tips if previous_tips and isinstance(previous_tips, dict) else None
+
+
+def set_branch_tips(g: GitentialContext, workspace_id: int, repository_id: int, tips: Dict[str, str]):
+    g.kvstore.set_value(_branch_tips_key(workspace_id, repository_id), tips)
+
+
+def delete_branch_tips(g: GitentialContext, workspace_id: int, repository_id: int):
+    # The next extraction walks all the branches again, e.g. after their extracted rows were deleted
+    g.kvstore.delete_value(_branch_tips_key(workspace_id, repository_id))
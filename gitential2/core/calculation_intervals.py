@@ -0,0 +1,126 @@
+import datetime as dt
+from typing import Dict, Iterable, List, Set, Tuple
+
+from structlog import get_logger
+
+from gitential2.datatypes.extraction import ExtractedKind
+from gitential2.extraction.output import OutputHandler
+
+from .context import GitentialContext
+
+logger = get_logger(__name__)
+
+INTERVAL_DAYS = 100
+INTERVALS_TO_ANALYZE = 32
+
+# The intervals are aligned to a fixed date, so an interval recalculated on its own has the same bounds
+# as in a full recalculation
+_INTERVALS_START = dt.datetime(1970, 1, 1)
+
+
+def _to_naive_utc(value: dt.datetime) -> dt.datetime:
+    if value.tzinfo is not None:
+        return value.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def get_interval_index(value: dt.datetime) -> int:
+    return (_to_naive_utc(value) - _INTERVALS_START).days // INTERVAL_DAYS
+
+
+def get_interval_bounds(index: int) -> Tuple[dt.datetime, dt.datetime]:
+    from_ = _INTERVALS_START + dt.timedelta(days=INTERVAL_DAYS * index)
+    return from_, from_ + dt.timedelta(days=INTERVAL_DAYS)
+
+
+def get_analyzed_interval_indexes(current_time: dt.datetime) -> List[int]:
+    """The intervals covering the last INTERVALS_TO_ANALYZE * INTERVAL_DAYS days, the most recent first"""
+    last = get_interval_index(current_time)
+    first = get_interval_index(current_time - dt.timedelta(days=INTERVAL_DAYS * INTERVALS_TO_ANALYZE))
+    return list(range(last, first - 1, -1))
+
+
+def _dirty_intervals_key(workspace_id: int, repository_id: int) -> str:
+    return f"ws-{workspace_id}:r-{repository_id}:dirty-intervals"
+
+
+def get_dirty_interval_indexes(g: GitentialContext, workspace_id: int, repository_id: int) -> Set[int]:
+    value = g.kvstore.get_value(_dirty_intervals_key(workspace_id, repository_id))
+    return set(value) if isinstance(value, list) else set()
+
+
+def add_dirty_interval_indexes(g: GitentialContext, workspace_id: int, repository_id: int, indexes: Iterable[int]):
+    indexes = set(indexes)
+    if not indexes:
+        return
+    key = _dirty_intervals_key(workspace_id, repository_id)
+    with g.kvstore.lock(f"{key}-lock", timeout=60, blocking_timeout=60):
+        dirty = get_dirty_interval_indexes(g, workspace_id, repository_id) | indexes
+        g.kvstore.set_value(key, sorted(dirty))
+
+
+def mark_all_intervals_dirty(g: GitentialContext, workspace_id: int):
+    """Marks every analyzed interval of the repositories dirty, e.g. after the authors changed"""
+    indexes = get_analyzed_interval_indexes(g.current_time())
+    for repository in g.backend.repositories.all(workspace_id):
+        add_dirty_interval_indexes(g, workspace_id, repository.id, indexes)
+
+
+def remove_dirty_interval_indexes(g: GitentialContext, workspace_id: int, repository_id: int, indexes: Iterable[int]):
+    indexes = set(indexes)
+    if not indexes:
+        return
+    key = _dirty_intervals_key(workspace_id, repository_id)
+    with g.kvstore.lock(f"{key}-lock", timeout=60, blocking_timeout=60):
+        # The intervals marked dirty again during the recalculation are kept
+        dirty = get_dirty_interval_indexes(g, workspace_id, repository_id) - indexes
+        if dirty:
+            g.kvstore.set_value(key, sorted(dirty))
+        else:
+            g.kvstore.delete_value(key)
+
+
+class DirtyIntervalRecorder(OutputHandler):
+    """Passes the extracted values to `output` and records the intervals they change for each repository.
+
+    The calculated values of a commit depend on its own extracted data, on the patch rewrites of it and on its
+    pull requests, so these mark the interval of the commit's author time as dirty.
+
+    An interval is recorded before the first value changing it is passed on, because `output` can write out
+    the buffered values on its own. A batch written before a failure has its intervals recorded this way.
+    """
+
+    def __init__(self, g: GitentialContext, workspace_id: int, output: OutputHandler):
+        self.g = g
+        self.workspace_id = workspace_id
+        self.output = output
+        self._recorded: Dict[int, Set[int]] = {}
+
+    def write(self, kind, value):
+        if kind == ExtractedKind.EXTRACTED_COMMIT:
+            self._mark_dirty(value.repo_id, value.atime)
+        elif kind == ExtractedKind.EXTRACTED_PATCH_REWRITE:
+            self._mark_dirty(value.repo_id, value.rewritten_atime)
+        elif kind == ExtractedKind.PULL_REQUEST_COMMIT:
+            self._mark_dirty(value.repo_id, value.author_date)
+        return self.output.write(kind, value)
+
+    def _mark_dirty(self, repository_id: int, atime: dt.datetime):
+        index = get_interval_index(atime)
+        recorded = self._recorded.setdefault(repository_id, set())
+        if index in recorded:
+            return
+        add_dirty_interval_indexes(self.g, self.workspace_id, repository_id, [index])
+        recorded.add(index)
+        logger.info(
+            "Marked calculation interval dirty",
+            workspace_id=self.workspace_id,
+            repository_id=repository_id,
+            interval=index,
+        )
+
+    def flush(self):
+        self.output.flush()
+
+    def clear(self):
+        self.output.clear()
@@ -1,5 +1,5 @@
 import gc
-from typing import List, Tuple, cast
+from typing import Dict, List, NamedTuple, Optional, Union, cast
 from itertools import product
 from functools import partial
 import datetime as dt
@@ -7,24 +7,30 @@ import pandas as pd
 import numpy as np
 from structlog import get_logger
 from gitential2.datatypes.authors import AuthorAlias
+from gitential2.datatypes.extraction import Langtype
+from gitential2.settings import GitentialSettings, RecalculationSettings
 from ..utils import split_timerange
-from ..utils.is_bugfix import calculate_is_bugfix
+from ..utils.executors import run_with_memory_budget
+from ..utils.is_bugfix import BUGFIX_KEYWORDS
 from ..utils.timer import LogTimeIt, time_it_log
 
-from .authors import get_or_create_author_for_alias
-from .context import GitentialContext
+from .authors import get_or_create_authors_for_aliases
+from .calculation_intervals import (
+    get_analyzed_interval_indexes,
+    get_dirty_interval_indexes,
+    get_interval_bounds,
+    remove_dirty_interval_indexes,
+)
+from .context import GitentialContext, init_context_from_settings
+from .stats_cache import bump_data_version
 
 logger = get_logger(__name__)
 
-
-def _get_time_intervals() -> List[Tuple[dt.datetime, dt.datetime]]:
-    current_time = dt.datetime.utcnow()
-    quaters_to_analyze = 32
-    ret: list = []
-    for i in range(quaters_to_analyze):
-        ret.append((current_time - dt.timedelta(days=100 * (i + 1)), current_time - dt.timedelta(days=100 * i)))
-
-    return ret
+# The langtype column is read back as Langtype values, the calculated tables store the names
+_LANGTYPE_NAMES: Dict[Union[Langtype, str], str] = {
+    **{lt: lt.name for lt in Langtype},
+    **{lt.name: lt.name for lt in Langtype},
+}
 
 
 def _log_large_dataframe(workspace_id, repository_id, name: str, df: pd.DataFrame, **ctx) -> pd.DataFrame:
@@ -49,20 +55,65 @@ def _log_large_dataframe(workspace_id, repository_id, name: str, df: pd.DataFram
     return df
 
 
+class IntervalRecalculation(NamedTuple):
+    workspace_id: int
+    repository_id: int
+    from_: dt.datetime
+    to_: dt.datetime
+    commit_count: int
+
+
 def recalculate_repository_values(
-    g: GitentialContext, workspace_id: int, repository_id: int
+    g: GitentialContext, workspace_id: int, repository_id: int, full_rebuild: bool = True
 ):  # pylint: disable=unused-variable
-    logger.info("Recalculating repository commit values", workspace_id=workspace_id, repository_id=repository_id)
+    """Recalculates the commit values of the repository.
+
+    With `full_rebuild` every analyzed interval is recalculated, otherwise only the intervals marked dirty
+    by the extraction of new commits, patch rewrites and pull requests.
+    """
+    analyzed_indexes = get_analyzed_interval_indexes(dt.datetime.utcnow())
+    dirty_indexes = get_dirty_interval_indexes(g, workspace_id, repository_id)
+    indexes = analyzed_indexes if full_rebuild else [index for index in analyzed_indexes if index in dirty_indexes]
+
+    recalculations: List[IntervalRecalculation] = []
+    for index in indexes:
+        from_, to_ = get_interval_bounds(index)
+        recalculations += plan_interval_recalculations(g, workspace_id, repository_id, from_, to_)
+
+    logger.info(
+        "Recalculating repository commit values",
+        workspace_id=workspace_id,
+        repository_id=repository_id,
+        full_rebuild=full_rebuild,
+        interval_count=len(indexes),
+        recalculation_count=len(recalculations),
+    )
+    settings = g.settings.recalculation
+    if settings.process_pool_size > 1 and len(recalculations) > 1:
+        run_with_memory_budget(
+            _recalculate_interval_in_worker,
+            recalculations,
+            estimate_memory_mb=partial(_estimate_memory_mb, settings=settings),
+            pool_size=settings.process_pool_size,
+            memory_budget_mb=settings.memory_budget_mb,
+            initializer=_init_recalculation_worker,
+            initargs=(g.settings,),
+            max_tasks_per_child=settings.max_tasks_per_process,
+        )
+        # The workers have their own contexts, the data version is bumped here too for the in memory stores
+        bump_data_version(g, workspace_id)
+    else:
+        for recalculation in recalculations:
+            _recalculate_interval(g, recalculation)
 
-    for intervals in _get_time_intervals():
-        from_, to_ = intervals
-        recalculate_repo_values_in_interval(g, workspace_id, repository_id, from_, to_)
+    # The dirty intervals out of the analyzed time range are dropped as well, they are never recalculated
+    remove_dirty_interval_indexes(g, workspace_id, repository_id, dirty_indexes)
 
 
-def recalculate_repo_values_in_interval(
+def plan_interval_recalculations(
     g: GitentialContext, workspace_id: int, repository_id: int, from_: dt.datetime, to_: dt.datetime, commit_limit=300
-):
-
+) -> List[IntervalRecalculation]:
+    """Splits the interval to halves recursively, until none of them has more commits than `commit_limit`"""
     extracted_commit_count = g.backend.extracted_commits.count(
         workspace_id=workspace_id, repository_ids=[repository_id], from_=from_, to_=to_
     )
@@ -76,108 +127,125 @@ def recalculate_repo_values_in_interval(
             from_=from_,
             to_=to_,
         )
+        ret: List[IntervalRecalculation] = []
+        for (from__, to__) in split_timerange(from_, to_):
+            ret += plan_interval_recalculations(g, workspace_id, repository_id, from__, to__, commit_limit=commit_limit)
+        return ret
+    elif not extracted_commit_count:
+        return []
+    return [IntervalRecalculation(workspace_id, repository_id, from_, to_, extracted_commit_count)]
 
-        intervals = split_timerange(from_, to_)
-        for (from__, to__) in intervals:
-            recalculate_repo_values_in_interval(g, workspace_id, repository_id, from__, to__, commit_limit=commit_limit)
-    else:
-        with LogTimeIt("get_extracted_dataframes", logger, threshold_ms=1000):
-            (
-                extracted_commits_df,
-                extracted_patches_df,
-                extracted_patch_rewrites_df,
-                pull_request_commits_df,
-            ) = g.backend.get_extracted_dataframes(
-                workspace_id=workspace_id, repository_id=repository_id, from_=from_, to_=to_
-            )
-
-        _log_large_df = partial(
-            _log_large_dataframe, workspace_id=workspace_id, repository_id=repository_id, from_=from_, to_=to_
-        )
 
-        with LogTimeIt("get_extracted_dataframes", logger, threshold_ms=1000):
-            (
-                extracted_commits_df,
-                extracted_patches_df,
-                extracted_patch_rewrites_df,
-                pull_request_commits_df,
-            ) = g.backend.get_extracted_dataframes(
-                workspace_id=workspace_id, repository_id=repository_id, from_=from_, to_=to_
-            )
-        for name, df in [
-            ("extracted_commits_df", extracted_commits_df),
-            ("extracted_patches_df", extracted_patches_df),
-            ("extracted_patch_rewrites_df", extracted_patch_rewrites_df),
-            ("pull_request_commits_df", pull_request_commits_df),
-        ]:
-            _log_large_df(name=name, df=df)
-
-        if extracted_patches_df.empty or extracted_commits_df.empty:
-            return
-
-        parents_df = _log_large_df(
-            name="parents_df",
-            df=extracted_patches_df.reset_index()[["commit_id", "parent_commit_id"]].drop_duplicates(),
-        )
+def recalculate_repo_values_in_interval(
+    g: GitentialContext, workspace_id: int, repository_id: int, from_: dt.datetime, to_: dt.datetime, commit_limit=300
+):
+    for recalculation in plan_interval_recalculations(g, workspace_id, repository_id, from_, to_, commit_limit):
+        _recalculate_interval(g, recalculation)
 
-        prepared_commits_df = _log_large_df(
-            name="prepared_commits_df",
-            df=_prepare_extracted_commits_df(g, workspace_id, extracted_commits_df, parents_df),
-        )
-        prepared_patches_df = _log_large_df(
-            name="prepared_patches_df", df=_prepare_extracted_patches_df(extracted_patches_df)
-        )
-        uploc_df = _log_large_df(
-            name="uploc_df", df=_calculate_uploc_df(extracted_commits_df, extracted_patch_rewrites_df)
-        )
 
-        # We can remove the original dataframes here
-        del extracted_commits_df
-        del extracted_patches_df
-        del extracted_patch_rewrites_df
-        gc.collect()
+def _estimate_memory_mb(recalculation: IntervalRecalculation, settings: RecalculationSettings) -> float:
+    return settings.process_memory_mb + recalculation.commit_count * settings.memory_per_commit_kb / 1024
 
-        commits_patches_df = _log_large_df(
-            name="commits_patches_df",
-            df=_prepare_commits_patches_df(prepared_commits_df, prepared_patches_df, uploc_df),
-        )
-        outlier_df = _log_large_df(name="outlier_df", df=_calc_outlier_detection_df(prepared_patches_df))
 
-        calculated_commits_df = _log_large_df(
-            name="calculated_commits_df",
-            df=_calculate_commit_level(prepared_commits_df, commits_patches_df, outlier_df, pull_request_commits_df),
-        )
-        calculated_patches_df = _log_large_df(
-            name="calculated_patches_df", df=_calculate_patch_level(commits_patches_df)
+_worker_context: Optional[GitentialContext] = None
+
+
+def _init_recalculation_worker(settings: GitentialSettings):
+    global _worker_context  # pylint: disable=global-statement
+    _worker_context = init_context_from_settings(settings)
+
+
+def _recalculate_interval_in_worker(recalculation: IntervalRecalculation):
+    _recalculate_interval(cast(GitentialContext, _worker_context), recalculation)
+
+
+def _recalculate_interval(g: GitentialContext, recalculation: IntervalRecalculation):
+    workspace_id, repository_id, from_, to_, _ = recalculation
+    with LogTimeIt("get_extracted_dataframes", logger, threshold_ms=1000):
+        (
+            extracted_commits_df,
+            extracted_patches_df,
+            extracted_patch_rewrites_df,
+            pull_request_commits_df,
+        ) = g.backend.get_extracted_dataframes(
+            workspace_id=workspace_id, repository_id=repository_id, from_=from_, to_=to_
         )
 
-        logger.info(
-            "Saving repository commit calculations",
+    _log_large_df = partial(
+        _log_large_dataframe, workspace_id=workspace_id, repository_id=repository_id, from_=from_, to_=to_
+    )
+
+    for name, df in [
+        ("extracted_commits_df", extracted_commits_df),
+        ("extracted_patches_df", extracted_patches_df),
+        ("extracted_patch_rewrites_df", extracted_patch_rewrites_df),
+        ("pull_request_commits_df", pull_request_commits_df),
+    ]:
+        _log_large_df(name=name, df=df)
+
+    if extracted_patches_df.empty or extracted_commits_df.empty:
+        return
+
+    parents_df = _log_large_df(
+        name="parents_df",
+        df=extracted_patches_df.reset_index()[["commit_id", "parent_commit_id"]].drop_duplicates(),
+    )
+
+    prepared_commits_df = _log_large_df(
+        name="prepared_commits_df",
+        df=_prepare_extracted_commits_df(g, workspace_id, extracted_commits_df, parents_df),
+    )
+    prepared_patches_df = _log_large_df(
+        name="prepared_patches_df", df=_prepare_extracted_patches_df(extracted_patches_df)
+    )
+    uploc_df = _log_large_df(name="uploc_df", df=_calculate_uploc_df(extracted_commits_df, extracted_patch_rewrites_df))
+
+    # We can remove the original dataframes here
+    del extracted_commits_df
+    del extracted_patches_df
+    del extracted_patch_rewrites_df
+    gc.collect()
+
+    commits_patches_df = _log_large_df(
+        name="commits_patches_df",
+        df=_prepare_commits_patches_df(prepared_commits_df, prepared_patches_df, uploc_df),
+    )
+    outlier_df = _log_large_df(name="outlier_df", df=_calc_outlier_detection_df(prepared_patches_df))
+
+    calculated_commits_df = _log_large_df(
+        name="calculated_commits_df",
+        df=_calculate_commit_level(prepared_commits_df, commits_patches_df, outlier_df, pull_request_commits_df),
+    )
+    calculated_patches_df = _log_large_df(name="calculated_patches_df", df=_calculate_patch_level(commits_patches_df))
+
+    logger.info(
+        "Saving repository commit calculations",
+        workspace_id=workspace_id,
+        repository_id=repository_id,
+        from_=from_,
+        to_=to_,
+    )
+
+    with LogTimeIt("save_calculated_dataframes", logger, threshold_ms=1000):
+        g.backend.save_calculated_dataframes(
             workspace_id=workspace_id,
             repository_id=repository_id,
+            calculated_commits_df=calculated_commits_df,
+            calculated_patches_df=calculated_patches_df,
             from_=from_,
             to_=to_,
         )
+    bump_data_version(g, workspace_id)
 
-        with LogTimeIt("save_calculated_dataframes", logger, threshold_ms=1000):
-            g.backend.save_calculated_dataframes(
-                workspace_id=workspace_id,
-                repository_id=repository_id,
-                calculated_commits_df=calculated_commits_df,
-                calculated_patches_df=calculated_patches_df,
-                from_=from_,
-                to_=to_,
-            )
-
-        del calculated_commits_df
-        del calculated_patches_df
-        del outlier_df
-        del commits_patches_df
-        del parents_df
-        del prepared_commits_df
-        del prepared_patches_df
-        del uploc_df
-        gc.collect()
+    del calculated_commits_df
+    del calculated_patches_df
+    del outlier_df
+    del commits_patches_df
+    del parents_df
+    del prepared_commits_df
+    del prepared_patches_df
+    del uploc_df
+    gc.collect()
 
 
 @time_it_log(logger)
@@ -185,59 +253,50 @@ def _prepare_extracted_commits_df(
     g: GitentialContext, workspace_id: int, extracted_commits_df: pd.DataFrame, parents_df: pd.DataFrame
 ) -> pd.DataFrame:
     email_author_map = _get_or_create_authors_from_commits(g, workspace_id, extracted_commits_df)
-    extracted_commits_df["aid"] = extracted_commits_df.apply(lambda row: email_author_map.get(row["aemail"]), axis=1)
-    extracted_commits_df["cid"] = extracted_commits_df.apply(lambda row: email_author_map.get(row["cemail"]), axis=1)
+    extracted_commits_df["aid"] = extracted_commits_df["aemail"].map(email_author_map)
+    extracted_commits_df["cid"] = extracted_commits_df["cemail"].map(email_author_map)
     extracted_commits_df["date"] = extracted_commits_df["atime"]
     extracted_commits_df["is_merge"] = extracted_commits_df["nparents"] > 1
-    extracted_commits_df["is_bugfix"] = extracted_commits_df.apply(
-        lambda x: calculate_is_bugfix(labels=[], title=x["message"]), axis=1
-    )
+    extracted_commits_df["is_bugfix"] = _is_bugfix(extracted_commits_df["message"])
     age_df = _calculate_age_df(extracted_commits_df, parents_df)
     ret = extracted_commits_df.set_index(["commit_id"]).join(age_df)
     hourse_measured_df = _measure_hours(ret)
     return ret.join(hourse_measured_df)
 
 
-@time_it_log(logger)
-def _prepare_extracted_patches_df(extracted_patches_df: pd.DataFrame) -> pd.DataFrame:
-    def _calc_is_test(row):
-        return row["langtype"] == "PROGRAMMING" and "test" in row["newpath"]
-
-    def _fix_lang_type(row):
-        return row["langtype"].name
+def _is_bugfix(messages: pd.Series) -> pd.Series:
+    lowered = messages.str.lower()
+    ret = pd.Series(False, index=messages.index)
+    for keyword in BUGFIX_KEYWORDS:
+        ret |= lowered.str.contains(keyword, regex=False).fillna(False).astype(bool)
+    return ret
 
-    def _zero_if_unknown(field_name):
-        def _inner(row):
-            return row[field_name] if row["langtype"] != "UNKNOWN" else 0
 
-        return _inner
+@time_it_log(logger)
+def _prepare_extracted_patches_df(extracted_patches_df: pd.DataFrame) -> pd.DataFrame:
+    langtype = extracted_patches_df["langtype"].map(_LANGTYPE_NAMES)
+    is_known = langtype != Langtype.UNKNOWN.name
 
     extracted_patches_df["outlier"] = 0
     extracted_patches_df["anomaly"] = 0
-    extracted_patches_df["langtype"] = extracted_patches_df.apply(_fix_lang_type, axis=1)
-    extracted_patches_df["is_test"] = extracted_patches_df.apply(_calc_is_test, axis=1)
-    extracted_patches_df["comp_i"] = extracted_patches_df.apply(_zero_if_unknown("comp_i"), axis=1)
-    extracted_patches_df["comp_d"] = extracted_patches_df.apply(_zero_if_unknown("comp_d"), axis=1)
-    extracted_patches_df["loc_i"] = extracted_patches_df.apply(_zero_if_unknown("loc_i"), axis=1)
-    extracted_patches_df["loc_d"] = extracted_patches_df.apply(_zero_if_unknown("loc_d"), axis=1)
+    extracted_patches_df["langtype"] = langtype
+    extracted_patches_df["is_test"] = (langtype == Langtype.PROGRAMMING.name) & extracted_patches_df[
+        "newpath"
+    ].str.contains("test", regex=False).fillna(False).astype(bool)
+    for field_name in ["comp_i", "comp_d", "loc_i", "loc_d"]:
+        extracted_patches_df[field_name] = extracted_patches_df[field_name].where(is_known, 0)
 
     return extracted_patches_df.set_index(["commit_id"])
 
 
 @time_it_log(logger)
 def _calculate_age_df(extracted_commit_df: pd.DataFrame, parents_df: pd.DataFrame) -> pd.DataFrame:
-    author_times = cast(dict, extracted_commit_df.set_index(["commit_id"])[["atime"]].to_dict(orient="dict"))["atime"]
-
-    def _calc_age(row):
-        # print(row["commit_id"], row["parent_commit_id"], author_times.get(row["commit_id"]))
-        if row["commit_id"] in author_times and row["parent_commit_id"] in author_times:
-            delta = (author_times[row["commit_id"]] - author_times[row["parent_commit_id"]]).total_seconds()
-            return delta
-        else:
-            return -1
-
-    parents_df["age"] = parents_df.apply(_calc_age, axis=1)
-    return parents_df.groupby("commit_id").min()["age"].to_frame()
+    author_times = extracted_commit_df.drop_duplicates("commit_id", keep="last").set_index("commit_id")["atime"]
+    commit_atime = parents_df["commit_id"].map(author_times)
+    parent_atime = parents_df["parent_commit_id"].map(author_times)
+    # -1 when any of the author times is unknown, eg. the parent is out of the interval
+    parents_df["age"] = (commit_atime - parent_atime).dt.total_seconds().fillna(-1)
+    return parents_df.groupby("commit_id")["age"].min().to_frame()
 
 
 @time_it_log(logger)
@@ -285,13 +344,10 @@ def _prepare_commits_patches_df(
         df_with_uploc = df
         df_with_uploc["uploc"] = 0
 
-    def _finalize_uploc(row):
-        if row["is_merge"]:
-            return 0
-        else:
-            return min(row["uploc"], row["loc_i"])
-
-    df_with_uploc["uploc"] = df_with_uploc.apply(_finalize_uploc, axis=1)
+    uploc, loc_i = df_with_uploc["uploc"], df_with_uploc["loc_i"]
+    # Same as min(uploc, loc_i) in python, a missing uploc stays missing
+    uploc = uploc.where(~(loc_i < uploc), loc_i)
+    df_with_uploc["uploc"] = uploc.where(~df_with_uploc["is_merge"].astype(bool), 0)
     return df_with_uploc
 
 
@@ -314,10 +370,8 @@ def _get_or_create_authors_from_commits(g: GitentialContext, workspace_id, extra
     developers_df = pd.concat([authors_df, commiters_df])
     developers_df = developers_df[~developers_df.index.duplicated(keep="first")]
 
-    authors = [
-        get_or_create_author_for_alias(g, workspace_id, AuthorAlias(name=name, email=email))
-        for email, name in developers_df["name"].to_dict().items()
-    ]
+    aliases = [AuthorAlias(name=name, email=email) for email, name in developers_df["name"].to_dict().items()]
+    authors = get_or_create_authors_for_aliases(g, workspace_id, aliases).values()
     email_aid_map = {}
     for author in authors:
         for alias in author.aliases:
@@ -376,30 +430,9 @@ def _calculate_commit_level(
     # calculated_commits["is_bugfix"] = calculated_commits.apply(
     #     lambda x: calculate_is_bugfix(labels=[], title=x["message"]), axis=1
     # )
-    calculated_commits["is_pr_exists"] = calculated_commits.apply(
-        lambda x: len(pull_request_commits_df[pull_request_commits_df["commit_id"] == x.name]) > 0, axis=1
-    )
-    calculated_commits["is_pr_open"] = calculated_commits.apply(
-        lambda x: x["is_pr_exists"]
-        and len(
-            pull_request_commits_df[
-                (pull_request_commits_df["commit_id"] == x.name) & (pull_request_commits_df["state"] == "open")
-            ]
-        )
-        > 0,
-        axis=1,
-    )
-    calculated_commits["is_pr_closed"] = calculated_commits.apply(
-        lambda x: x["is_pr_exists"]
-        and len(pull_request_commits_df[pull_request_commits_df["commit_id"] == x.name])
-        == len(
-            pull_request_commits_df[
-                (pull_request_commits_df["commit_id"] == x.name) & (pull_request_commits_df["state"] == "closed")
-            ]
-        )
-        > 0,
-        axis=1,
-    )
+    calculated_commits = calculated_commits.join(_calculate_pull_request_flags(pull_request_commits_df))
+    for flag in ["is_pr_exists", "is_pr_open", "is_pr_closed"]:
+        calculated_commits[flag] = calculated_commits[flag].fillna(False).astype(bool)
     return calculated_commits
 
 
@@ -447,45 +480,84 @@ def _calculate_patch_level(calculated_patches_df: pd.DataFrame) -> pd.DataFrame:
 
     # is_collaboration: True if there is another patch for the same file in the same repository between +/- 3 weeks but with a different author.
     with LogTimeIt("calculating is_collaboration", logger):
-        # pylint: disable=singleton-comparison,compare-to-zero
-        collaboration_df = calculated_patches_df[calculated_patches_df["is_merge"] == False][
-            ["repo_id", "newpath", "date", "aid"]
-        ]
-
-        patches_map = {}
-
-        def _is_collaboration(collaboration_df: pd.DataFrame, x: pd.DataFrame) -> bool:
-            if x["newpath"] not in patches_map:
-                sub_df = collaboration_df[
-                    (collaboration_df["repo_id"] == x["repo_id"]) & (collaboration_df["newpath"] == x["newpath"])
-                ]
-                sub_df.sort_values(["date"])
-                patches_map[x["newpath"]] = sub_df
-
-            sub_df = patches_map[x["newpath"]]
-
-            result = False
+        calculated_patches_df["is_collaboration"] = _calculate_is_collaboration(calculated_patches_df)
+    return calculated_patches_df.set_index(["repo_id", "commit_id", "parent_commit_id", "newpath"])
 
-            from_date = x["date"] - pd.Timedelta("21 days")
-            to_date = x["date"] + pd.Timedelta("21 days")
 
-            # pylint: disable=unused-variable
-            for index, row in sub_df.iterrows():
-                if row["date"] < from_date:
-                    continue
-                elif row["date"] > to_date:
-                    break
-                elif row["aid"] != x["aid"]:
-                    result = True
-                    break
+def _calculate_pull_request_flags(pull_request_commits_df: pd.DataFrame) -> pd.DataFrame:
+    """PR flags of the commits, indexed by commit_id. A commit is in a closed PR, if all of its PRs are closed."""
+    if pull_request_commits_df.empty:
+        return pd.DataFrame(
+            columns=["is_pr_exists", "is_pr_open", "is_pr_closed"], index=pd.Index([], name="commit_id")
+        )
+    return (
+        pull_request_commits_df.assign(
+            is_pr_exists=True,
+            is_pr_open=pull_request_commits_df["state"] == "open",
+            is_pr_closed=pull_request_commits_df["state"] == "closed",
+        )
+        .groupby("commit_id")
+        .agg({"is_pr_exists": "any", "is_pr_open": "any", "is_pr_closed": "all"})
+    )
 
-            return result
 
-        calculated_patches_df["is_collaboration"] = calculated_patches_df.apply(
-            lambda x: _is_collaboration(collaboration_df, x),
-            axis=1,
-        )
-    return calculated_patches_df.set_index(["repo_id", "commit_id", "parent_commit_id", "newpath"])
+def _calculate_is_collaboration(patches_df: pd.DataFrame) -> np.ndarray:
+    """True if there is a non-merge patch of the same file in the same repository between +/- 3 weeks,
+    with a different author.
+
+    The non-merge patches are sorted by file and date, so the patches in the window of a patch are a
+    contiguous range. The range has a different author, if its first author is different, or the author
+    changes before the end of the range.
+    """
+    count = len(patches_df)
+    window = pd.Timedelta("21 days").value
+    file_ids = patches_df.groupby(["repo_id", "newpath"], sort=False).ngroup().to_numpy()
+    dates = np.asarray(pd.DatetimeIndex(patches_df["date"]).asi8)
+
+    # Unknown authors are different from everybody, including themselves
+    author_codes, _ = pd.factorize(patches_df["aid"])
+    unknown = author_codes < 0
+    author_codes[unknown] = -2 - np.flatnonzero(unknown)
+    patch_author_codes = author_codes.copy()
+    patch_author_codes[unknown] -= count
+
+    in_window = ~patches_df["is_merge"].to_numpy(dtype=bool)
+    ref_file_ids, ref_dates = file_ids[in_window], dates[in_window]
+    ref_order = np.lexsort((ref_dates, ref_file_ids))
+    ref_file_ids, ref_dates, ref_author_codes = (
+        ref_file_ids[ref_order],
+        ref_dates[ref_order],
+        author_codes[in_window][ref_order],
+    )
+    ref_count = len(ref_order)
+    if not ref_count:
+        return np.zeros(count, dtype=bool)
+
+    # start of the next run of the same author, for every position
+    run_starts = np.append(np.flatnonzero(ref_author_codes[1:] != ref_author_codes[:-1]) + 1, ref_count)
+    next_author_change = run_starts[np.searchsorted(run_starts, np.arange(ref_count), side="right")]
+
+    lo = _count_sorted_before(ref_file_ids, ref_dates, file_ids, dates - window, inclusive=False)
+    hi = _count_sorted_before(ref_file_ids, ref_dates, file_ids, dates + window, inclusive=True)
+    first = np.minimum(lo, ref_count - 1)
+    return (hi > lo) & ((ref_author_codes[first] != patch_author_codes) | (next_author_change[first] < hi))
+
+
+def _count_sorted_before(
+    sorted_keys: np.ndarray, sorted_values: np.ndarray, keys: np.ndarray, values: np.ndarray, inclusive: bool
+) -> np.ndarray:
+    """Number of (key, value) pairs of the sorted arrays lower than (or equal to) each (key, value) queried,
+    with a single sort instead of a binary search per key."""
+    ref_count = len(sorted_keys)
+    is_query = np.concatenate([np.zeros(ref_count, dtype=bool), np.ones(len(keys), dtype=bool)])
+    # on ties, the queries are sorted after the references when inclusive, before them otherwise
+    tie_breaker = is_query if inclusive else ~is_query
+    order = np.lexsort((tie_breaker, np.concatenate([sorted_values, values]), np.concatenate([sorted_keys, keys])))
+    refs_before = np.cumsum(~is_query[order])
+    query_positions = is_query[order]
+    ret = np.empty(len(keys), dtype=np.int64)
+    ret[order[query_positions] - ref_count] = refs_before[query_positions]
+    return ret
 
 
 def _median_measured_velocity(calculated_commits: pd.DataFrame) -> pd.DataFrame:
@@ -1,8 +1,10 @@
 from datetime import datetime, timezone
+from typing import Optional
 from gitential2.settings import GitentialSettings
 from gitential2.backends import GitentialBackend, init_backend
 from gitential2.secrets import Fernet
 from gitential2.kvstore import KeyValueStore, init_key_value_store
+from gitential2.result_cache import ResultCache, init_result_cache
 from gitential2.license import License, check_license
 from gitential2.integrations import init_integrations
 
@@ -16,6 +18,7 @@ class GitentialContext:
         kvstore: KeyValueStore,
         fernet: Fernet,
         license_: License,
+        result_cache: Optional[ResultCache] = None,
     ):
         self._settings = settings
         self._integrations = integrations
@@ -23,6 +26,7 @@ class GitentialContext:
         self._fernet = fernet
         self._kvstore = kvstore
         self._license = license_
+        self._result_cache = result_cache
 
     def current_time(self) -> datetime:
         return datetime.utcnow().replace(tzinfo=timezone.utc)
@@ -51,11 +55,15 @@ class GitentialContext:
     def license(self) -> License:
         return self._license
 
+    @property
+    def result_cache(self) -> Optional[ResultCache]:
+        return self._result_cache
+
 
 def init_context_from_settings(settings: GitentialSettings) -> GitentialContext:
     kvstore = init_key_value_store(settings)
     integrations = init_integrations(settings, kvstore=kvstore)
-    backend: GitentialBackend = init_backend(settings)
+    backend: GitentialBackend = init_backend(settings, kvstore=kvstore)
     fernet = Fernet(settings)
 
     license_ = check_license()
@@ -66,4 +74,5 @@ def init_context_from_settings(settings: GitentialSettings) -> GitentialContext:
         kvstore=kvstore,
         fernet=fernet,
         license_=license_,
+        result_cache=init_result_cache(settings, kvstore),
     )
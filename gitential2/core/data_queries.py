@@ -79,10 +79,10 @@ def execute_data_query(g: GitentialContext, workspace_id: int, query: DataQuery)
 
     total_count = None
     if query.limit is not None and query.offset is not None:
-        total_count = ibis_query.count().execute()
+        total_count = g.backend.execute_ibis_query(ibis_query.count())
         ibis_query = ibis_query.limit(query.limit, offset=query.offset)
 
-    result: pd.DataFrame = ibis_query.execute()
+    result: pd.DataFrame = g.backend.execute_ibis_query(ibis_query)
     if total_count is None:
         total_count = len(result.index)
     return result, total_count
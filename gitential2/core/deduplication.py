@@ -1,16 +1,24 @@
-from typing import List
-from itertools import combinations
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
 from structlog import get_logger
 from gitential2.datatypes.refresh import RefreshType
 from gitential2.datatypes.authors import AuthorInDB
 from .refresh_v2 import refresh_workspace
-from .authors import authors_matching, merge_authors, delete_author
+from .authors import merge_authors, delete_author, authors_change_lock
+from .author_similarity import (
+    find_similar_tokens,
+    get_authors_to_deduplicate,
+    get_similar_author_ids,
+    remove_authors_to_deduplicate,
+    tokenize_alias,
+)
 from .context import GitentialContext
 
 logger = get_logger(__name__)
 
 
 def deduplicate_authors(g: GitentialContext, workspace_id: int, dry_run: bool = False) -> List[List[AuthorInDB]]:
+    changed_author_ids = get_authors_to_deduplicate(g, workspace_id)
     all_authors = list(g.backend.authors.all(workspace_id))
     clusters: List[List[AuthorInDB]] = _create_author_clusters(all_authors)
     if not dry_run:
@@ -18,34 +26,106 @@ def deduplicate_authors(g: GitentialContext, workspace_id: int, dry_run: bool =
             for cluster in clusters:
                 merge_authors(g, workspace_id, cluster)
         removed = remove_empty_authors(g, workspace_id)
+        with authors_change_lock(g, workspace_id):
+            remove_authors_to_deduplicate(g, workspace_id, changed_author_ids)
         if clusters or removed:
             refresh_workspace(g, workspace_id, refresh_type=RefreshType.commit_calculations_only)
     return clusters
 
 
-def _create_author_clusters(all_authors: List[AuthorInDB]) -> List[List[AuthorInDB]]:
-    clusters: List[List[AuthorInDB]] = []
+def deduplicate_changed_authors(
+    g: GitentialContext, workspace_id: int, dry_run: bool = False
+) -> List[List[AuthorInDB]]:
+    """Deduplicates only the authors got new aliases since the last deduplication.
 
-    def _add_to_the_cluster(first, second):
+    These are clustered with the authors the similarity index finds for their aliases, instead of re-clustering
+    the whole author table.
+    """
+    with authors_change_lock(g, workspace_id):
+        changed_author_ids = get_authors_to_deduplicate(g, workspace_id)
+        if not changed_author_ids:
+            return []
+        changed_authors = g.backend.authors.get_authors_by_author_ids(workspace_id, sorted(changed_author_ids))
+        similar_author_ids = get_similar_author_ids(
+            g, workspace_id, [alias for author in changed_authors for alias in author.aliases]
+        )
+    authors = g.backend.authors.get_authors_by_author_ids(
+        workspace_id, sorted(similar_author_ids | {author.id for author in changed_authors})
+    )
+    clusters = _create_author_clusters(sorted(authors, key=lambda author: author.id))
+    if not dry_run:
         for cluster in clusters:
-            if first in cluster and second in cluster:
-                break
-            if first in cluster and second not in cluster:
-                cluster.append(second)
-                break
-            if second in cluster and first not in cluster:
-                cluster.append(first)
-                break
-        else:
-            # Create a new cluster
-            clusters.append([first, second])
-
-    for first, second in combinations(all_authors, 2):
-        if first.id != second.id and authors_matching(first, second):
-            _add_to_the_cluster(first, second)
+            merge_authors(g, workspace_id, cluster)
+        with authors_change_lock(g, workspace_id):
+            remove_authors_to_deduplicate(g, workspace_id, changed_author_ids)
+        if clusters:
+            refresh_workspace(g, workspace_id, refresh_type=RefreshType.commit_calculations_only)
     return clusters
 
 
+class UnionFind:
+    def __init__(self, size: int):
+        self._parents = list(range(size))
+        self._sizes = [1] * size
+
+    def find(self, i: int) -> int:
+        root = i
+        while self._parents[root] != root:
+            root = self._parents[root]
+        while self._parents[i] != root:
+            self._parents[i], i = root, self._parents[i]
+        return root
+
+    def union(self, i: int, j: int):
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i != root_j:
+            if self._sizes[root_i] < self._sizes[root_j]:
+                root_i, root_j = root_j, root_i
+            self._parents[root_j] = root_i
+            self._sizes[root_i] += self._sizes[root_j]
+
+
+def _create_author_clusters(all_authors: List[AuthorInDB]) -> List[List[AuthorInDB]]:
+    """Groups the matching authors (see authors_matching), the matches are transitive.
+
+    Instead of comparing every pair of authors, the candidate pairs come from blocking keys: the emails and
+    the logins of the aliases, and the n-gram signatures of their tokens. Only the candidate token pairs are
+    scored, and the signatures never miss a pair above the similarity threshold. The clusters are ordered by
+    their first author, the authors in the order of `all_authors`.
+    """
+    union_find = UnionFind(len(all_authors))
+    for i, j in _find_matching_author_pairs(all_authors):
+        if all_authors[i].id != all_authors[j].id:
+            union_find.union(i, j)
+
+    clusters: Dict[int, List[AuthorInDB]] = defaultdict(list)
+    for i, author in enumerate(all_authors):
+        clusters[union_find.find(i)].append(author)
+    return [cluster for cluster in clusters.values() if len(cluster) > 1]
+
+
+def _find_matching_author_pairs(all_authors: List[AuthorInDB]) -> Iterable[Tuple[int, int]]:
+    blocks: Dict[Tuple[str, str], Set[int]] = defaultdict(set)
+    for i, author in enumerate(all_authors):
+        for alias in author.aliases:
+            if alias.email:
+                blocks[("email", alias.email)].add(i)
+            if alias.login:
+                blocks[("login", alias.login)].add(i)
+            for token in tokenize_alias(alias):
+                if token:
+                    blocks[("token", token)].add(i)
+
+    for block in blocks.values():
+        first, *rest = sorted(block)
+        for other in rest:
+            yield first, other
+
+    token_authors = {token: indexes for (kind, token), indexes in blocks.items() if kind == "token"}
+    for first_token, second_token in find_similar_tokens(list(token_authors.keys())):
+        yield min(token_authors[first_token]), min(token_authors[second_token])
+
+
 def remove_empty_authors(g, workspace_id) -> List[int]:
     removed = []
     for author in g.backend.authors.all(workspace_id):
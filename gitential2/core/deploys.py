@@ -8,6 +8,7 @@ from gitential2.datatypes.extraction import ExtractedCommitId
 
 from .context import GitentialContext
 from .authors import developer_map_callback
+from .stats_cache import bump_data_version
 
 logger = get_logger(__name__)
 
@@ -28,6 +29,7 @@ def delete_deploy_by_id(g: GitentialContext, workspace_id: int, deploy_id: str)
 
 def _delete_deploy_commits_by_deploy_id(g: GitentialContext, workspace_id: int, deploy_id: str) -> bool:
     g.backend.deploy_commits.delete_deploy_commits_by_deploy_id(workspace_id=workspace_id, deploy_id=deploy_id)
+    bump_data_version(g, workspace_id)
     return True
 
 
@@ -43,6 +45,7 @@ def recalculate_deploy_commits(g: GitentialContext, workspace_id: int):
                     environment=environment,
                     deployed_commit_obj=deployed_commit,
                 )
+    bump_data_version(g, workspace_id)
 
 
 def _get_repo_id_by_repo_name(
@@ -17,6 +17,7 @@ from gitential2.datatypes.its_projects import ITSProjectCreate, ITSProjectInDB
 from gitential2.datatypes.refresh import RefreshStrategy, RefreshType
 from gitential2.datatypes.refresh_statuses import ITSProjectRefreshPhase, ITSProjectRefreshStatus
 from gitential2.datatypes.userinfos import UserInfoInDB
+from gitential2.extraction.output import OutputHandler
 from gitential2.settings import IntegrationType
 from gitential2.utils import find_first, is_string_not_empty, get_user_id_or_raise_exception, is_list_not_empty
 from .credentials import (
@@ -174,14 +175,18 @@ def refresh_its_project(
                     count_recently_updated_items=len(recently_updated_issues),
                     count_processed_items=count_processed_items,
                 )
-                for ih in recently_updated_issues:
-                    if force or _is_issue_new_or_updated(g, workspace_id, ih):
-                        collect_and_save_data_for_issue(g, workspace_id, itsp=itsp, issue_id_or_key=ih.api_id)
-                    else:
-                        log.info("Issue is up-to-date", issue_api_id=ih.api_id, issue_key=ih.key)
-                    count_processed_items += 1
-                    update_itsp_status(g, workspace_id, itsp_id, count_processed_items=count_processed_items)
-                    # TODO: increment count in status
+                # The issues are written out together, when the buffer of the output handler is full
+                with g.backend.output_handler(workspace_id) as output:
+                    for ih in recently_updated_issues:
+                        if force or _is_issue_new_or_updated(g, workspace_id, ih):
+                            collect_and_save_data_for_issue(
+                                g, workspace_id, itsp=itsp, issue_id_or_key=ih.api_id, output=output
+                            )
+                        else:
+                            log.info("Issue is up-to-date", issue_api_id=ih.api_id, issue_key=ih.key)
+                        count_processed_items += 1
+                        update_itsp_status(g, workspace_id, itsp_id, count_processed_items=count_processed_items)
+                        # TODO: increment count in status
             else:
                 log.info(SKIP_REFRESH_MSG, workspace_id=workspace_id, itsp_id=itsp.id, reason="no fresh credential")
 
@@ -519,6 +524,7 @@ def collect_and_save_data_for_issue(
     itsp: Union[ITSProjectInDB, int],
     issue_id_or_key: str,
     token: Optional[dict] = None,
+    output: Optional[OutputHandler] = None,
 ):
     dev_map_callback = partial(developer_map_callback, g=g, workspace_id=workspace_id)
     itsp = (
@@ -548,7 +554,11 @@ def collect_and_save_data_for_issue(
 
         log.info("Starting collection of issue data")
         issue_data = integration.get_all_data_for_issue(token, itsp, issue_id_or_key, dev_map_callback)
-        _save_collected_issue_data(g, workspace_id, issue_data)
+        if output is not None:
+            _write_collected_issue_data(output, issue_data)
+        else:
+            with g.backend.output_handler(workspace_id) as issue_output:
+                _write_collected_issue_data(issue_output, issue_data)
         log.info(
             "Issue data saved",
             issue_id=issue_data.issue.id,
@@ -570,8 +580,7 @@ def get_available_its_project_groups(g: GitentialContext, workspace_id: int) ->
     return itsp_groups
 
 
-def _save_collected_issue_data(g: GitentialContext, workspace_id: int, issue_data: ITSIssueAllData):
-    output = g.backend.output_handler(workspace_id)
+def _write_collected_issue_data(output: OutputHandler, issue_data: ITSIssueAllData):
     output.write(ExtractedKind.ITS_ISSUE, issue_data.issue)
     for change in issue_data.changes:
         output.write(ExtractedKind.ITS_ISSUE_CHANGE, change)
@@ -1,4 +1,5 @@
 import traceback
+from contextlib import ExitStack
 from datetime import datetime, timedelta, timezone
 from functools import partial
 from typing import Callable, Optional
@@ -13,10 +14,18 @@ from gitential2.datatypes.extraction import LocalGitRepository
 from gitential2.datatypes.credentials import CredentialInDB
 
 from gitential2.utils.tempdir import TemporaryDirectory
-from gitential2.extraction.repository import extract_incremental_local, clone_repository, extract_branches
+from gitential2.extraction.repository import (
+    extract_incremental_local,
+    clone_repository,
+    extract_branches,
+    get_stale_branches_of,
+)
+from gitential2.extraction.mirrors import create_mirror_store
 from gitential2.exceptions import LockError
 
 from .calculations import recalculate_repository_values
+from .branch_tips import delete_branch_tips, get_previous_branch_tips, set_branch_tips
+from .calculation_intervals import DirtyIntervalRecorder
 from .context import GitentialContext
 from .authors import (
     fix_author_aliases,
@@ -30,6 +39,7 @@ from .repositories import list_project_repositories
 from .refresh_statuses import get_repo_refresh_status, update_repo_refresh_status
 from .its import get_itsp_status, list_project_its_projects, refresh_its_project, update_itsp_status
 from .deploys import recalculate_deploy_commits
+from .stats_cache import bump_data_version
 
 logger = get_logger(__name__)
 
@@ -316,15 +326,18 @@ def refresh_repository_commits(g: GitentialContext, workspace_id: int, repositor
             commits_refresh_scheduled=False,
         )
         return
+    if force:
+        # The branches of the rebuilt commits are extracted from scratch too
+        delete_branch_tips(g, workspace_id, repository_id)
 
-    with TemporaryDirectory() as workdir:
+    with TemporaryDirectory() as workdir, ExitStack() as stack:
         try:
             local_repo = _refresh_repository_commits_clone_phase(
-                g, workspace_id, repository, workdir, _update_state, force
+                g, workspace_id, repository, workdir, _update_state, force, stack
             )
             if local_repo:
                 _refresh_repository_commits_extract_phase(g, workspace_id, repository, local_repo, _update_state, force)
-                _refresh_repository_commits_persist_phase(g, workspace_id, repository_id, _update_state)
+                _refresh_repository_commits_persist_phase(g, workspace_id, repository_id, _update_state, force)
 
             _update_state(
                 commits_phase=RefreshCommitsPhase.done,
@@ -339,7 +352,7 @@ def refresh_repository_commits(g: GitentialContext, workspace_id: int, repositor
             # attribute it means this connection experienced a "disconnect"
             if err.connection_invalidated:
                 # Rerun persist phase
-                _refresh_repository_commits_persist_phase(g, workspace_id, repository_id, _update_state)
+                _refresh_repository_commits_persist_phase(g, workspace_id, repository_id, _update_state, force)
                 _update_state(
                     commits_phase=RefreshCommitsPhase.done,
                     commits_in_progress=False,
@@ -376,6 +389,7 @@ def _refresh_repository_commits_clone_phase(
     workdir: TemporaryDirectory,
     _update_state: Callable,
     force: bool,
+    stack: ExitStack,
 ) -> Optional[LocalGitRepository]:
     logger.info(
         "Cloning repository",
@@ -409,10 +423,24 @@ def _refresh_repository_commits_clone_phase(
         if _should_skip_refresh_clone_phase(g, credential, workspace_id, repository, force):
             return None
 
+        repository_credential = credential.to_repository_credential(g.fernet) if credential else None
+        mirror_store = create_mirror_store(g.settings)
+        if mirror_store:
+            try:
+                # The mirror stays locked until the extract phase is finished
+                return stack.enter_context(mirror_store.mirror(repository, credentials=repository_credential))
+            except Exception:  # pylint: disable=broad-except
+                logger.exception(
+                    "Failed to update repository mirror, falling back to a fresh clone",
+                    workspace_id=workspace_id,
+                    repository_id=repository.id,
+                    repository_name=repository.name,
+                )
+
         local_repo = clone_repository(
             repository,
             destination_path=workdir.path,
-            credentials=credential.to_repository_credential(g.fernet) if credential else None,
+            credentials=repository_credential,
         )
         return local_repo
     return None
@@ -508,25 +536,24 @@ def _refresh_repository_commits_extract_phase(
         repository_name=repository.name,
         commits_we_already_have=len(commits_we_already_have),
     )
-    output = g.backend.output_handler(workspace_id)
-
-    extraction_state = extract_incremental_local(
-        local_repo,
-        output=output,
-        settings=g.settings,
-        previous_state=previous_state,
-        commits_we_already_have=commits_we_already_have,
-    )
+    with DirtyIntervalRecorder(g, workspace_id, g.backend.output_handler(workspace_id)) as output:
+        extraction_state = extract_incremental_local(
+            local_repo,
+            output=output,
+            settings=g.settings,
+            previous_state=previous_state,
+            commits_we_already_have=commits_we_already_have,
+        )
     set_extraction_state(g, workspace_id, repository.id, extraction_state)
 
 
 def _refresh_repository_commits_persist_phase(
-    g: GitentialContext, workspace_id: int, repository_id: int, _update_state: Callable
+    g: GitentialContext, workspace_id: int, repository_id: int, _update_state: Callable, force: bool = False
 ):
     _update_state(
         commits_phase=RefreshCommitsPhase.persist,
     )
-    recalculate_repository_values(g, workspace_id, repository_id)
+    recalculate_repository_values(g, workspace_id, repository_id, full_rebuild=force)
 
 
 def _extraction_state_key(workspace_id: int, repository_id: int) -> str:
@@ -599,21 +626,22 @@ def refresh_repository_pull_requests(g: GitentialContext, workspace_id: int, rep
                 _end_processing_no_error()
                 return
 
-            output = g.backend.output_handler(workspace_id)
-
             if hasattr(integration, "collect_pull_requests"):
                 token = credential.to_token_dict(g.fernet)
 
-                collection_result = integration.collect_pull_requests(
-                    repository=repository,
-                    token=token,
-                    update_token=get_update_token_callback(g, credential),
-                    output=output,
-                    author_callback=_author_callback_partial,
-                    prs_we_already_have=prs_we_already_have,
-                    limit=200,
-                    repo_analysis_limit_in_days=g.settings.extraction.repo_analysis_limit_in_days,
-                )
+                with DirtyIntervalRecorder(g, workspace_id, g.backend.output_handler(workspace_id)) as output:
+                    collection_result = integration.collect_pull_requests(
+                        repository=repository,
+                        token=token,
+                        update_token=get_update_token_callback(g, credential),
+                        output=output,
+                        author_callback=_author_callback_partial,
+                        prs_we_already_have=prs_we_already_have,
+                        limit=200,
+                        repo_analysis_limit_in_days=g.settings.extraction.repo_analysis_limit_in_days,
+                        max_workers=g.settings.extraction.pr_collection_workers,
+                    )
+                bump_data_version(g, workspace_id)
                 logger.info(
                     "collect_pull_requests results",
                     repository_name=repository.name,
@@ -658,6 +686,7 @@ def extract_project_branches(
     workspace_id: int,
     project_id: int,
     strategy: RefreshStrategy = RefreshStrategy.parallel,
+    force: bool = False,
 ):
     for repo in list_project_repositories(g=g, workspace_id=workspace_id, project_id=project_id):
         if strategy == RefreshStrategy.parallel:
@@ -667,14 +696,16 @@ def extract_project_branches(
                 params={
                     "workspace_id": workspace_id,
                     "repository_id": repo.id,
+                    "force": force,
                 },
             )
         else:
-            extract_repository_branches(g, workspace_id, repo.id)
+            extract_repository_branches(g, workspace_id, repo.id, force=force)
 
 
-def extract_repository_branches(g: GitentialContext, workspace_id: int, repository_id: int):
+def extract_repository_branches(g: GitentialContext, workspace_id: int, repository_id: int, force: bool = False):
     repo = g.backend.repositories.get_or_error(workspace_id, repository_id)
+    previous_tips = get_previous_branch_tips(g, workspace_id, repository_id) if not force else None
     with TemporaryDirectory() as workdir:
         with acquire_credential(
             g,
@@ -688,8 +719,21 @@ def extract_repository_branches(g: GitentialContext, workspace_id: int, reposito
                 destination_path=workdir.path,
                 credentials=credential.to_repository_credential(g.fernet) if credential else None,
             )
-            output = g.backend.output_handler(workspace_id)
-            extract_branches(g.settings, local_repo, output)
+            # The old rows of the deleted and rewound branches would stay next to the new ones
+            stale_branches = get_stale_branches_of(local_repo, previous_tips) if previous_tips else None
+            deleted = g.backend.extracted_commit_branches.delete_branches_of_repository(
+                workspace_id, repository_id, branches=stale_branches
+            )
+            logger.info(
+                "Deleted the rows of the stale branches",
+                workspace_id=workspace_id,
+                repository_id=repository_id,
+                branches=stale_branches,
+                deleted=deleted,
+            )
+            with g.backend.output_handler(workspace_id) as output:
+                tips = extract_branches(g.settings, local_repo, output, previous_tips=previous_tips)
+            set_branch_tips(g, workspace_id, repository_id, tips)
 
 
 def _author_callback(
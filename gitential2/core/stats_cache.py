@@ -0,0 +1,58 @@
+import hashlib
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from gitential2.datatypes.stats import Query, FilterName
+
+from .context import GitentialContext
+
+# Changing the key format or the cached values must change this as well
+STATS_CACHE_FORMAT_VERSION = 1
+
+# Filters where the order of the values doesn't matter
+_UNORDERED_FILTERS = {FilterName.repo_ids.value, FilterName.developer_ids.value, FilterName.author_ids.value}
+
+
+def _data_version_key(workspace_id: int) -> str:
+    return f"ws-{workspace_id}:data-version"
+
+
+def _initial_data_version() -> int:
+    # Not starting from zero, so the results cached before the counter was lost are never reused
+    return time.time_ns() // 1000
+
+
+def get_data_version(g: GitentialContext, workspace_id: int) -> int:
+    """The version of the data the stats are calculated from, changes on every write of the calculated data"""
+    version = g.kvstore.get_value(_data_version_key(workspace_id))
+    if isinstance(version, (int, str)):
+        return int(version)
+    return g.kvstore.increment_value(_data_version_key(workspace_id), _initial_data_version())
+
+
+def bump_data_version(g: GitentialContext, workspace_id: int) -> int:
+    if g.kvstore.get_value(_data_version_key(workspace_id)) is None:
+        return g.kvstore.increment_value(_data_version_key(workspace_id), _initial_data_version())
+    return g.kvstore.increment_value(_data_version_key(workspace_id))
+
+
+def normalize_query(query: Query) -> dict:
+    ret = jsonable_encoder(query)
+    for filter_name, value in ret["filters"].items():
+        if filter_name in _UNORDERED_FILTERS and isinstance(value, list):
+            ret["filters"][filter_name] = sorted(set(value), key=str)
+    return ret
+
+
+def query_hash(query: Query) -> str:
+    canonical = json.dumps(normalize_query(query), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def stats_cache_key(g: GitentialContext, workspace_id: int, query: Query) -> str:
+    return (
+        f"ws-{workspace_id}:stats-v{STATS_CACHE_FORMAT_VERSION}:"
+        f"{get_data_version(g, workspace_id)}:{query_hash(query)}"
+    )
@@ -0,0 +1,97 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from structlog import get_logger
+
+from gitential2.exceptions import QueryTimeoutException
+from gitential2.settings import GitentialSettings
+
+logger = get_logger(__name__)
+
+
+class MultiQueryExecutor:
+    """Runs the queries of a request concurrently, on a thread pool shared by all of the requests.
+
+    A request never has more than `max_concurrency` queries on the pool at the same time, so one large
+    dashboard cannot take the whole pool. The timeout of a query starts when a pool thread picks it up.
+    The failed and timed out queries are returned as exceptions, the others still have their results.
+    """
+
+    # How often the queries submitted but not yet picked up by a pool thread are checked
+    POLL_INTERVAL_SECONDS = 0.05
+
+    def __init__(self, pool_size: int):
+        self._pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="multi-stats")
+
+    def run(
+        self, calls: Dict[str, Callable[[], Any]], max_concurrency: int, timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        waiting: List[Tuple[str, Callable[[], Any]]] = list(calls.items())
+        running: Dict[Future, str] = {}
+        # The timed out queries keep their pool threads until they finish, these count against the concurrency
+        abandoned: Set[Future] = set()
+        started_at: Dict[str, float] = {}
+        ret: Dict[str, Any] = {}
+
+        def _started(name: str, fn: Callable[[], Any]) -> Any:
+            started_at[name] = time.monotonic()
+            return fn()
+
+        while waiting or running:
+            abandoned = {future for future in abandoned if not future.done()}
+            while waiting and len(running) + len(abandoned) < max_concurrency:
+                name, fn = waiting.pop(0)
+                running[self._pool.submit(_started, name, fn)] = name
+
+            wait_timeout = self._wait_timeout(list(running.values()), started_at, timeout)
+            done, _ = wait(list(running.keys()) + list(abandoned), timeout=wait_timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if future not in running:
+                    continue
+                name = running.pop(future)
+                try:
+                    ret[name] = future.result()
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.exception("Query failed", name=name)
+                    ret[name] = e
+
+            now = time.monotonic()
+            for future, name in list(running.items()):
+                if timeout is not None and name in started_at and started_at[name] + timeout <= now:
+                    # A query already running cannot be interrupted, but the request doesn't wait for it anymore
+                    del running[future]
+                    abandoned.add(future)
+                    logger.warning("Query timed out", name=name, timeout=timeout)
+                    ret[name] = QueryTimeoutException(f"Query timed out after {timeout} seconds.")
+
+        return {name: ret[name] for name in calls}
+
+    def _wait_timeout(
+        self, running_names: List[str], started_at: Dict[str, float], timeout: Optional[float]
+    ) -> Optional[float]:
+        """Seconds until the first deadline of the running queries, None when there is nothing to time out"""
+        if timeout is None or not running_names:
+            return None
+        deadlines = [started_at[name] + timeout for name in running_names if name in started_at]
+        if len(deadlines) < len(running_names):
+            # The deadlines of the queries picked up in the meantime are checked soon
+            deadlines.append(time.monotonic() + self.POLL_INTERVAL_SECONDS)
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+_executor: Optional[MultiQueryExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_multi_query_executor(settings: GitentialSettings) -> MultiQueryExecutor:
+    global _executor  # pylint: disable=global-statement
+    with _executor_lock:
+        if _executor is None:
+            _executor = MultiQueryExecutor(pool_size=settings.stats.multi_stats_pool_size)
+        return _executor
@@ -1,4 +1,5 @@
 # pylint: disable=too-complex,too-many-branches
+import json
 import math
 from typing import Generator, List, Any, Dict, Optional, cast, Tuple
 from datetime import datetime, date, timedelta, timezone
@@ -31,8 +32,10 @@ from gitential2.datatypes.sprints import Sprint
 
 from .context import GitentialContext
 from .authors import list_active_author_ids
+from .stats_cache import normalize_query, stats_cache_key
+from .stats_executor import get_multi_query_executor
 
-from ..exceptions import NotFoundException
+from ..exceptions import NotFoundException, QueryTimeoutException
 
 logger = get_logger(__name__)
 
@@ -487,6 +490,11 @@ class IbisQuery:
         ibis_tables = self.g.backend.get_ibis_tables(self.workspace_id)
         ibis_table = ibis_tables.get_table(self.query.table_def)
         ibis_metrics = _prepare_metrics(self.query.metrics, self.query.table_def, ibis_tables, ibis_table, self.query)
+        result = self._execute_metrics(ibis_tables, ibis_table, ibis_metrics)
+        result = _sort_dataframe(result, query=self.query)
+        return QueryResult(query=self.query, values=result)
+
+    def _execute_metrics(self, ibis_tables: IbisTables, ibis_table, ibis_metrics: list) -> pd.DataFrame:
         ibis_dimensions = (
             _prepare_dimensions(
                 self.query.dimensions,
@@ -514,12 +522,81 @@ class IbisQuery:
             compiled = ibis.postgres.compile(ibis_query)
             logger.debug("**IBIS QUERY**", compiled_query=str(compiled), query=ibis_query)
 
-            result = ibis_tables.conn.execute(ibis_query)
+            return ibis_tables.conn.execute(ibis_query)
         else:
-            result = pd.DataFrame()
+            return pd.DataFrame()
 
-        result = _sort_dataframe(result, query=self.query)
-        return QueryResult(query=self.query, values=result)
+
+class FusedIbisQuery(IbisQuery):
+    """Aggregate queries which only differ in their metrics, executed as one query with all of the metrics.
+
+    The result is split back by the names of the metric columns of the original queries.
+    """
+
+    def __init__(self, g: GitentialContext, workspace_id: int, queries: Dict[str, Query]):
+        first = next(iter(queries.values()))
+        metrics: list = []
+        for query in queries.values():
+            metrics += [metric for metric in query.metrics if metric not in metrics]
+        super().__init__(g, workspace_id, first.copy(update={"metrics": metrics}))
+        self.queries = queries
+
+    def execute_all(self) -> Dict[str, QueryResult]:
+        logger.debug("Executing fused query", queries=list(self.queries.keys()), workspace_id=self.workspace_id)
+        ibis_tables = self.g.backend.get_ibis_tables(self.workspace_id)
+        ibis_table = ibis_tables.get_table(self.query.table_def)
+
+        metric_names: Dict[str, List[str]] = {}
+        ibis_metrics: dict = {}
+        for name, query in self.queries.items():
+            query_metrics = _prepare_metrics(query.metrics, query.table_def, ibis_tables, ibis_table, query)
+            for ibis_metric in query_metrics:
+                metric_name = ibis_metric.get_name()
+                if metric_name in ibis_metrics and not ibis_metrics[metric_name].equals(ibis_metric):
+                    logger.debug("Conflicting metric names, executing the queries one by one", metric=metric_name)
+                    return {
+                        name: IbisQuery(self.g, self.workspace_id, query).execute()
+                        for name, query in self.queries.items()
+                    }
+                ibis_metrics[metric_name] = ibis_metric
+            metric_names[name] = [ibis_metric.get_name() for ibis_metric in query_metrics]
+
+        result = self._execute_metrics(ibis_tables, ibis_table, list(ibis_metrics.values()))
+        dimension_columns = [column for column in result.columns if column not in ibis_metrics]
+        ret = {}
+        for name, query in self.queries.items():
+            values = result[dimension_columns + metric_names[name]].copy() if metric_names[name] else pd.DataFrame()
+            ret[name] = QueryResult(query=query, values=_sort_dataframe(values, query=query))
+        return ret
+
+
+def _query_fusion_signature(query: Query) -> Optional[str]:
+    """Queries with the same signature can be fused, None if the query cannot be fused at all"""
+    if query.type != QueryType.aggregate:
+        return None
+    try:
+        table_def = query.table_def
+    except ValueError:
+        return None
+    signature = normalize_query(query.copy(update={"metrics": []}))
+    signature["table_def"] = table_def
+    return json.dumps(signature, sort_keys=True)
+
+
+def plan_query_fusion(queries: Dict[str, Query]) -> List[Dict[str, Query]]:
+    """Groups the queries which can be executed as one query"""
+    groups: Dict[Any, Dict[str, Query]] = {}
+    for name, query in queries.items():
+        signature = _query_fusion_signature(query)
+        group_key = signature if signature is not None else ("standalone", name)
+        group = groups.setdefault(group_key, {})
+        # the table of the fused query has to be the same, eg. commit metrics are not joined with patches
+        # just because another query has a patch metric
+        fused_metrics = [m for q in group.values() for m in q.metrics] + list(query.metrics)
+        if group and query.copy(update={"metrics": fused_metrics}).table_def != next(iter(group.values())).table_def:
+            group = groups.setdefault(("standalone", name), {})
+        group[name] = query
+    return list(groups.values())
 
 
 def _sort_dataframe(result: pd.DataFrame, query: Query) -> pd.DataFrame:
@@ -683,13 +760,96 @@ def _calculate_timestamps_between(
 
 def collect_stats_v2_raw(g: GitentialContext, workspace_id: int, query: Query) -> QueryResult:
     prepared_query = prepare_query(g, workspace_id, query)
-    result = _add_missing_timestamp_to_result(IbisQuery(g, workspace_id, prepared_query).execute())
-    return result
+    return _execute_prepared_query(g, workspace_id, prepared_query)
+
+
+def _execute_prepared_query(g: GitentialContext, workspace_id: int, prepared_query: Query) -> QueryResult:
+    return _add_missing_timestamp_to_result(IbisQuery(g, workspace_id, prepared_query).execute())
+
+
+def _execute_prepared_queries(
+    g: GitentialContext, workspace_id: int, prepared_queries: Dict[str, Query]
+) -> Dict[str, dict]:
+    if len(prepared_queries) == 1:
+        results = {name: IbisQuery(g, workspace_id, query).execute() for name, query in prepared_queries.items()}
+    else:
+        results = FusedIbisQuery(g, workspace_id, prepared_queries).execute_all()
+    return {name: _to_jsonable_result(_add_missing_timestamp_to_result(result)) for name, result in results.items()}
+
+
+def _get_cached_result(
+    g: GitentialContext, workspace_id: int, prepared_query: Query
+) -> Tuple[Optional[str], Optional[dict]]:
+    if not g.result_cache:
+        return None, None
+    # The key has to be calculated before the query is executed, so a result is never
+    # cached with a data version newer than the data it was calculated from
+    cache_key = stats_cache_key(g, workspace_id, prepared_query)
+    cached = g.result_cache.get(cache_key)
+    if cached is not None:
+        logger.debug("Stats result served from cache", workspace_id=workspace_id, cache_key=cache_key)
+    return cache_key, cached
 
 
 def collect_stats_v2(g: GitentialContext, workspace_id: int, query: Query):
-    result = collect_stats_v2_raw(g, workspace_id, query)
-    return _to_jsonable_result(result)
+    prepared_query = prepare_query(g, workspace_id, query)
+    cache_key, cached = _get_cached_result(g, workspace_id, prepared_query)
+    if cached is not None:
+        return cached
+    result = _to_jsonable_result(_execute_prepared_query(g, workspace_id, prepared_query))
+    if g.result_cache and cache_key:
+        g.result_cache.set(cache_key, result)
+    return result
+
+
+def collect_multi_stats_v2(g: GitentialContext, workspace_id: int, queries: Dict[str, Query]) -> Dict[str, dict]:
+    """Collects the stats of independent queries concurrently. The queries differing only in their metrics
+    are executed as one query. A failed query has an error instead of its result, the rest of the results
+    are still returned."""
+    results: Dict[str, Any] = {}
+    to_be_executed: Dict[str, Query] = {}
+    cache_keys: Dict[str, Optional[str]] = {}
+    for name, query in queries.items():
+        try:
+            prepared_query = prepare_query(g, workspace_id, query)
+            cache_keys[name], cached = _get_cached_result(g, workspace_id, prepared_query)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.exception("Failed to prepare query", name=name, workspace_id=workspace_id)
+            results[name] = e
+            continue
+        if cached is not None:
+            results[name] = cached
+        else:
+            to_be_executed[name] = prepared_query
+
+    groups = plan_query_fusion(to_be_executed)
+    group_results = get_multi_query_executor(g.settings).run(
+        {str(i): partial(_execute_prepared_queries, g, workspace_id, group) for i, group in enumerate(groups)},
+        max_concurrency=g.settings.stats.multi_stats_max_concurrency_per_request,
+        timeout=g.settings.stats.query_timeout_seconds,
+    )
+    for i, group in enumerate(groups):
+        group_result = group_results[str(i)]
+        for name in group:
+            if isinstance(group_result, Exception):
+                results[name] = group_result
+                continue
+            results[name] = group_result[name]
+            cache_key = cache_keys.get(name)
+            if g.result_cache and cache_key:
+                g.result_cache.set(cache_key, group_result[name])
+
+    return {
+        name: _to_error_result(results[name]) if isinstance(results[name], Exception) else results[name]
+        for name in queries
+    }
+
+
+def _to_error_result(e: Exception) -> dict:
+    # The details of the other errors are only logged, they can contain SQL and database internals
+    if isinstance(e, QueryTimeoutException):
+        return {"error": {"type": "timeout", "message": str(e)}}
+    return {"error": {"type": "error", "message": "Query failed."}}
 
 
 def prepare_query(g: GitentialContext, workspace_id: int, query: Query) -> Query:
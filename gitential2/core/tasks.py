@@ -22,6 +22,7 @@ from gitential2.settings import GitentialSettings, load_settings
 from .context import GitentialContext
 from .its import refresh_cache_of_its_projects_for_user_or_users
 from .repositories import refresh_cache_of_repositories_for_user_or_users
+from .stats_cache import bump_data_version
 
 logger = get_logger(__name__)
 
@@ -235,6 +236,8 @@ def refresh_materialized_views(settings: Optional[GitentialSettings] = None):
 
     for wid in [w.id for w in workspaces]:
         result = g.backend.refresh_materialized_views_in_workspace(workspace_id=wid)
+        if result:
+            bump_data_version(g, wid)
         logger.info(
             f"Refreshing materialized views in workspace was {'successful' if result else 'failed'}.",
             workspace_id=wid,
@@ -55,8 +55,10 @@ class ExtractProjectBranchesParams(BaseModel):
     workspace_id: int
     project_id: int
     strategy: RefreshStrategy = RefreshStrategy.parallel
+    force: bool = False
 
 
 class ExtractRepositoryBranchesParams(BaseModel):
     workspace_id: int
     repository_id: int
+    force: bool = False
@@ -295,6 +295,19 @@ class QueryResult(BaseModel):
 #     type  = "aggregate"  # or "select"
 
 
+class IbisPoolMetrics(BaseModel):
+    pool_size: int
+    capacity: int
+    checked_out: int
+    waiting: int
+    saturation: float
+    checkouts: int
+    saturated_checkouts: int
+    total_wait_seconds: float
+    max_wait_seconds: float
+    avg_wait_seconds: float
+
+
 class IbisTables:
     conn: Any
     pull_requests: Any
@@ -28,3 +28,11 @@ class InvalidStateException(GitentialException):
 
 class LockError(GitentialException):
     pass
+
+
+class QueryTimeoutException(GitentialException):
+    pass
+
+
+class RateLimitException(GitentialException):
+    pass
@@ -15,7 +15,7 @@ import xlsxwriter
 from gitential2.datatypes.export import ExportableModel
 from gitential2.datatypes.extraction import Langtype
 from gitential2.backends.sql import json_dumps
-from gitential2.backends.sql.tables import get_workspace_metadata
+from gitential2.backends.sql.schema_cache import workspace_schema_cache
 
 
 class Exporter:
@@ -119,7 +119,7 @@ class SQLiteExporter(Exporter):
             f"sqlite:///{self.sqlite_file}",
             json_serializer=json_dumps,
         )
-        self._workspace_tables, _ = get_workspace_metadata(schema=None)
+        self._workspace_tables, _ = workspace_schema_cache.get_metadata(schema=None)
         self._workspace_tables.create_all(self._engine)
         self._cache: List[tuple] = []
         self._counter = 0
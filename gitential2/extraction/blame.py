@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import pygit2
+from structlog import get_logger
+
+logger = get_logger(__name__)
+
+# Number of file blames kept in memory by an engine, one entry is one list of commit ids per file
+BLAME_CACHE_SIZE = 512
+# A cached blame is reused for a later commit up to this many first parents away
+MAX_REUSE_DISTANCE = 1000
+
+DELETION = "-"
+ADDITION = "+"
+CONTEXT = " "
+
+
+class _BlameState:
+    """Line origins of a file version: line_origins[lineno - 1] is the commit id the line is attributed to."""
+
+    __slots__ = ("commit_id", "line_origins")
+
+    def __init__(self, commit_id: str, line_origins: List[str]):
+        self.commit_id = commit_id
+        self.line_origins = line_origins
+
+
+class BlameEngine:
+    """In-process replacement of `git blame` for the rewrite calculation.
+
+    The blame of a file version is calculated with libgit2 against the already open repository,
+    and kept in an LRU cache keyed by the path and blob id. When a commit modifies the file,
+    the blame of the new version is derived from the parent's blame and the patch itself,
+    so the next commit touching the same file doesn't have to blame the whole history again.
+    """
+
+    def __init__(self, cache_size: int = BLAME_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str], _BlameState]" = OrderedDict()
+
+    def deleted_line_origins(
+        self, g2_repo: pygit2.Repository, commit: pygit2.Commit, parent: pygit2.Commit, patch: pygit2.Patch
+    ) -> Dict[int, str]:
+        """Returns with old line number -> commit id mapping for the deleted lines of the patch"""
+        old_path, old_blob_id = patch.delta.old_file.path, str(patch.delta.old_file.id)
+        parent_state = self._get_state(g2_repo, old_path, old_blob_id, str(parent.id))
+        if parent_state is None:
+            return {}
+
+        commit_id = str(commit.id)
+        old_origins = parent_state.line_origins
+        new_origins: List[str] = []
+        deleted: Dict[int, str] = {}
+        old_index = 0
+
+        # Walking through the hunks once gives both the deleted lines' origins
+        # and the blame of the new file version (unchanged lines keep their origin, added ones are ours)
+        for hunk in patch.hunks:
+            for line in hunk.lines:
+                if line.origin == DELETION:
+                    if line.old_lineno > len(old_origins):
+                        return {}
+                    new_origins.extend(old_origins[old_index : line.old_lineno - 1])
+                    old_index = line.old_lineno
+                    deleted[line.old_lineno] = old_origins[line.old_lineno - 1]
+                elif line.origin in (ADDITION, CONTEXT):
+                    missing = line.new_lineno - 1 - len(new_origins)
+                    new_origins.extend(old_origins[old_index : old_index + missing])
+                    old_index += missing
+                    if line.origin == ADDITION:
+                        new_origins.append(commit_id)
+                    else:
+                        new_origins.append(old_origins[line.old_lineno - 1])
+                        old_index = line.old_lineno
+        new_origins.extend(old_origins[old_index:])
+
+        self._put_state(patch.delta.new_file.path, str(patch.delta.new_file.id), _BlameState(commit_id, new_origins))
+        return deleted
+
+    def _get_state(self, g2_repo: pygit2.Repository, path: str, blob_id: str, commit_id: str) -> Optional[_BlameState]:
+        key = (path, blob_id)
+        state = self._cache.get(key)
+        if state is not None and _unchanged_since(g2_repo, path, blob_id, commit_id, state.commit_id):
+            self._cache.move_to_end(key)
+            return state
+
+        state = _blame_file(g2_repo, path, commit_id)
+        if state is not None:
+            self._put_state(path, blob_id, state)
+        return state
+
+    def _put_state(self, path: str, blob_id: str, state: _BlameState):
+        key = (path, blob_id)
+        self._cache[key] = state
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+def _unchanged_since(g2_repo: pygit2.Repository, path: str, blob_id: str, commit_id: str, since_commit_id: str) -> bool:
+    """Whether the file is the same blob in every commit on the first-parent path from since_commit_id to commit_id.
+
+    Only then has it the same blame in both commits: when the blob changed and was restored in between
+    (A -> B -> A), git attributes the restored lines to the restoring commit.
+    """
+    current = g2_repo.get(commit_id)
+    for _ in range(MAX_REUSE_DISTANCE):
+        if str(current.id) == since_commit_id:
+            return True
+        try:
+            current_blob_id = str(current.tree[path].id)
+        except KeyError:
+            return False
+        if current_blob_id != blob_id or not current.parent_ids:
+            return False
+        current = g2_repo.get(current.parent_ids[0])
+    return False
+
+
+def _blame_file(g2_repo: pygit2.Repository, path: str, commit_id: str) -> Optional[_BlameState]:
+    try:
+        blame = g2_repo.blame(path, newest_commit=commit_id)
+    except (KeyError, ValueError, pygit2.GitError):
+        logger.exception("Failed to blame file.", git_path=g2_repo.path, filepath=path, newest_commit=commit_id)
+        return None
+    line_origins: List[str] = []
+    for hunk in blame:
+        line_origins.extend([str(hunk.final_commit_id)] * hunk.lines_in_hunk)
+    return _BlameState(commit_id, line_origins)
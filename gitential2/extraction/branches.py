@@ -0,0 +1,117 @@
+from typing import Dict, Iterator, List, Optional
+
+import pygit2
+from structlog import get_logger
+
+from gitential2.datatypes.extraction import ExtractedCommitBranch
+from gitential2.utils import is_timestamp_within_days
+
+logger = get_logger(__name__)
+
+
+def get_branch_tips(g2_repo: pygit2.Repository) -> Dict[str, str]:
+    """Returns with branch name -> commit id mapping for the local and remote branches,
+    the same branch names as `branches.with_commit` gives"""
+    ret = {}
+    for name in g2_repo.branches:
+        branch = g2_repo.branches[name]
+        if branch.type == pygit2.GIT_REF_SYMBOLIC:
+            branch = branch.resolve()
+        ret[name] = str(branch.target)
+    return ret
+
+
+def get_stale_branches(g2_repo: pygit2.Repository, tips: Dict[str, str], previous_tips: Dict[str, str]) -> List[str]:
+    """Returns with the branches whose previously extracted commits may no longer be on the branch:
+    the deleted branches and the ones whose tip is not a descendant of the previous tip"""
+    return [
+        name
+        for name, previous_tip in previous_tips.items()
+        if not _is_fast_forward(g2_repo, tips.get(name), previous_tip)
+    ]
+
+
+def _is_fast_forward(g2_repo: pygit2.Repository, tip: Optional[str], previous_tip: str) -> bool:
+    if tip is None or previous_tip not in g2_repo:
+        return False
+    return tip == previous_tip or g2_repo.descendant_of(tip, previous_tip)
+
+
+class BranchMembershipIndex:
+    """Calculates which branches contain which commits, without checking the reachability
+    of every commit from every branch tip.
+
+    The membership of a commit is stored as a bitset, where the n-th bit is the n-th branch.
+    New branches are processed together with a single topological walk, passing the bitsets
+    of the children to their parents. Branches which were processed before only have to walk
+    the commits between the previous and the current tip, the rewound ones are walked again as new.
+    """
+
+    def __init__(self, g2_repo: pygit2.Repository, repo_analysis_limit_in_days: Optional[int] = None):
+        self.g2_repo = g2_repo
+        self.repo_analysis_limit_in_days = repo_analysis_limit_in_days
+        self.branches: List[str] = []
+        self.membership: Dict[str, int] = {}
+        self._atimes: Dict[str, int] = {}
+
+    def update(self, tips: Dict[str, str], previous_tips: Optional[Dict[str, str]] = None):
+        previous_tips = previous_tips or {}
+        new_branches = {}
+        for name, tip in tips.items():
+            previous_tip = previous_tips.get(name)
+            if previous_tip == tip:
+                continue
+            if previous_tip and _is_fast_forward(self.g2_repo, tip, previous_tip):
+                self._add_moved_branch(name, tip, previous_tip)
+            else:
+                new_branches[name] = tip
+        if new_branches:
+            self._add_new_branches(new_branches)
+
+    def rows(self, repo_id: int) -> Iterator[ExtractedCommitBranch]:
+        for commit_id, bits in self.membership.items():
+            atime = self._atimes[commit_id]
+            while bits:
+                lowest = bits & -bits
+                yield ExtractedCommitBranch(
+                    repo_id=repo_id, commit_id=commit_id, atime=atime, branch=self.branches[lowest.bit_length() - 1]
+                )
+                bits ^= lowest
+
+    def _add_branch(self, name: str) -> int:
+        self.branches.append(name)
+        return 1 << (len(self.branches) - 1)
+
+    def _add_new_branches(self, tips: Dict[str, str]):
+        logger.debug("Walking new branches", branches=list(tips.keys()))
+        bits_by_commit: Dict[str, int] = {}
+        walker = self.g2_repo.walk(None, pygit2.GIT_SORT_TOPOLOGICAL)
+        for name, tip in tips.items():
+            bits_by_commit[tip] = bits_by_commit.get(tip, 0) | self._add_branch(name)
+            walker.push(tip)
+
+        # Children always come before their parents, so a commit's bitset is complete when it's reached
+        for commit in walker:
+            commit_id = str(commit.id)
+            bits = bits_by_commit.pop(commit_id, 0)
+            for parent_id in commit.parent_ids:
+                parent_id = str(parent_id)
+                bits_by_commit[parent_id] = bits_by_commit.get(parent_id, 0) | bits
+            self._record(commit, commit_id, bits)
+
+    def _add_moved_branch(self, name: str, tip: str, previous_tip: str):
+        logger.debug("Walking moved branch", branch=name, tip=tip, previous_tip=previous_tip)
+        bit = self._add_branch(name)
+        walker = self.g2_repo.walk(tip, pygit2.GIT_SORT_NONE)
+        walker.hide(previous_tip)
+        for commit in walker:
+            self._record(commit, str(commit.id), bit)
+
+    def _record(self, commit: pygit2.Commit, commit_id: str, bits: int):
+        if self.repo_analysis_limit_in_days and not is_timestamp_within_days(
+            commit.commit_time, self.repo_analysis_limit_in_days
+        ):
+            return
+        self.membership[commit_id] = self.membership.get(commit_id, 0) | bits
+        # signature.time is already an unix timestamp in utc
+        self._atimes[commit_id] = commit.author.time
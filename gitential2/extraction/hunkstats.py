@@ -0,0 +1,111 @@
+import math
+
+import numpy as np
+
+TABSIZE = 4
+# Leading whitespace is searched in this many bytes of each line, longer runs are handled one by one
+INDENTATION_WINDOW = 64
+
+_NEWLINE, _TAB, _SPACE = 10, 9, 32
+_HUNK_HEADER, _ADDITION, _DELETION, _NO_NEWLINE_MARKER = ord("@"), ord("+"), ord("-"), ord("\\")
+
+
+def hunk_stats(patch_data: bytes) -> np.ndarray:
+    """Calculates the per hunk line statistics of a patch from its unified diff text (pygit2's Patch.data).
+
+    Returns with an int32 array of shape (nhunks, 4), the columns are the number of deleted lines,
+    the number of added lines and the sum of the indentation of the deleted and added lines.
+    The whole diff is processed with array operations, instead of going through the lines one by one.
+    """
+    buf = np.frombuffer(patch_data, dtype=np.uint8)
+    if not buf.size:
+        return np.zeros((0, 4), dtype=np.int32)
+
+    ends = np.flatnonzero(buf == _NEWLINE)
+    if buf[-1] != _NEWLINE:
+        ends = np.append(ends, buf.size)
+    starts = np.concatenate((np.zeros(1, dtype=ends.dtype), ends[:-1] + 1))
+    first_bytes = buf[np.minimum(starts, buf.size - 1)]
+
+    # Everything before the first "@@" line is the header of the patch, after that every line
+    # is a hunk header, a context/added/deleted line or a "\ No newline at end of file" marker
+    is_hunk_header = first_bytes == _HUNK_HEADER
+    hunk_index = np.cumsum(is_hunk_header) - 1
+    in_hunk = (hunk_index >= 0) & ~is_hunk_header
+    is_deletion = in_hunk & (first_bytes == _DELETION)
+    is_addition = in_hunk & (first_bytes == _ADDITION)
+
+    # The content of a line is without the +/- prefix, with the newline, except when it was missing from the file
+    content_ends = np.minimum(ends + 1, buf.size)
+    missing_newline = np.concatenate((first_bytes[1:] == _NO_NEWLINE_MARKER, [False]))
+    content_ends = np.where(missing_newline, ends, content_ends)
+
+    selected = is_deletion | is_addition
+    indentations = _indentations(buf, starts[selected] + 1, content_ends[selected])
+
+    nhunks = int(is_hunk_header.sum())
+    stats = np.zeros((nhunks, 4), dtype=np.int32)
+    selected_is_deletion, selected_hunk_index = is_deletion[selected], hunk_index[selected]
+    for column, mask in ((0, selected_is_deletion), (1, ~selected_is_deletion)):
+        stats[:, column] = np.bincount(selected_hunk_index[mask], minlength=nhunks)
+        stats[:, column + 2] = np.bincount(selected_hunk_index[mask], weights=indentations[mask], minlength=nhunks)
+    return stats
+
+
+def _indentations(buf: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Vectorized version of indentation() for many lines of the same buffer"""
+    nlines = starts.size
+    result = np.zeros(nlines, dtype=np.int64)
+    if not nlines:
+        return result
+
+    lengths = ends - starts
+    window_lengths = np.minimum(lengths, INDENTATION_WINDOW)
+    line_of = np.repeat(np.arange(nlines), window_lengths)
+    offsets = np.arange(line_of.size) - np.repeat(np.cumsum(window_lengths) - window_lengths, window_lengths)
+    window = buf[starts[line_of] + offsets]
+
+    # Offset of the first non-whitespace character in each line, -1 if there is none in the window
+    first_non_ws = np.full(nlines, -1, dtype=np.int64)
+    non_ws = np.flatnonzero((window != _SPACE) & (window != _TAB))
+    lines_with_non_ws, first_positions = np.unique(line_of[non_ws], return_index=True)
+    first_non_ws[lines_with_non_ws] = offsets[non_ws[first_positions]]
+
+    in_leading_ws = offsets < first_non_ws[line_of]
+    tabs = np.bincount(line_of[in_leading_ws & (window == _TAB)], minlength=nlines)
+
+    # Every group of spaces counts as ceil(n / tabsize) tabs
+    spaces = in_leading_ws & (window == _SPACE)
+    group_starts = spaces & ~np.concatenate(([False], spaces[:-1]))
+    group_index = np.cumsum(group_starts) - 1
+    group_sizes = np.bincount(group_index[spaces], minlength=int(group_starts.sum()))
+    group_tabs = (group_sizes + TABSIZE - 1) // TABSIZE
+    space_tabs = np.bincount(line_of[group_starts], weights=group_tabs, minlength=nlines).astype(np.int64)
+
+    result[:] = tabs + space_tabs
+    # Lines with only whitespace have no indentation
+    result[first_non_ws < 0] = 0
+
+    # Lines with whitespace all over the window, rare enough to go through them one by one
+    for i in np.flatnonzero((first_non_ws < 0) & (lengths > INDENTATION_WINDOW)):
+        result[i] = indentation(buf[starts[i] : ends[i]].tobytes())
+    return result
+
+
+def indentation(s: bytes, tabsize: int = TABSIZE) -> int:
+    nspaces = 0
+    ntabs = 0
+    for i in range(len(s)):  # pylint: disable=consider-using-enumerate
+        c = s[i]
+        if c == 32:
+            nspaces += 1
+        elif c == 9:
+            if nspaces > 0:
+                ntabs += math.ceil(nspaces / tabsize)
+                nspaces = 0
+            ntabs += 1
+        else:
+            if nspaces > 0:
+                ntabs += math.ceil(nspaces / tabsize)
+            return ntabs
+    return 0
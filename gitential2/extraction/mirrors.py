@@ -0,0 +1,221 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import subprocess
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from structlog import get_logger
+
+from gitential2.datatypes.repositories import RepositoryInDB
+from gitential2.datatypes.extraction import LocalGitRepository
+from gitential2.datatypes.credentials import UserPassCredential, KeypairCredential, RepositoryCredential
+from gitential2.settings import GitentialSettings
+from gitential2.utils.tempdir import TemporaryDirectory
+
+logger = get_logger(__name__)
+
+MIRROR_SUFFIX = ".git"
+LOCK_SUFFIX = ".lock"
+LAST_USED_MARKER = "gitential-last-used"
+
+
+class RepositoryMirrorStore:
+    """Keeps a bare mirror of every repository on local disk, so a refresh only has to
+    fetch the new objects instead of cloning the whole history again.
+
+    The refs are laid out like in a regular clone (remote branches under refs/remotes/origin),
+    so the mirrors can be used by the extraction code without any change. When the store
+    grows over the size limit the least recently used mirrors are removed.
+    """
+
+    def __init__(self, root: Path, size_limit_bytes: int, ssh_accept_unknown_hosts: bool = False):
+        self.root = root
+        self.size_limit_bytes = size_limit_bytes
+        self.ssh_accept_unknown_hosts = ssh_accept_unknown_hosts
+
+    def mirror_path(self, repository: RepositoryInDB) -> Path:
+        return self.root / (_mirror_key(repository.clone_url) + MIRROR_SUFFIX)
+
+    @contextmanager
+    def mirror(
+        self, repository: RepositoryInDB, credentials: Optional[RepositoryCredential] = None
+    ) -> Iterator[LocalGitRepository]:
+        """Brings the mirror of the repository up to date and holds an exclusive lock on it
+        while it is in use, so concurrent refreshes of the same repository cannot step on each other.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.mirror_path(repository)
+        with _locked(_lock_path(path)):
+            self._update_mirror(repository, path, credentials)
+            (path / LAST_USED_MARKER).touch()
+            yield LocalGitRepository(repo_id=repository.id, directory=path)
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used mirrors until the store fits into the size limit.
+        Mirrors which are in use are skipped.
+        """
+        mirrors = [(path, _last_used(path), _directory_size(path)) for path in self._list_mirrors()]
+        total_size = sum(size for _, _, size in mirrors)
+        for path, _, size in sorted(mirrors, key=lambda m: m[1]):
+            if total_size <= self.size_limit_bytes:
+                break
+            with _locked(_lock_path(path), blocking=False) as acquired:
+                if acquired and path.exists():
+                    logger.info("Evicting repository mirror", path=str(path), size=size)
+                    shutil.rmtree(path, ignore_errors=True)
+                    total_size -= size
+
+    def _list_mirrors(self) -> List[Path]:
+        if not self.root.exists():
+            return []
+        return [p for p in self.root.iterdir() if p.is_dir() and p.name.endswith(MIRROR_SUFFIX)]
+
+    def _update_mirror(self, repository: RepositoryInDB, path: Path, credentials: Optional[RepositoryCredential]):
+        is_new = not (path / "HEAD").exists()
+        if is_new:
+            _init_mirror(repository, path)
+        try:
+            _fetch_mirror(repository, path, credentials, self.ssh_accept_unknown_hosts)
+        except subprocess.CalledProcessError as e:
+            if is_new:
+                raise
+            # The mirror might be broken (interrupted fetch, changed remote, ...), starting from scratch
+            logger.warning(
+                "Failed to fetch into repository mirror, recreating it",
+                clone_url=repository.clone_url,
+                path=str(path),
+                stderr=e.stderr,
+            )
+            shutil.rmtree(path, ignore_errors=True)
+            _init_mirror(repository, path)
+            _fetch_mirror(repository, path, credentials, self.ssh_accept_unknown_hosts)
+
+
+def create_mirror_store(settings: GitentialSettings) -> Optional[RepositoryMirrorStore]:
+    if not settings.extraction.mirror_store_path:
+        return None
+    return RepositoryMirrorStore(
+        root=Path(settings.extraction.mirror_store_path),
+        size_limit_bytes=settings.extraction.mirror_store_size_limit_mb * 1024 * 1024,
+        ssh_accept_unknown_hosts=settings.extraction.mirror_store_ssh_accept_unknown_hosts,
+    )
+
+
+def _mirror_key(clone_url: str) -> str:
+    return hashlib.sha1(clone_url.encode()).hexdigest()
+
+
+def _lock_path(mirror_path: Path) -> Path:
+    return mirror_path.with_name(mirror_path.name + LOCK_SUFFIX)
+
+
+@contextmanager
+def _locked(lock_path: Path, blocking: bool = True):
+    with open(lock_path, "a", encoding="utf-8") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _last_used(mirror_path: Path) -> float:
+    try:
+        return (mirror_path / LAST_USED_MARKER).stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def _directory_size(path: Path) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+def _run_git(args: List[str], cwd: Path, env: Optional[dict] = None):
+    try:
+        subprocess.run(["git"] + args, check=True, capture_output=True, text=True, cwd=cwd, env=env)
+    except subprocess.CalledProcessError as e:
+        # Only the git command is kept from the arguments, the error ends up in the logs
+        raise subprocess.CalledProcessError(e.returncode, ["git", _git_command(args)], e.output, e.stderr) from None
+
+
+def _git_command(args: List[str]) -> str:
+    remaining_args = iter(args)
+    for arg in remaining_args:
+        if arg == "-c":
+            next(remaining_args, None)
+        elif not arg.startswith("-"):
+            return arg
+    return ""
+
+
+_ASKPASS_SCRIPT = """#!/bin/sh
+case "$1" in
+    Username*) printf '%s\\n' "$GITENTIAL_GIT_USERNAME" ;;
+    *) printf '%s\\n' "$GITENTIAL_GIT_PASSWORD" ;;
+esac
+"""
+
+
+def _askpass_env(workdir: TemporaryDirectory, credentials: UserPassCredential) -> dict:
+    """The environment of a git command answering the credential prompts from environment variables,
+    so the secrets never get into the arguments of a command or into a shell snippet"""
+    askpass = workdir.new_file(_ASKPASS_SCRIPT)
+    os.chmod(askpass, 0o700)
+    return {
+        "GIT_ASKPASS": askpass,
+        "GITENTIAL_GIT_USERNAME": credentials.username,
+        "GITENTIAL_GIT_PASSWORD": credentials.password,
+    }
+
+
+def _init_mirror(repository: RepositoryInDB, path: Path):
+    logger.info("Creating repository mirror", clone_url=repository.clone_url, path=str(path))
+    path.mkdir(parents=True, exist_ok=True)
+    _run_git(["init", "--bare", "--quiet"], cwd=path)
+    _run_git(["remote", "add", "origin", repository.clone_url], cwd=path)
+    # Same ref layout as a normal clone, get_repository_state() relies on the origin/ prefix
+    _run_git(["config", "--replace-all", "remote.origin.fetch", "+refs/heads/*:refs/remotes/origin/*"], cwd=path)
+    _run_git(["config", "--add", "remote.origin.fetch", "+refs/tags/*:refs/tags/*"], cwd=path)
+    _run_git(["config", "gc.auto", "0"], cwd=path)
+
+
+def _fetch_mirror(
+    repository: RepositoryInDB,
+    path: Path,
+    credentials: Optional[RepositoryCredential],
+    ssh_accept_unknown_hosts: bool = False,
+):
+    logger.info("Fetching into repository mirror", clone_url=repository.clone_url, path=str(path))
+    with TemporaryDirectory() as workdir:
+        config_args: List[str] = []
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+        if isinstance(credentials, UserPassCredential):
+            # The credentials are only passed to this command, they are never written into the mirror's config.
+            # The configured credential helpers are not asked and do not store them either.
+            config_args = ["-c", "credential.helper="]
+            env.update(_askpass_env(workdir, credentials))
+        elif isinstance(credentials, KeypairCredential) and credentials.privkey:
+            if credentials.passphrase:
+                raise ValueError("Passphrase protected keys are not supported by the repository mirror store")
+            private_key = workdir.new_file(credentials.privkey)
+            os.chmod(private_key, 0o600)
+            ssh_command = f"ssh -i {private_key} -o IdentitiesOnly=yes"
+            if ssh_accept_unknown_hosts:
+                ssh_command += " -o StrictHostKeyChecking=no"
+            env["GIT_SSH_COMMAND"] = ssh_command
+        _run_git(config_args + ["fetch", "--prune", "--quiet", "origin"], cwd=path, env=env)
@@ -7,9 +7,23 @@ class OutputHandler(abc.ABC):
     def write(self, kind, value):
         pass
 
+    def write_many(self, kind, values):
+        for value in values:
+            self.write(kind, value)
+
+    def flush(self):
+        """Writes out the buffered values, if the handler has any"""
+
     def clear(self):
         pass
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # The values collected before a failure are written out too
+        self.flush()
+
 
 class DataCollector(OutputHandler):
     def __init__(self):
@@ -1,9 +1,9 @@
 from datetime import datetime
-from typing import Optional, Dict, Generator, Set, List, Union
+from typing import Optional, Dict, Generator, Set, List, Union, Tuple, cast
+from functools import lru_cache
 from collections import defaultdict
 from pathlib import Path
 import subprocess
-import math
 import re
 import os
 import numpy as np
@@ -23,6 +23,10 @@ from gitential2.datatypes.credentials import UserPassCredential, KeypairCredenti
 from gitential2.settings import GitentialSettings
 from gitential2.extraction.output import OutputHandler
 from gitential2.extraction.langdetection import detect_lang
+from gitential2.extraction.blame import BlameEngine
+from gitential2.extraction.hunkstats import hunk_stats
+from gitential2.extraction.branches import BranchMembershipIndex, get_branch_tips, get_stale_branches
+from gitential2.extraction.mirrors import create_mirror_store
 from gitential2.utils import is_timestamp_within_days
 from gitential2.utils.tempdir import TemporaryDirectory
 from gitential2.utils.timer import Timer, time_it_log
@@ -45,6 +49,10 @@ def extract_incremental(
     previous_state: Optional[GitRepositoryState] = None,
     ignore_spec: IgnoreSpec = default_ignorespec,
 ):
+    mirror_store = create_mirror_store(settings)
+    if mirror_store:
+        with mirror_store.mirror(repository, credentials=credentials) as local_repo:
+            return extract_incremental_local(local_repo, output, settings, previous_state, ignore_spec)
     with TemporaryDirectory() as workdir:
         local_repo = clone_repository_pygit2(repository, destination_path=workdir.path, credentials=credentials)
         return extract_incremental_local(local_repo, output, settings, previous_state, ignore_spec)
@@ -69,19 +77,63 @@ def extract_incremental_local(
     )
 
     executor = create_executor(
-        settings, local_repo=local_repo, output=output, description="Extracting commits", ignore_spec=ignore_spec
+        settings,
+        local_repo=local_repo,
+        output=output,
+        description="Extracting commits",
+        ignore_spec=ignore_spec,
+        initializer=_init_extraction_worker,
+        initargs=(local_repo,),
     )
-    executor.map(fn=_extract_single_commit, items=commits)
+    try:
+        executor.map(fn=_extract_single_commit, items=commits)
+    finally:
+        # With the single thread executor the worker state lives in this process
+        _close_extraction_worker()
     logger.info("Finished commits extraction from", local_repo=local_repo)
     return current_state
 
 
+class ExtractionWorker:
+    """State of an extraction worker process: the repository is opened once, so libgit2's object and pack
+    caches survive between the commits, together with the caches of the lookups repeating between commits.
+    """
+
+    def __init__(self, local_repo: LocalGitRepository, author_cache_size: int = 65536):
+        self.directory = str(local_repo.directory)
+        self.g2_repo = _git2_repo(local_repo)
+        self.blame_engine = BlameEngine()
+        self.commit_author = lru_cache(maxsize=author_cache_size)(self._commit_author)
+
+    def _commit_author(self, commit_id: str) -> Tuple[int, str]:
+        commit = self.g2_repo.get(commit_id)
+        return _utc_timestamp_for(commit.author), commit.author.email
+
+
+_extraction_worker: Optional[ExtractionWorker] = None
+
+
+def _init_extraction_worker(local_repo: LocalGitRepository):
+    global _extraction_worker  # pylint: disable=global-statement
+    _extraction_worker = ExtractionWorker(local_repo)
+
+
+def _close_extraction_worker():
+    global _extraction_worker  # pylint: disable=global-statement
+    _extraction_worker = None
+
+
+def _get_extraction_worker(local_repo: LocalGitRepository) -> ExtractionWorker:
+    if _extraction_worker is None or _extraction_worker.directory != str(local_repo.directory):
+        _init_extraction_worker(local_repo)
+    return cast(ExtractionWorker, _extraction_worker)
+
+
 def _extract_single_commit(commit_id, local_repo: LocalGitRepository, output: OutputHandler, ignore_spec: IgnoreSpec):
-    g2_repo = _git2_repo(local_repo)
-    extract_commit(local_repo, commit_id, output, g2_repo=g2_repo)
-    extract_commit_patches(local_repo, commit_id, output, ignore_spec, g2_repo=g2_repo)
+    worker = _get_extraction_worker(local_repo)
+    extract_commit(local_repo, commit_id, output, g2_repo=worker.g2_repo)
+    extract_commit_patches(local_repo, commit_id, output, ignore_spec, g2_repo=worker.g2_repo, worker=worker)
     # extract_commit_branches(local_repo, commit_id, output)
-    del g2_repo
     return output
 
 
@@ -336,6 +388,7 @@ def extract_commit_patches(
 ):
     g2_repo = kwargs.get("g2_repo") or _git2_repo(repository)
     commit = kwargs.get("commit") or g2_repo.get(commit_id)
+    worker: Optional[ExtractionWorker] = kwargs.get("worker")
 
     def _get_parents_and_diffs():
         parents = [g2_repo.get(parent_id) for parent_id in commit.parent_ids]
@@ -352,29 +405,40 @@ def extract_commit_patches(
     for parent, diff in zip(parents, diffs):
         for patch in diff:
             if not ignore_spec.should_ignore(patch.delta.new_file.path):
-                _extract_patch(commit, parent, patch, g2_repo, output, repo_id=repository.repo_id)
+                _extract_patch(commit, parent, patch, g2_repo, output, repo_id=repository.repo_id, worker=worker)
             patch_count += 1
     # logger.debug("patch count", patch_count=patch_count, repository=repository, commit_id=commit_id)
     return patch_count
 
 
 @time_it_log(logger)
-def extract_branches(settings: GitentialSettings, repository: LocalGitRepository, output: OutputHandler):
-    logger.info("Getting commits from", local_repo=repository)
-    commits = get_commits(repository, repo_analysis_limit_in_days=settings.extraction.repo_analysis_limit_in_days)
+def extract_branches(
+    settings: GitentialSettings,
+    repository: LocalGitRepository,
+    output: OutputHandler,
+    previous_tips: Optional[Dict[str, str]] = None,
+) -> Dict[str, str]:
+    """Extracts the commit branches and returns with the branch tips,
+    giving them back on the next run only the branches with moved tips are processed again.
+    """
+    if repository.repo_id is None:
+        raise ValueError("The commit branches are extracted only for the repositories with a repo_id")
+    g2_repo = _git2_repo(repository)
+    tips = get_branch_tips(g2_repo)
 
     logger.info("Getting commit branches from", local_repo=repository)
+    index = BranchMembershipIndex(g2_repo, repo_analysis_limit_in_days=settings.extraction.repo_analysis_limit_in_days)
+    index.update(tips, previous_tips=previous_tips)
+    for commit_branch in index.rows(repository.repo_id):
+        output.write(ExtractedKind.EXTRACTED_COMMIT_BRANCH.value, commit_branch)
 
-    executor = create_executor(settings, local_repo=repository, output=output, description="Extracting commit branches")
-
-    executor.map(fn=_extract_single_commit_branches, items=commits)
-
-    logger.info("Finished commit branches extraction from", local_repo=repository)
+    logger.info("Finished commit branches extraction from", local_repo=repository, branches=len(index.branches))
+    return tips
 
 
-def _extract_single_commit_branches(commit_id: str, local_repo: LocalGitRepository, output: OutputHandler):
-    extract_commit_branches(local_repo, commit_id, output)
-    return output
+def get_stale_branches_of(repository: LocalGitRepository, previous_tips: Dict[str, str]) -> List[str]:
+    g2_repo = _git2_repo(repository)
+    return get_stale_branches(g2_repo, get_branch_tips(g2_repo), previous_tips)
 
 
 def extract_commit_branches(repository: LocalGitRepository, commit_id: str, output: OutputHandler):
@@ -391,9 +455,11 @@ def extract_commit_branches(repository: LocalGitRepository, commit_id: str, outp
     return output
 
 
-def _extract_patch(commit, parent, patch, g2_repo, output, repo_id):
+def _extract_patch(commit, parent, patch, g2_repo, output, repo_id, worker=None):
     patch_stats = _get_patch_stats(patch)
-    nrewrites, rewrites_loc = _extract_patch_rewrites(commit, parent, patch, g2_repo, output, repo_id=repo_id)
+    nrewrites, rewrites_loc = _extract_patch_rewrites(
+        commit, parent, patch, g2_repo, output, repo_id=repo_id, worker=worker
+    )
     lang, langtype = _get_patch_lang_and_langtype(commit, patch, g2_repo)
 
     # We cannot store a larger file size in postgres
@@ -446,41 +512,12 @@ def _get_patch_stats(patch):
         if len(patch.hunks) == 0:  # pylint: disable=compare-to-zero
             return np.zeros(8)
 
-        addition = "+"
-        deletion = "-"
-        stats = np.zeros((len(patch.hunks), 4), dtype=np.int32)
-        view = stats[:, :]
-        for i, hunk in enumerate(patch.hunks):
-            for line in hunk.lines:
-                if line.origin == deletion:
-                    view[i, 0] = view[i, 0] + 1
-                    view[i, 2] = view[i, 2] + _indentation(line.raw_content)
-                elif line.origin == addition:
-                    view[i, 1] = view[i, 1] + 1
-                    view[i, 3] = view[i, 3] + _indentation(line.raw_content)
+        stats = hunk_stats(patch.data)
         return np.hstack((stats.sum(axis=0), stats.std(axis=0)))
 
 
-def _indentation(s, tabsize=4):
-    nspaces = 0
-    ntabs = 0
-    for i in range(len(s)):  # pylint: disable=consider-using-enumerate
-        c = s[i]
-        if c == 32:
-            nspaces += 1
-        elif c == 9:
-            if nspaces > 0:
-                ntabs += math.ceil(nspaces / tabsize)
-                nspaces = 0
-            ntabs += 1
-        else:
-            if nspaces > 0:
-                ntabs += math.ceil(nspaces / tabsize)
-            return ntabs
-    return 0
-
-
-def _extract_patch_rewrites(commit, parent, patch, g2_repo, output, repo_id):  # pylint: disable=too-complex
+# pylint: disable=too-complex
+def _extract_patch_rewrites(commit, parent, patch, g2_repo, output, repo_id, worker: Optional[ExtractionWorker] = None):
     def _is_merge():
         return len(commit.parent_ids) > 1
 
@@ -499,23 +536,20 @@ def _extract_patch_rewrites(commit, parent, patch, g2_repo, output, repo_id):  #
     if _is_merge() or _is_addition() or _is_initial_commit() or _is_empty_patch() or _is_binary():
         return 0, 0
 
-    deletion = "-"
-    filepath = patch.delta.old_file.path
-    rewrites = defaultdict(int)
-    with Timer("blame_porcelain", threshold_ms=10000):
-        line_blame_dict = blame_porcelain(g2_repo.path, filepath, str(parent.id))
+    rewrites: Dict[str, int] = defaultdict(int)
+    with Timer("blame", threshold_ms=10000):
+        blame_engine = worker.blame_engine if worker else BlameEngine()
+        deleted_line_origins = blame_engine.deleted_line_origins(g2_repo, commit, parent, patch)
 
-    if not line_blame_dict:
-        return 0, 0
-
-    for hunk in patch.hunks:
-        for line in hunk.lines:
-            if line.origin == deletion:
-                blame_co_id = line_blame_dict[line.old_lineno]
-                rewrites[blame_co_id] += 1
+    for blame_co_id in deleted_line_origins.values():
+        rewrites[blame_co_id] += 1
 
     for rewritten_commit_id, line_count in rewrites.items():
-        rewritten = g2_repo.get(rewritten_commit_id)
+        if worker:
+            rewritten_atime, rewritten_aemail = worker.commit_author(rewritten_commit_id)
+        else:
+            rewritten = g2_repo.get(rewritten_commit_id)
+            rewritten_atime, rewritten_aemail = _utc_timestamp_for(rewritten.author), rewritten.author.email
         output.write(
             ExtractedKind.EXTRACTED_PATCH_REWRITE.value,
             ExtractedPatchRewrite(
@@ -525,8 +559,8 @@ def _extract_patch_rewrites(commit, parent, patch, g2_repo, output, repo_id):  #
                 aemail=commit.author.email,
                 newpath=patch.delta.new_file.path[:255],
                 rewritten_commit_id=str(rewritten_commit_id),
-                rewritten_atime=_utc_timestamp_for(rewritten.author),
-                rewritten_aemail=rewritten.author.email,
+                rewritten_atime=rewritten_atime,
+                rewritten_aemail=rewritten_aemail,
                 loc_d=line_count,
             ),
         )
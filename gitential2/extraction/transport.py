@@ -0,0 +1,93 @@
+import os
+import pickle
+import shutil
+import tempfile
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Tuple, Type
+
+from pydantic import BaseModel
+
+# Memory backed filesystem, the batches are never written to a disk there
+SHARED_MEMORY_DIRECTORY = "/dev/shm"
+# The batches in flight have to fit into the shared memory, with less free space they go to the disk,
+# e.g. with the 64MB default of the Docker containers
+MIN_SHARED_MEMORY_FREE_BYTES = 512 * 1024 * 1024
+
+
+class ColumnarBatch:
+    """Rows of the output handlers, stored column by column.
+
+    Pickling a list of pydantic models is slow, because every model is pickled with its own dicts.
+    The rows of the same kind and model are stored as one list per field instead, which is
+    much faster to pickle, and the models are reconstructed without validation when loading.
+    """
+
+    def __init__(self):
+        self.item_count = 0
+        self.blocks: Dict[Tuple[str, Type[BaseModel], FrozenSet[str]], Dict[str, List[Any]]] = {}
+
+    def extend(self, values: Iterable[Tuple[str, BaseModel]]):
+        for kind, value in values:
+            fields_set = frozenset(value.__fields_set__)
+            key = (kind, type(value), fields_set)
+            columns = self.blocks.get(key)
+            if columns is None:
+                columns = self.blocks[key] = {field: [] for field in fields_set}
+            for field, column in columns.items():
+                column.append(value.__dict__[field])
+
+    def __iter__(self) -> Iterator[Tuple[str, List[BaseModel]]]:
+        for (kind, model_cls, _), columns in self.blocks.items():
+            fields = list(columns.keys())
+            yield kind, [model_cls.construct(**dict(zip(fields, row))) for row in zip(*columns.values())]
+
+
+class BatchDescriptor(BaseModel):
+    path: str
+    item_count: int
+    row_count: int
+
+
+def _has_shared_memory(min_free_bytes: int) -> bool:
+    return os.path.isdir(SHARED_MEMORY_DIRECTORY) and shutil.disk_usage(SHARED_MEMORY_DIRECTORY).free >= min_free_bytes
+
+
+def create_spill_directory(min_free_bytes: int = MIN_SHARED_MEMORY_FREE_BYTES) -> str:
+    parent = SHARED_MEMORY_DIRECTORY if _has_shared_memory(min_free_bytes) else None
+    return tempfile.mkdtemp(prefix="gitential-batches-", dir=parent)
+
+
+def spill_batch(batch: ColumnarBatch, spill_directory: str) -> BatchDescriptor:
+    fd, path = tempfile.mkstemp(dir=spill_directory, suffix=".batch")
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+    row_count = sum(len(next(iter(columns.values()), [])) for columns in batch.blocks.values())
+    return BatchDescriptor(path=path, item_count=batch.item_count, row_count=row_count)
+
+
+def load_batch(descriptor: BatchDescriptor, remove: bool = True) -> ColumnarBatch:
+    with open(descriptor.path, "rb") as f:
+        batch = pickle.load(f)
+    if remove:
+        os.remove(descriptor.path)
+    return batch
+
+
+def run_batch(items: List[Any], fn_partial, spill_directory: str) -> BatchDescriptor:
+    """Runs the function for a batch of items in a worker, the outputs are spilled into one columnar batch"""
+    batch = ColumnarBatch()
+    for item in items:
+        output = fn_partial(item)
+        batch.extend(output.pop())
+        batch.item_count += 1
+    return spill_batch(batch, spill_directory)
+
+
+def chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk: List[Any] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
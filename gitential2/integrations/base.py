@@ -1,7 +1,9 @@
 import typing
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Callable, List, Optional, Tuple, Union
+from typing import Callable, Deque, Dict, List, Optional, Tuple, Union
 
 from authlib.integrations.base_client.errors import InvalidTokenError
 from authlib.integrations.requests_client import OAuth2Session
@@ -17,10 +19,14 @@ from gitential2.datatypes.its_projects import ITSProjectCreate
 from gitential2.datatypes.its_projects import ITSProjectInDB
 from gitential2.datatypes.pull_requests import PullRequestData
 from gitential2.datatypes.repositories import RepositoryCreate
+from gitential2.exceptions import RateLimitException
 from gitential2.extraction.output import OutputHandler
 from gitential2.kvstore import KeyValueStore
 from gitential2.settings import IntegrationSettings
 from gitential2.utils import is_timestamp_within_days
+from .http_cache import REVALIDATION_EXPIRY_SECONDS, get_json_revalidated
+from .rate_limit import RateLimitBudget, TokenBucket, get_rate_limit_budget, init_token_bucket
+from .session_pool import http_session_pool
 
 logger = get_logger(__name__)
 
@@ -31,6 +37,7 @@ class BaseIntegration:
         self.settings = settings
         self.integration_type = settings.type_
         self.kvstore = kvstore
+        self.token_bucket = init_token_bucket(kvstore)
 
     @property
     def is_oauth(self) -> bool:
@@ -38,12 +45,15 @@ class BaseIntegration:
 
 
 ONE_HOUR_IN_SECONDS = 60 * 60
+MAX_RATE_LIMITED_ATTEMPTS = 5
 
 
 class OAuthLoginMixin(ABC):
 
     if typing.TYPE_CHECKING:
+        name: str
         kvstore: KeyValueStore
+        token_bucket: TokenBucket
 
     @property
     def is_oauth(self) -> bool:
@@ -58,9 +68,16 @@ class OAuthLoginMixin(ABC):
         return self.oauth_register()
 
     def get_oauth2_client(self, **kwargs):
+        """A keep-alive session from the shared pool when there is a token, closing it returns it to the pool.
+
+        The requests of a pooled session are limited by the token bucket of the credential, and its polled lists
+        are revalidated with the responses cached in the kvstore.
+        """
         params = self.oauth_register()
         params.update(kwargs)
-        return OAuth2Session(**params)
+        return http_session_pool.get_session(
+            self.name, params, token_bucket=self.token_bucket, response_cache=self.kvstore
+        )
 
     def http_get_json(self, url: str, **kwargs) -> Union[dict, list]:
         client = self.get_oauth2_client(**kwargs)
@@ -71,14 +88,23 @@ class OAuthLoginMixin(ABC):
             client.close()
 
     def http_get_json_and_cache(self, url: str, ex_seconds: int = ONE_HOUR_IN_SECONDS, **kwargs):
-        key = f"http-get-{url}"
-        value = self.kvstore.get_value(key)
-        if value:
-            return value
-        else:
-            value = self.http_get_json(url, **kwargs)
-            self.kvstore.set_value(key, value, ex=ex_seconds)
-            return value
+        """The cached value for ex_seconds, revalidated with a conditional request after that"""
+        client = self.get_oauth2_client(**kwargs)
+        try:
+            result = get_json_revalidated(
+                client,
+                self.kvstore,
+                f"http-cache-{url}",
+                url,
+                max_age_seconds=ex_seconds,
+                expiry_seconds=max(ex_seconds, REVALIDATION_EXPIRY_SECONDS),
+            )
+            if result.body is None and result.response is not None:
+                # The errors are not cached
+                return result.response.json()
+            return result.body
+        finally:
+            client.close()
 
     @abstractmethod
     def normalize_userinfo(self, data, token=None) -> UserInfoCreate:
@@ -117,6 +143,11 @@ class CollectPRsResult(BaseModel):
 
 
 class GitProviderMixin(ABC):
+    # The API requests left unused in the rate limit, the PR collection stops before using them
+    rate_limit_reserve = 0
+    # The PRs fetched together by _collect_raw_pull_requests_in_bulk, 0 when they are fetched one by one
+    pull_requests_per_bulk_request = 0
+
     @abstractmethod
     def get_client(self, token, update_token) -> OAuth2Session:
         pass
@@ -131,8 +162,41 @@ class GitProviderMixin(ABC):
         prs_we_already_have: Optional[dict] = None,
         limit: int = 200,
         repo_analysis_limit_in_days: Optional[int] = None,
+        max_workers: int = 1,
     ) -> CollectPRsResult:
+        """Collects the PRs needing an update, max_workers threads fetch them within the rate limit budget"""
         client = self.get_client(token=token, update_token=update_token)
+        try:
+            return self._collect_pull_requests_with_client(
+                repository,
+                client,
+                token,
+                update_token,
+                output,
+                author_callback,
+                prs_we_already_have=prs_we_already_have,
+                limit=limit,
+                repo_analysis_limit_in_days=repo_analysis_limit_in_days,
+                max_workers=max_workers,
+            )
+        finally:
+            client.close()
+
+    def _collect_pull_requests_with_client(
+        self,
+        repository: RepositoryInDB,
+        client,
+        token: dict,
+        update_token: Callable,
+        output: OutputHandler,
+        author_callback: Callable,
+        prs_we_already_have: Optional[dict],
+        limit: int,
+        repo_analysis_limit_in_days: Optional[int],
+        max_workers: int,
+    ) -> CollectPRsResult:
+        # Shared with the other workers using the same credential
+        budget = get_rate_limit_budget(client)
         ret = CollectPRsResult(prs_collected=[], prs_left=[], prs_failed=[])
 
         logger.info(
@@ -165,20 +229,125 @@ class GitProviderMixin(ABC):
             ret.prs_left = [self._raw_pr_number_and_updated_at(pr)[0] for pr in prs_needs_update]
             return ret
 
-        counter = 0
-        for pr in prs_needs_update:
-            pr_number, _ = self._raw_pr_number_and_updated_at(pr)
-            if counter >= limit:
-                ret.prs_left.append(pr_number)
+        pr_numbers = [self._raw_pr_number_and_updated_at(pr)[0] for pr in prs_needs_update]
+        prs_left_by_budget = self._collect_pull_requests_in_batches(
+            repository, client, budget, output, author_callback, pr_numbers[:limit], max_workers, ret
+        )
+        ret.prs_left = prs_left_by_budget + pr_numbers[limit:]
+        if prs_left_by_budget:
+            logger.warning(
+                "Stopped collecting PRs, API rate limit budget exhausted",
+                repository_name=repository.name,
+                repository_id=repository.id,
+                prs_left=len(ret.prs_left),
+            )
+        return ret
+
+    def _collect_pull_requests_in_batches(
+        self,
+        repository: RepositoryInDB,
+        client,
+        budget: RateLimitBudget,
+        output: OutputHandler,
+        author_callback: Callable,
+        pr_numbers: List[int],
+        max_workers: int,
+        ret: CollectPRsResult,
+    ) -> List[int]:
+        """Fetches the PRs in the batches of the bulk requests and the rest concurrently, returns the PRs left
+        because of the exhausted budget"""
+        batch_size = self.pull_requests_per_bulk_request or len(pr_numbers) or 1
+        prs_left_by_budget: List[int] = []
+        pending: Deque[Tuple[int, Future]] = deque()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for batch_start in range(0, len(pr_numbers), batch_size):
+                batch = pr_numbers[batch_start : batch_start + batch_size]
+                bulk_raw_data = (
+                    self._collect_raw_pull_requests_in_bulk(repository, client, budget, batch)
+                    if self.pull_requests_per_bulk_request
+                    else {}
+                )
+                for pr_number in batch:
+                    if pr_number in bulk_raw_data:
+                        future: Future = Future()
+                        future.set_result((True, bulk_raw_data[pr_number]))
+                    else:
+                        future = executor.submit(
+                            self._collect_raw_pull_request_within_budget, repository, client, budget, pr_number
+                        )
+                    pending.append((pr_number, future))
+                    self._write_collected_pull_requests(
+                        repository, output, author_callback, pending, 2 * max_workers, ret, prs_left_by_budget
+                    )
+            self._write_collected_pull_requests(
+                repository, output, author_callback, pending, 0, ret, prs_left_by_budget
+            )
+        return prs_left_by_budget
+
+    def _write_collected_pull_requests(
+        self,
+        repository: RepositoryInDB,
+        output: OutputHandler,
+        author_callback: Callable,
+        pending: Deque[Tuple[int, Future]],
+        max_pending: int,
+        ret: CollectPRsResult,
+        prs_left_by_budget: List[int],
+    ):
+        # The PRs are transformed and written by this thread in order, the workers only fetch the raw data
+        while len(pending) > max_pending:
+            pr_number, future = pending.popleft()
+            within_budget, raw_data = future.result()
+            if not within_budget:
+                prs_left_by_budget.append(pr_number)
+            elif raw_data is not None and self._write_pull_request(
+                repository, output, author_callback, pr_number, raw_data
+            ):
+                ret.prs_collected.append(pr_number)
             else:
-                pr_data = self.collect_pull_request(repository, token, update_token, output, author_callback, pr_number)
-                if pr_data:
-                    ret.prs_collected.append(pr_number)
-                else:
-                    ret.prs_failed.append(pr_number)
-            counter += 1
+                ret.prs_failed.append(pr_number)
 
-        return ret
+    # pylint: disable=unused-argument
+    def _collect_raw_pull_requests_in_bulk(
+        self, repository: RepositoryInDB, client, budget: RateLimitBudget, pr_numbers: List[int]
+    ) -> Dict[int, dict]:
+        """The raw data of the PRs a provider fetches together, the ones missing are fetched one by one"""
+        return {}
+
+    def _collect_raw_pull_request_within_budget(
+        self, repository: RepositoryInDB, client, budget: RateLimitBudget, pr_number: int
+    ) -> Tuple[bool, Optional[dict]]:
+        """False when the rate limit budget is exhausted, the raw data is None when the collection failed.
+
+        A collection with rate limited responses is retried after the backoff, because the paginated lists
+        of a PR are returned partially on errors.
+        """
+        logger.info(
+            "Started collection data for PR",
+            repository_name=repository.name,
+            repository_id=repository.id,
+            pr_number=pr_number,
+        )
+        for _ in range(MAX_RATE_LIMITED_ATTEMPTS):
+            # The requests take their tokens, only the reserve is checked here
+            if not budget.acquire(tokens=0, reserve=self.rate_limit_reserve):
+                return False, None
+            budget.start_request_group()
+            try:
+                raw_data = self._collect_raw_pull_request(repository, pr_number, client)
+            except RateLimitException:
+                # A request didn't wait out the backoff, the next attempt waits for it or stops when exhausted
+                pass
+            except Exception:  # pylint: disable=broad-except
+                if not budget.was_rate_limited():
+                    logger.exception("Failed to collect PR", pr_number=pr_number)
+                    return True, None
+            else:
+                if not budget.was_rate_limited():
+                    return True, raw_data
+            logger.info("Retrying rate limited PR collection", pr_number=pr_number)
+        logger.warning("Failed to collect PR, rate limited", pr_number=pr_number)
+        return True, None
 
     def collect_pull_request(
         self,
@@ -190,7 +359,6 @@ class GitProviderMixin(ABC):
         pr_number: int,
     ) -> Optional[PullRequestData]:
         client = self.get_client(token=token, update_token=update_token)
-        raw_data = None
         logger.info(
             "Started collection data for PR",
             repository_name=repository.name,
@@ -199,6 +367,22 @@ class GitProviderMixin(ABC):
         )
         try:
             raw_data = self._collect_raw_pull_request(repository, pr_number, client)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to extract PR", pr_number=pr_number, raw_data=None)
+            return None
+        finally:
+            client.close()
+        return self._write_pull_request(repository, output, author_callback, pr_number, raw_data)
+
+    def _write_pull_request(
+        self,
+        repository: RepositoryInDB,
+        output: OutputHandler,
+        author_callback: Callable,
+        pr_number: int,
+        raw_data: dict,
+    ) -> Optional[PullRequestData]:
+        try:
             pr_data = self._tranform_to_pr_data(repository, pr_number, raw_data, author_callback)
 
             output.write(ExtractedKind.PULL_REQUEST, pr_data.pr)
@@ -214,8 +398,6 @@ class GitProviderMixin(ABC):
         except Exception:  # pylint: disable=broad-except
             logger.exception("Failed to extract PR", pr_number=pr_number, raw_data=raw_data)
             return None
-        finally:
-            client.close()
 
     def _is_pr_need_to_be_updated(
         self,
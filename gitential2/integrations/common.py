@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 from dateutil import parser
 from requests import Response
@@ -6,6 +6,7 @@ from requests.utils import parse_header_links
 from structlog import get_logger
 
 from gitential2.utils import is_timestamp_within_days, is_list_not_empty, is_string_not_empty
+from .http_cache import get_json
 
 logger = get_logger(__name__)
 
@@ -18,7 +19,14 @@ def walk_next_link(
     integration_name=None,
     repo_analysis_limit_in_days: Optional[int] = None,
     time_restriction_check_key: Optional[str] = None,
+    revalidate: bool = False,
+    item_fields: Optional[Tuple[str, ...]] = None,
 ):
+    """Collects the items of the pages, the polled lists can revalidate their cached pages with revalidate.
+
+    With item_fields only these fields of the items are kept, also in the cached pages.
+    """
+
     def _get_next_link(link_header) -> Optional[str]:
         if link_header:
             header_links = parse_header_links(link_header)
@@ -32,20 +40,21 @@ def walk_next_link(
     )
 
     acc = acc or []
-    response = client.request("GET", starting_url)
-    if response.status_code == 200:
-        items, headers = response.json(), response.headers
+    result = get_json(client, starting_url, revalidate=revalidate, item_fields=item_fields)
+    if isinstance(result.body, list):
+        items = result.body
 
         logger.debug(
             "walking_next_link_response",
             integration_name=integration_name,
-            headers=headers,
+            headers=result.response.headers if result.response is not None else None,
+            from_cache=result.from_cache,
             response_items_list_length=len(items),
             response_items=items,
         )
 
         acc = acc + items
-        next_url = _get_next_link(headers.get("Link"))
+        next_url = _get_next_link(result.link)
         if __is_able_to_continue_walk_next_link(
             items=items,
             max_pages=max_pages,
@@ -53,12 +62,20 @@ def walk_next_link(
             repo_analysis_limit_in_days=repo_analysis_limit_in_days,
             time_restriction_check_key=time_restriction_check_key,
         ):
-            return walk_next_link(client, next_url, acc, max_pages=max_pages - 1, integration_name=integration_name)
+            return walk_next_link(
+                client,
+                next_url,
+                acc,
+                max_pages=max_pages - 1,
+                integration_name=integration_name,
+                revalidate=revalidate,
+                item_fields=item_fields,
+            )
         else:
             return acc
-    else:
-        log_api_error(response)
-        return acc
+    elif result.response is not None:
+        log_api_error(result.response)
+    return acc
 
 
 def __is_able_to_continue_walk_next_link(
@@ -1,5 +1,5 @@
 from datetime import datetime, timezone
-from typing import Callable, Optional, List, Tuple
+from typing import Callable, Dict, Optional, List, Tuple
 
 from authlib.integrations.requests_client import OAuth2Session
 from pydantic.datetime_parse import parse_datetime
@@ -7,15 +7,19 @@ from structlog import get_logger
 
 from gitential2.datatypes import UserInfoCreate, RepositoryInDB, RepositoryCreate, GitProtocol
 from gitential2.datatypes.authors import AuthorAlias
+from gitential2.exceptions import RateLimitException
 from gitential2.datatypes.pull_requests import (
     PullRequest,
     PullRequestState,
     PullRequestData,
     PullRequestCommit,
     PullRequestComment,
+    PullRequestLabel,
 )
 from .base import OAuthLoginMixin, BaseIntegration, GitProviderMixin
 from .common import log_api_error, walk_next_link
+from .github_graphql import PULL_REQUESTS_PER_REQUEST, fetch_raw_pull_requests, get_graphql_url
+from .rate_limit import RateLimitBudget
 from ..utils import is_list_not_empty, is_string_not_empty
 from ..utils.is_bugfix import calculate_is_bugfix
 
@@ -23,6 +27,9 @@ logger = get_logger(__name__)
 
 
 class GithubIntegration(OAuthLoginMixin, GitProviderMixin, BaseIntegration):
+    rate_limit_reserve = 500
+    pull_requests_per_bulk_request = PULL_REQUESTS_PER_REQUEST
+
     def get_client(self, token, update_token) -> OAuth2Session:
         return self.get_oauth2_client(token=token, update_token=update_token)
 
@@ -71,7 +78,11 @@ class GithubIntegration(OAuthLoginMixin, GitProviderMixin, BaseIntegration):
     def get_rate_limit(self, token, update_token: Callable):
         api_base_url = self.oauth_register()["api_base_url"]
         client = self.get_oauth2_client(token=token, update_token=update_token)
-        response = client.get(f"{api_base_url}rate_limit")
+        try:
+            response = client.get(f"{api_base_url}rate_limit")
+        except RateLimitException:
+            logger.info("Github API rate limit exhausted")
+            return None
         if response.status_code == 200:
             rate_limit, headers = response.json(), response.headers
 
@@ -110,6 +121,9 @@ class GithubIntegration(OAuthLoginMixin, GitProviderMixin, BaseIntegration):
             integration_name="github_prs_",
             repo_analysis_limit_in_days=repo_analysis_limit_in_days,
             time_restriction_check_key="created_at",
+            revalidate=True,
+            # Only these are needed to select the PRs to collect, their details are fetched separately
+            item_fields=("number", "created_at", "updated_at"),
         )
         return prs
 
@@ -119,7 +133,7 @@ class GithubIntegration(OAuthLoginMixin, GitProviderMixin, BaseIntegration):
     def _check_rate_limit(self, token, update_token):
         rate_limit = self.get_rate_limit(token, update_token)
 
-        if rate_limit and rate_limit["remaining"] > 500:
+        if rate_limit and rate_limit["remaining"] > self.rate_limit_reserve:
             return True
         else:
             logger.warn(
@@ -163,6 +177,25 @@ class GithubIntegration(OAuthLoginMixin, GitProviderMixin, BaseIntegration):
             "users": users,
         }
 
+    def _collect_raw_pull_requests_in_bulk(
+        self, repository: RepositoryInDB, client, budget: RateLimitBudget, pr_numbers: List[int]
+    ) -> Dict[int, dict]:
+        if not self.settings.options.get("graphql_pull_requests", True):
+            return {}
+        if not budget.acquire(tokens=0, reserve=self.rate_limit_reserve):
+            return {}
+        api_base_url = self.oauth_register()["api_base_url"]
+        graphql_url = str(self.settings.options.get("graphql_url", get_graphql_url(api_base_url)))
+        try:
+            return fetch_raw_pull_requests(
+                client, graphql_url, api_base_url, repository.namespace, repository.name, pr_numbers
+            )
+        except RateLimitException:
+            return {}
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to collect PRs with GraphQL", repository_id=repository.id, pr_numbers=pr_numbers)
+            return {}
+
     def _tranform_to_pr_data(
         self, repository: RepositoryInDB, pr_number: int, raw_data: dict, author_callback: Callable
     ) -> PullRequestData:
@@ -175,7 +208,9 @@ class GithubIntegration(OAuthLoginMixin, GitProviderMixin, BaseIntegration):
             author_callback=author_callback,
         )
 
-        return PullRequestData(pr=pull_request, comments=comments, commits=commits, labels=[])
+        labels = self._transform_to_labels(raw_data["pr"].get("labels") or [], raw_data, repository)
+
+        return PullRequestData(pr=pull_request, comments=comments, commits=commits, labels=labels)
 
     def _transform_to_pr(self, raw_data, repository, author_callback: Callable):
         def _calc_first_commit_authored_at(raw_commits):
@@ -249,7 +284,9 @@ class GithubIntegration(OAuthLoginMixin, GitProviderMixin, BaseIntegration):
                 "Starting to get repositories for user organization.", user_organization_name=user_organization_name
             )
             url = f"{api_base_url}orgs/{user_organization_name}/repos?per_page=100&type=all"
-            results = walk_next_link(client, url, integration_name="github_repos_for_given_user_organization")
+            results = walk_next_link(
+                client, url, integration_name="github_repos_for_given_user_organization", revalidate=True
+            )
             logger.debug(
                 "Repositories in provided user organization.",
                 user_organization_name=user_organization_name,
@@ -293,7 +330,7 @@ class GithubIntegration(OAuthLoginMixin, GitProviderMixin, BaseIntegration):
         get_list_of_organizations_url = f"{api_base_url}user/orgs?per_page=100"
         logger.debug("Starting to get organizations for GitHub user.", url=get_list_of_organizations_url)
         list_of_user_organizations = walk_next_link(
-            client, get_list_of_organizations_url, integration_name="github_organizations_for_user"
+            client, get_list_of_organizations_url, integration_name="github_organizations_for_user", revalidate=True
         )
         if is_list_not_empty(list_of_user_organizations):
             result = [
@@ -389,6 +426,7 @@ class GithubIntegration(OAuthLoginMixin, GitProviderMixin, BaseIntegration):
             )
 
         starting_url = f"{api_base_url}user/repos?per_page=100&type=all&since={last_refresh_formatted}"
+        # The URL changes with the last refresh, its pages are not revalidated
         repository_list = walk_next_link(client, starting_url, integration_name="github_private_repos_newly_created")
 
         merged_repos = GithubIntegration.get_merged_repos(repository_list, org_repos)
@@ -405,7 +443,7 @@ class GithubIntegration(OAuthLoginMixin, GitProviderMixin, BaseIntegration):
             client, api_base_url, user_organization_name_list
         )
         starting_url = f"{api_base_url}user/repos?per_page=100&type=all"
-        repository_list = walk_next_link(client, starting_url, integration_name="github_private_repos")
+        repository_list = walk_next_link(client, starting_url, integration_name="github_private_repos", revalidate=True)
         logger.info("GitHub repositories for authenticated user.", number_of_repositories=len(repository_list))
 
         merged_repos = GithubIntegration.get_merged_repos(repository_list, user_orgs_repos)
@@ -472,6 +510,24 @@ class GithubIntegration(OAuthLoginMixin, GitProviderMixin, BaseIntegration):
             ret.append(commit)
         return ret
 
+    def _transform_to_labels(
+        self,
+        labels_raw: list,
+        raw_data: dict,
+        repository: RepositoryInDB,
+    ) -> List[PullRequestLabel]:
+        return [
+            PullRequestLabel(
+                repo_id=repository.id,
+                pr_number=raw_data["pr"]["number"],
+                name=label_raw["name"],
+                color=label_raw.get("color"),
+                description=label_raw.get("description"),
+                extra=label_raw,
+            )
+            for label_raw in labels_raw
+        ]
+
     def _transform_to_comments(
         self,
         notes_raw: list,
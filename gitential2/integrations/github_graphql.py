@@ -0,0 +1,230 @@
+from typing import Dict, List, Optional
+
+from structlog import get_logger
+
+logger = get_logger(__name__)
+
+# The PRs fetched by a request, with their connections inline up to the page sizes below
+PULL_REQUESTS_PER_REQUEST = 20
+COMMITS_PER_PAGE = 100
+REVIEW_THREADS_PER_PAGE = 50
+COMMENTS_PER_REVIEW_THREAD = 100
+LABELS_PER_PULL_REQUEST = 100
+
+# GraphQL refuses the documents having unused fragments, a query gets only the ones it uses
+_ACTOR_FRAGMENT = """
+fragment actor on Actor {
+  __typename
+  login
+  ... on User { databaseId name }
+  ... on Bot { databaseId }
+}
+"""
+
+_COMMIT_CONNECTION_FRAGMENT = """
+fragment commitConnection on PullRequestCommitConnection {
+  pageInfo { hasNextPage endCursor }
+  nodes {
+    commit {
+      oid
+      author { name email date user { login } }
+      committer { name email date user { login } }
+    }
+  }
+}
+"""
+
+_REVIEW_THREAD_CONNECTION_FRAGMENT = f"""
+fragment reviewThreadConnection on PullRequestReviewThreadConnection {{
+  pageInfo {{ hasNextPage endCursor }}
+  nodes {{
+    comments(first: {COMMENTS_PER_REVIEW_THREAD}) {{
+      pageInfo {{ hasNextPage }}
+      nodes {{ databaseId body path url createdAt updatedAt author {{ ...actor }} }}
+    }}
+  }}
+}}
+"""
+
+_PULL_REQUEST_FRAGMENT = f"""
+fragment pullRequest on PullRequest {{
+  databaseId
+  number
+  title
+  state
+  isDraft
+  createdAt
+  updatedAt
+  closedAt
+  mergedAt
+  additions
+  deletions
+  changedFiles
+  author {{ ...actor }}
+  mergedBy {{ ...actor }}
+  labels(first: {LABELS_PER_PULL_REQUEST}) {{ nodes {{ name color description }} }}
+  commits(first: {COMMITS_PER_PAGE}) {{ ...commitConnection }}
+  reviewThreads(first: {REVIEW_THREADS_PER_PAGE}) {{ ...reviewThreadConnection }}
+}}
+"""
+
+_NEXT_PAGE_QUERIES = {
+    "commits": f"""
+query($owner: String!, $name: String!, $number: Int!, $cursor: String!) {{
+  repository(owner: $owner, name: $name) {{
+    pullRequest(number: $number) {{ commits(first: {COMMITS_PER_PAGE}, after: $cursor) {{ ...commitConnection }} }}
+  }}
+}}
+{_COMMIT_CONNECTION_FRAGMENT}""",
+    "reviewThreads": f"""
+query($owner: String!, $name: String!, $number: Int!, $cursor: String!) {{
+  repository(owner: $owner, name: $name) {{
+    pullRequest(number: $number) {{
+      reviewThreads(first: {REVIEW_THREADS_PER_PAGE}, after: $cursor) {{ ...reviewThreadConnection }}
+    }}
+  }}
+}}
+{_REVIEW_THREAD_CONNECTION_FRAGMENT}{_ACTOR_FRAGMENT}""",
+}
+
+
+def get_graphql_url(api_base_url: str) -> str:
+    # GitHub Enterprise serves the REST API under /api/v3/ and the GraphQL API at /api/graphql
+    if api_base_url.rstrip("/").endswith("/api/v3"):
+        return api_base_url.rstrip("/")[: -len("v3")] + "graphql"
+    return api_base_url.rstrip("/") + "/graphql"
+
+
+def pull_requests_query(pr_numbers: List[int]) -> str:
+    aliases = "\n".join(
+        f"    pr{number}: pullRequest(number: {int(number)}) {{ ...pullRequest }}" for number in pr_numbers
+    )
+    return f"""
+query($owner: String!, $name: String!) {{
+  repository(owner: $owner, name: $name) {{
+{aliases}
+  }}
+}}
+{_PULL_REQUEST_FRAGMENT}{_COMMIT_CONNECTION_FRAGMENT}{_REVIEW_THREAD_CONNECTION_FRAGMENT}{_ACTOR_FRAGMENT}"""
+
+
+def _post_query(client, graphql_url: str, query: str, variables: dict) -> Optional[dict]:
+    response = client.post(graphql_url, json={"query": query, "variables": variables})
+    response.raise_for_status()
+    result = response.json()
+    if result.get("errors"):
+        # The data of the other PRs is still returned next to the errors, e.g. of a missing PR
+        logger.warning("GitHub GraphQL query errors", errors=result["errors"], variables=variables)
+    return result.get("data")
+
+
+def fetch_raw_pull_requests(
+    client, graphql_url: str, api_base_url: str, owner: str, name: str, pr_numbers: List[int]
+) -> Dict[int, dict]:
+    """The raw data of the PRs in the shape of the REST API responses, fetched with a GraphQL query.
+
+    The commits and the review threads of a PR are paginated with their cursors. A PR missing from the
+    response or having a review thread with more comments than a page is left out, it is to be fetched by
+    the REST API.
+    """
+    data = _post_query(client, graphql_url, pull_requests_query(pr_numbers), {"owner": owner, "name": name})
+    repository = (data or {}).get("repository") or {}
+    ret = {}
+    for number in pr_numbers:
+        node = repository.get(f"pr{number}")
+        if not node:
+            continue
+        variables = {"owner": owner, "name": name, "number": number}
+        if not all(
+            _fetch_remaining_pages(client, graphql_url, variables, node, connection_name)
+            for connection_name in ["commits", "reviewThreads"]
+        ):
+            continue
+        if any(thread["comments"]["pageInfo"]["hasNextPage"] for thread in node["reviewThreads"]["nodes"]):
+            logger.info("Too many comments in a review thread for GitHub GraphQL", pr_number=number)
+            continue
+        ret[number] = _to_raw_pull_request(node, api_base_url, owner, name)
+    return ret
+
+
+def _fetch_remaining_pages(client, graphql_url: str, variables: dict, node: dict, connection_name: str) -> bool:
+    """Adds the next pages of a connection to the node, False if one of them is missing"""
+    connection = node[connection_name]
+    while connection["pageInfo"]["hasNextPage"]:
+        data = _post_query(
+            client,
+            graphql_url,
+            _NEXT_PAGE_QUERIES[connection_name],
+            {**variables, "cursor": connection["pageInfo"]["endCursor"]},
+        )
+        pull_request = ((data or {}).get("repository") or {}).get("pullRequest")
+        if not pull_request:
+            return False
+        connection["nodes"] += pull_request[connection_name]["nodes"]
+        connection["pageInfo"] = pull_request[connection_name]["pageInfo"]
+    return True
+
+
+def _to_raw_git_actor(git_actor: dict) -> dict:
+    return {"name": git_actor["name"], "email": git_actor["email"], "date": git_actor["date"]}
+
+
+def _to_raw_pull_request(node: dict, api_base_url: str, owner: str, name: str) -> dict:
+    users: dict = {}
+
+    def _user(actor: Optional[dict]) -> Optional[dict]:
+        # The users are looked up by their REST API url, like the ones fetched separately
+        if not actor:
+            return None
+        # The REST API names the bot accounts with the [bot] suffix
+        login = f"{actor['login']}[bot]" if actor.get("__typename") == "Bot" else actor["login"]
+        user = {"login": login, "id": actor.get("databaseId"), "url": f"{api_base_url}users/{login}"}
+        users[user["url"]] = {**user, "name": actor.get("name")}
+        return user
+
+    pr = {
+        "id": node["databaseId"],
+        "number": node["number"],
+        "url": f"{api_base_url}repos/{owner}/{name}/pulls/{node['number']}",
+        "title": node["title"],
+        # The merged PRs are closed ones with merged_at in the REST API
+        "state": "open" if node["state"] == "OPEN" else "closed",
+        "draft": node["isDraft"],
+        "created_at": node["createdAt"],
+        "updated_at": node["updatedAt"],
+        "closed_at": node["closedAt"],
+        "merged_at": node["mergedAt"],
+        "additions": node["additions"],
+        "deletions": node["deletions"],
+        "changed_files": node["changedFiles"],
+        # A deleted account is shown as the ghost user by the REST API
+        "user": _user(node["author"] or {"login": "ghost"}),
+        "merged_by": _user(node["mergedBy"]),
+        "labels": node["labels"]["nodes"],
+    }
+    commits = [
+        {
+            "sha": commit_node["commit"]["oid"],
+            "commit": {
+                "author": _to_raw_git_actor(commit_node["commit"]["author"]),
+                "committer": _to_raw_git_actor(commit_node["commit"]["committer"]),
+            },
+            "author": commit_node["commit"]["author"]["user"],
+            "committer": commit_node["commit"]["committer"]["user"],
+        }
+        for commit_node in node["commits"]["nodes"]
+    ]
+    review_comments = [
+        {
+            "id": comment["databaseId"],
+            "body": comment["body"],
+            "path": comment["path"],
+            "html_url": comment["url"],
+            "created_at": comment["createdAt"],
+            "updated_at": comment["updatedAt"],
+            "user": _user(comment["author"]),
+        }
+        for thread in node["reviewThreads"]["nodes"]
+        for comment in thread["comments"]["nodes"]
+    ]
+    return {"pr": pr, "commits": commits, "review_comments": review_comments, "users": users}
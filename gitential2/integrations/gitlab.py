@@ -83,6 +83,7 @@ class GitlabIntegration(OAuthLoginMixin, GitProviderMixin, BaseIntegration):
         # order for basic search
         query_params = {"membership": 1, "per_page": 100, "last_activity_after": last_refresh_formatted}
         url = f"{self.api_base_url}/projects?{parse_url.urlencode(query_params)}"
+        # The URL changes with the last refresh, its pages are not revalidated
         projects = walk_next_link(client, url, integration_name="gitlab_private_newest_repos_since_last_refresh")
         client.close()
         return [self._project_to_repo_create(p) for p in projects if parser.parse(p["created_at"]) > last_refresh]
@@ -92,6 +93,7 @@ class GitlabIntegration(OAuthLoginMixin, GitProviderMixin, BaseIntegration):
     ) -> List[RepositoryCreate]:
         client = self.get_oauth2_client(token=token, update_token=update_token)
         url = f"{self.api_base_url}/projects?membership=1&pagination=keyset&order_by=id&per_page=100"
+        # The cached pages are keyed by the access token, which changes on every refresh, these are not revalidated
         projects = walk_next_link(client, url, integration_name="gitlab_private_repos")
         client.close()
         return [self._project_to_repo_create(p) for p in projects]
@@ -150,6 +152,7 @@ class GitlabIntegration(OAuthLoginMixin, GitProviderMixin, BaseIntegration):
     ) -> list:
         if repository.extra and "id" in repository.extra:
             project_id = repository.extra["id"]
+            # Not revalidated, like the project list
             merge_requests = walk_next_link(
                 client,
                 f"{self.api_base_url}/projects/{project_id}/merge_requests?state=all&per_page=100&view=simple",
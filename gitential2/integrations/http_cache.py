@@ -0,0 +1,109 @@
+import base64
+import json
+import time
+import zlib
+from typing import NamedTuple, Optional, Tuple
+
+from requests import Response
+from structlog import get_logger
+
+from gitential2.kvstore import JsonableType, KeyValueStore
+
+logger = get_logger(__name__)
+
+# The bodies are kept this long for the revalidation
+REVALIDATION_EXPIRY_SECONDS = 24 * 60 * 60
+# The bodies are stored compressed, the ones larger than this after the compression are downloaded again
+MAX_CACHED_BODY_BYTES = 512 * 1024
+
+
+class JSONResponse(NamedTuple):
+    # None when the request failed
+    body: Optional[JsonableType]
+    link: Optional[str]
+    # None when the body was served from the cache without a request
+    response: Optional[Response]
+    from_cache: bool = False
+
+
+def _encode_body(body: JsonableType) -> str:
+    return base64.b64encode(zlib.compress(json.dumps(body).encode("utf-8"))).decode("ascii")
+
+
+def _decode_body(encoded_body: str) -> JsonableType:
+    return json.loads(zlib.decompress(base64.b64decode(encoded_body)))
+
+
+def _select_fields(body: JsonableType, item_fields: Optional[Tuple[str, ...]]) -> JsonableType:
+    if item_fields is None or not isinstance(body, list):
+        return body
+    return [
+        {field: item[field] for field in item_fields if field in item} if isinstance(item, dict) else item
+        for item in body
+    ]
+
+
+def get_json_revalidated(
+    client,
+    kvstore: KeyValueStore,
+    cache_key: str,
+    url: str,
+    max_age_seconds: int = 0,
+    expiry_seconds: int = REVALIDATION_EXPIRY_SECONDS,
+    item_fields: Optional[Tuple[str, ...]] = None,
+) -> JSONResponse:
+    """GETs a JSON body, the cached one is revalidated with its ETag and Last-Modified after max_age_seconds.
+
+    A 304 Not Modified response reuses the cached body, on GitHub it does not count against the rate limit.
+    With item_fields only these fields of the items of a list body are returned and cached, e.g. a page of
+    the GitHub pull requests is a few megabytes with every field. The bodies are cached compressed, the ones
+    larger than MAX_CACHED_BODY_BYTES even after the compression are not cached.
+    """
+    entry = kvstore.get_value(cache_key)
+    if not isinstance(entry, dict) or "encoded_body" not in entry:
+        entry = None
+    now = time.time()
+    if entry is not None and now - entry["validated_at"] < max_age_seconds:
+        return JSONResponse(_decode_body(entry["encoded_body"]), entry["link"], None, from_cache=True)
+
+    headers = {}
+    if entry is not None and entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+    if entry is not None and entry["last_modified"]:
+        headers["If-Modified-Since"] = entry["last_modified"]
+    response = client.request("GET", url, headers=headers)
+
+    if response.status_code == 304 and entry is not None:
+        logger.debug("Cached response revalidated", url=url)
+        entry["validated_at"] = now
+        kvstore.set_value(cache_key, entry, ex=expiry_seconds)
+        return JSONResponse(_decode_body(entry["encoded_body"]), entry["link"], response, from_cache=True)
+    if response.status_code != 200:
+        return JSONResponse(None, None, response)
+
+    body = _select_fields(response.json(), item_fields)
+    entry = {
+        "encoded_body": _encode_body(body),
+        "link": response.headers.get("Link"),
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "validated_at": now,
+    }
+    if len(entry["encoded_body"]) > MAX_CACHED_BODY_BYTES:
+        logger.debug("Response too large to cache", url=url, size=len(entry["encoded_body"]))
+    elif entry["etag"] or entry["last_modified"] or max_age_seconds:
+        kvstore.set_value(cache_key, entry, ex=expiry_seconds)
+    return JSONResponse(body, entry["link"], response)
+
+
+def get_json(client, url: str, revalidate: bool = False, item_fields: Optional[Tuple[str, ...]] = None) -> JSONResponse:
+    """GETs a JSON body, revalidating the cached one when the client session has a response cache"""
+    response_cache = getattr(client, "response_cache", None) if revalidate else None
+    if response_cache is not None:
+        return get_json_revalidated(
+            client, response_cache, f"http-cache-{client.credential_key}-{url}", url, item_fields=item_fields
+        )
+    response = client.request("GET", url)
+    if response.status_code != 200:
+        return JSONResponse(None, None, response)
+    return JSONResponse(_select_fields(response.json(), item_fields), response.headers.get("Link"), response)
@@ -0,0 +1,233 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Optional, Tuple, TypeVar, cast
+
+from redis import Redis
+from redis.exceptions import WatchError
+from requests import Response
+from structlog import get_logger
+
+from gitential2.kvstore import KeyValueStore, RedisKeyValueStore
+
+logger = get_logger(__name__)
+
+# Waiting for the reset of the primary limit up to this, the collection stops instead of a longer wait
+MAX_RESET_WAIT_SECONDS = 60
+# A request waits up to this for the bucket, the longer waits are left to the callers
+MAX_REQUEST_WAIT_SECONDS = 10
+# Without a known reset time an exhausted bucket is tried again after this
+UNKNOWN_RESET_WAIT_SECONDS = 60
+# Without a Retry-After header the secondary limit backoff doubles from this up to the max
+MIN_BACKOFF_SECONDS = 5
+MAX_BACKOFF_SECONDS = 300
+# The reset times of the responses of the same window can differ this much
+RESET_JITTER_SECONDS = 1
+# The bucket of an unused credential is forgotten after this
+STATE_EXPIRY_SECONDS = 2 * 60 * 60
+
+_RATE_LIMITED_STATUS_CODES = (403, 429)
+
+T = TypeVar("T")
+
+
+def _header_value(response: Response, name: str) -> Optional[float]:
+    # GitHub, VSTS and Bitbucket use the X- prefixed names, GitLab the unprefixed ones
+    value = response.headers.get(f"X-{name}") or response.headers.get(name)
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_rate_limited_response(response: Response) -> bool:
+    if response.status_code not in _RATE_LIMITED_STATUS_CODES:
+        return False
+    if response.status_code == 429 or "Retry-After" in response.headers:
+        return True
+    # GitHub answers 403 both for the exhausted primary and for the secondary limits
+    remaining = _header_value(response, "RateLimit-Remaining")
+    return (remaining is not None and not remaining) or "rate limit" in response.text.lower()
+
+
+def _take_tokens(state: dict, now: float, tokens: int, reserve: int) -> Tuple[float, bool]:
+    paused_until = state.get("paused_until") or 0.0
+    if paused_until > now:
+        return paused_until - now, False
+    if state.get("reset_at") is not None and state["reset_at"] <= now:
+        # The bucket is refilled at the reset, the next response tells the new reset time
+        state["remaining"], state["reset_at"] = state.get("limit"), None
+    remaining = state.get("remaining")
+    if remaining is None:
+        # Nothing is known until the first response of the window
+        return 0.0, False
+    if remaining <= reserve:
+        reset_at = state.get("reset_at")
+        if reset_at is not None:
+            return reset_at - now, True
+        # E.g. a Reset header which is not an epoch, the next response after the wait tells the remaining count
+        state["exhausted_at"] = exhausted_at = state.get("exhausted_at") or now
+        if exhausted_at + UNKNOWN_RESET_WAIT_SECONDS > now:
+            return exhausted_at + UNKNOWN_RESET_WAIT_SECONDS - now, True
+        state["remaining"] = state["exhausted_at"] = None
+        return 0.0, False
+    state["remaining"] = remaining - tokens
+    return 0.0, False
+
+
+def _sync_from_response(state: dict, now: float, response: Response, rate_limited: bool):
+    remaining = _header_value(response, "RateLimit-Remaining")
+    reset_at = _header_value(response, "RateLimit-Reset")
+    limit = _header_value(response, "RateLimit-Limit")
+    if response.headers.get("X-RateLimit-Resource", "core") != "core":
+        # GitHub counts the GraphQL and the search requests separately, the bucket follows the REST API limit
+        remaining = reset_at = limit = None
+    if limit is not None:
+        state["limit"] = limit
+    if remaining is not None:
+        known_reset_at = state.get("reset_at")
+        if reset_at is None or known_reset_at is None or reset_at > known_reset_at + RESET_JITTER_SECONDS:
+            state["remaining"], state["reset_at"], state["exhausted_at"] = remaining, reset_at, None
+        elif reset_at >= known_reset_at - RESET_JITTER_SECONDS:
+            # The responses of the concurrent requests arrive in any order, the lowest count is the latest
+            state["remaining"] = min(remaining, state["remaining"]) if state.get("remaining") is not None else remaining
+        # A response from a previous window is ignored
+    retry_after = _header_value(response, "Retry-After")
+    if rate_limited and (remaining is None or remaining or retry_after is not None):
+        # The exhausted primary limit waits for the reset, the secondary limits back off
+        backoff = min(max((state.get("backoff") or 0.0) * 2, MIN_BACKOFF_SECONDS), MAX_BACKOFF_SECONDS)
+        pause_seconds = retry_after if retry_after is not None else backoff
+        state["backoff"] = backoff
+        state["paused_until"] = max(state.get("paused_until") or 0.0, now + pause_seconds)
+    elif response.ok:
+        state["backoff"] = 0.0
+
+
+class TokenBucket(ABC):
+    """The API requests left for the credentials, keyed by integration and credential.
+
+    A bucket is synced from the rate limit headers of the responses and refilled to the limit at its reset time.
+    A rate limited response (the secondary limits) pauses the bucket until the Retry-After time or an exponential
+    backoff.
+    """
+
+    def take(self, key: str, tokens: int = 1, reserve: int = 0) -> Tuple[float, bool]:
+        """Takes the tokens when more than the reserve is left. Returns the seconds to wait before trying again,
+        0 when the tokens are taken, and whether the bucket is exhausted."""
+        return self._update(key, lambda state: _take_tokens(state, time.time(), tokens, reserve))
+
+    def sync(self, key: str, response: Response, rate_limited: bool):
+        self._update(key, lambda state: _sync_from_response(state, time.time(), response, rate_limited))
+
+    @abstractmethod
+    def _update(self, key: str, update: Callable[[dict], T]) -> T:
+        """Updates the state of a bucket atomically"""
+
+
+class InMemTokenBucket(TokenBucket):
+    """The buckets of a single node setup"""
+
+    def __init__(self):
+        self._states: dict = {}
+        self._lock = threading.Lock()
+
+    def _update(self, key: str, update: Callable[[dict], T]) -> T:
+        with self._lock:
+            return update(self._states.setdefault(key, {}))
+
+
+class RedisTokenBucket(TokenBucket):
+    """The buckets shared by the workers of the cluster"""
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+
+    def _update(self, key: str, update: Callable[[dict], T]) -> T:
+        name = f"rate-limit-{key}"
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(name)
+                    # In the WATCH mode the commands run immediately instead of being buffered
+                    encoded_state = cast(Optional[bytes], pipe.get(name))
+                    state = json.loads(encoded_state) if encoded_state else {}
+                    result = update(state)
+                    new_encoded_state = json.dumps(state)
+                    if encoded_state is not None and new_encoded_state == encoded_state.decode("utf-8"):
+                        # A refused take doesn't extend the expiry of the state
+                        pipe.reset()
+                        return result
+                    pipe.multi()
+                    pipe.set(name, new_encoded_state, ex=STATE_EXPIRY_SECONDS)
+                    pipe.execute()
+                    return result
+                except WatchError:
+                    # Another worker updated the bucket in the meantime
+                    continue
+
+
+def init_token_bucket(kvstore: KeyValueStore) -> TokenBucket:
+    if isinstance(kvstore, RedisKeyValueStore):
+        return RedisTokenBucket(kvstore.redis)
+    else:
+        return InMemTokenBucket()
+
+
+class RateLimitBudget:
+    """The token bucket of a client session, shared by the threads collecting with it.
+
+    It is kept up to date by the responses of the session, and it tracks whether the requests of a thread
+    got rate limited.
+    """
+
+    def __init__(self, bucket: TokenBucket, key: str):
+        self.bucket = bucket
+        self.key = key
+        self._local = threading.local()
+
+    def update_from_response(self, response: Response, *args, **kwargs):  # pylint: disable=unused-argument
+        """A requests response hook"""
+        rate_limited = is_rate_limited_response(response)
+        self.bucket.sync(self.key, response, rate_limited)
+        if rate_limited:
+            self._local.rate_limited = True
+            logger.warning("API rate limited, backing off", url=response.url, key=self.key)
+        return response
+
+    def acquire(self, tokens: int = 1, reserve: int = 0, max_wait_seconds: Optional[float] = None) -> bool:
+        """Waits out the backoff, False if the budget is exhausted for longer than MAX_RESET_WAIT_SECONDS,
+        or if the wait would be longer than max_wait_seconds"""
+        waited_seconds = 0.0
+        while True:
+            wait_seconds, exhausted = self.bucket.take(self.key, tokens=tokens, reserve=reserve)
+            if wait_seconds <= 0:
+                return True
+            if exhausted and wait_seconds > MAX_RESET_WAIT_SECONDS:
+                return False
+            if max_wait_seconds is not None and waited_seconds + wait_seconds > max_wait_seconds:
+                return False
+            sleep_seconds = min(wait_seconds, MAX_BACKOFF_SECONDS)
+            time.sleep(sleep_seconds)
+            waited_seconds += sleep_seconds
+
+    def start_request_group(self):
+        """Starts tracking whether the requests of the current thread got rate limited"""
+        self._local.rate_limited = False
+
+    def was_rate_limited(self) -> bool:
+        return getattr(self._local, "rate_limited", False)
+
+
+_budget_lock = threading.Lock()
+
+
+def get_rate_limit_budget(client) -> RateLimitBudget:
+    """The budget of a client session, a session without one gets an in-process budget"""
+    with _budget_lock:
+        budget = getattr(client, "rate_limit_budget", None)
+        if budget is None:
+            budget = RateLimitBudget(InMemTokenBucket(), key=f"client-{id(client)}")
+            client.rate_limit_budget = budget
+            client.hooks["response"].append(budget.update_from_response)
+        return budget
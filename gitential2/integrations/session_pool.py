@@ -0,0 +1,190 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from authlib.integrations.requests_client import OAuth2Auth, OAuth2Session
+from requests.adapters import HTTPAdapter
+from structlog import get_logger
+
+from gitential2.exceptions import RateLimitException
+from gitential2.kvstore import KeyValueStore
+from .rate_limit import MAX_REQUEST_WAIT_SECONDS, RateLimitBudget, TokenBucket
+
+logger = get_logger(__name__)
+
+MAX_SESSIONS = 64
+MAX_IDLE_SECONDS = 300
+CONNECTIONS_PER_HOST = 16
+
+SessionKey = Tuple[str, str, str]
+
+
+class _PooledOAuth2Auth(OAuth2Auth):
+    def ensure_active_token(self):
+        # The threads sharing the session check the expiry one by one, only the first one refreshes the token
+        with self.client.token_lock:
+            super().ensure_active_token()
+
+
+class PooledOAuth2Session(OAuth2Session):
+    """An OAuth2Session kept open between the requests of the same integration and credential.
+
+    close() keeps the connections alive, the pool closes the session when it is evicted. With a token bucket
+    every request takes a token of the credential first, with a response cache the polled lists are revalidated.
+    """
+
+    token_auth_class = _PooledOAuth2Auth
+
+    def __init__(
+        self,
+        pool: "HTTPSessionPool",
+        key: SessionKey,
+        token_bucket: Optional[TokenBucket] = None,
+        response_cache: Optional[KeyValueStore] = None,
+        **kwargs,
+    ):
+        self.token_lock = threading.RLock()
+        super().__init__(**kwargs)
+        self.pool = pool
+        self.key = key
+        self.response_cache = response_cache
+        self.last_used = time.monotonic()
+        self.rate_limit_budget: Optional[RateLimitBudget] = None
+        if token_bucket is not None:
+            self.rate_limit_budget = RateLimitBudget(token_bucket, self.credential_key)
+            self.hooks["response"].append(self.rate_limit_budget.update_from_response)
+        adapter = HTTPAdapter(pool_connections=CONNECTIONS_PER_HOST, pool_maxsize=CONNECTIONS_PER_HOST)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    @property
+    def credential_key(self) -> str:
+        # The rate limits and the responses belong to the credential, whatever the other session parameters are
+        return f"{self.key[0]}-{self.key[1]}"
+
+    def request(self, method, url, withhold_token=False, auth=None, **kwargs):
+        self.last_used = time.monotonic()
+        # The collections wait out the longer backoffs before their requests, the API handlers don't wait for them
+        if self.rate_limit_budget is not None and not self.rate_limit_budget.acquire(
+            max_wait_seconds=MAX_REQUEST_WAIT_SECONDS
+        ):
+            raise RateLimitException(f"API rate limit exhausted for {self.key[0]}")
+        return super().request(method, url, withhold_token=withhold_token, auth=auth, **kwargs)
+
+    def refresh_token(self, url, refresh_token=None, body="", auth=None, headers=None, **kwargs):
+        # The token is refreshed in place, the session stays in the pool under the new credential
+        with self.token_lock:
+            if refresh_token is not None and self.token and refresh_token != self.token.get("refresh_token"):
+                # Already refreshed by another thread, the providers rotating the refresh tokens reject the old one
+                return self.token
+            token = super().refresh_token(
+                url, refresh_token=refresh_token, body=body, auth=auth, headers=headers, **kwargs
+            )
+            self.pool.rekey(self)
+            return token
+
+    def close(self):
+        pass
+
+    def close_connections(self):
+        super().close()
+
+
+def _credential_id(token: Optional[dict]) -> str:
+    access_token = (token or {}).get("access_token") or ""
+    return hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+
+
+def _params_id(params: dict) -> str:
+    return repr(sorted((name, repr(value)) for name, value in params.items() if name not in ("token", "update_token")))
+
+
+class HTTPSessionPool:
+    """Keep-alive OAuth2 sessions shared by the integrations, keyed by integration and credential.
+
+    The least recently used sessions are closed above MAX_SESSIONS, the idle ones after MAX_IDLE_SECONDS.
+    The sessions are not shared with forked processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._sessions: "OrderedDict[SessionKey, PooledOAuth2Session]" = OrderedDict()
+        self._pid = os.getpid()
+
+    def get_session(
+        self,
+        integration_name: str,
+        params: dict,
+        token_bucket: Optional[TokenBucket] = None,
+        response_cache: Optional[KeyValueStore] = None,
+    ) -> OAuth2Session:
+        token = params.get("token")
+        if not token:
+            # Without a credential the session would be shared by the logins, it gets a token of its own
+            return OAuth2Session(**params)
+
+        key = (integration_name, _credential_id(token), _params_id(params))
+        with self._lock:
+            self._reset_after_fork()
+            self._close_idle_sessions()
+            session = self._sessions.get(key)
+            if session is None:
+                session = PooledOAuth2Session(
+                    self, key, token_bucket=token_bucket, response_cache=response_cache, **params
+                )
+                self._sessions[key] = session
+                self._close_least_recently_used()
+            else:
+                self._sessions.move_to_end(key)
+                with session.token_lock:
+                    if session.token != token:
+                        session.token = token
+                    if "update_token" in params:
+                        session.update_token = params["update_token"]
+            session.last_used = time.monotonic()
+            return session
+
+    def rekey(self, session: PooledOAuth2Session):
+        with self._lock:
+            new_key = (session.key[0], _credential_id(session.token), session.key[2])
+            if self._sessions.get(session.key) is session:
+                del self._sessions[session.key]
+            previous = self._sessions.pop(new_key, None)
+            if previous is not None and previous is not session:
+                previous.close_connections()
+            session.key = new_key
+            if session.rate_limit_budget is not None:
+                session.rate_limit_budget.key = session.credential_key
+            self._sessions[new_key] = session
+
+    def close_all(self):
+        with self._lock:
+            while self._sessions:
+                _, session = self._sessions.popitem(last=False)
+                session.close_connections()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _reset_after_fork(self):
+        if self._pid != os.getpid():
+            # The connections belong to the parent process, they are dropped without closing them
+            self._sessions = OrderedDict()
+            self._pid = os.getpid()
+
+    def _close_idle_sessions(self):
+        idle_since = time.monotonic() - MAX_IDLE_SECONDS
+        for key in [key for key, session in self._sessions.items() if session.last_used < idle_since]:
+            self._sessions.pop(key).close_connections()
+
+    def _close_least_recently_used(self):
+        while len(self._sessions) > MAX_SESSIONS:
+            key, session = self._sessions.popitem(last=False)
+            logger.debug("Closing least recently used HTTP session", integration_name=key[0])
+            session.close_connections()
+
+
+http_session_pool = HTTPSessionPool()
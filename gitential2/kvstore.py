@@ -2,7 +2,7 @@ from contextlib import contextmanager
 import json
 import threading
 from abc import ABC, abstractmethod
-from typing import Optional, Union, List, ContextManager
+from typing import Dict, Optional, Union, List, ContextManager
 from redis import Redis
 from redis.exceptions import LockError as RedisLockError
 from structlog import get_logger
@@ -27,10 +27,29 @@ class KeyValueStore(ABC):
     def set_value(self, name: str, value: JsonableType, ex: Optional[int] = None) -> JsonableType:
         pass
 
+    @abstractmethod
+    def increment_value(self, name: str, amount: int = 1) -> int:
+        """Atomically increments an integer value, a missing value counts as 0"""
+
     @abstractmethod
     def delete_value(self, name: str):
         pass
 
+    @abstractmethod
+    def get_hash_values(self, name: str, fields: List[str]) -> List[Optional[JsonableType]]:
+        """The values of the fields of a hash, None for the missing ones"""
+
+    @abstractmethod
+    def set_hash_values(self, name: str, values: Dict[str, JsonableType]):
+        pass
+
+    @abstractmethod
+    def delete_hash_values(self, name: str, fields: List[str]):
+        pass
+
+    def get_hash_value(self, name: str, field: str) -> Optional[JsonableType]:
+        return self.get_hash_values(name, [field])[0]
+
     @abstractmethod
     def delete_values(self, pattern: str):
         pass
@@ -60,6 +79,7 @@ class InMemKeyValueStore(KeyValueStore):
         super().__init__(settings)
         self._storage: dict = {}
         self._locks: dict = {}
+        self._increment_lock = threading.Lock()
 
     def get_value(self, name: str) -> Optional[JsonableType]:
         return self._storage.get(name)
@@ -68,10 +88,28 @@ class InMemKeyValueStore(KeyValueStore):
         self._storage[name] = value
         return self._storage[name]
 
+    def increment_value(self, name: str, amount: int = 1) -> int:
+        with self._increment_lock:
+            self._storage[name] = int(self._storage.get(name) or 0) + amount
+            return self._storage[name]
+
     def delete_value(self, name: str):
         if name in self._storage:
             del self._storage[name]
 
+    def get_hash_values(self, name: str, fields: List[str]) -> List[Optional[JsonableType]]:
+        hash_ = self._storage.get(name) or {}
+        return [hash_.get(field) for field in fields]
+
+    def set_hash_values(self, name: str, values: Dict[str, JsonableType]):
+        if values:
+            self._storage.setdefault(name, {}).update(values)
+
+    def delete_hash_values(self, name: str, fields: List[str]):
+        hash_ = self._storage.get(name) or {}
+        for field in fields:
+            hash_.pop(field, None)
+
     def delete_values(self, pattern: str):
         keys_to_be_deleted = self.list_keys(pattern)
         for key in keys_to_be_deleted:
@@ -115,9 +153,25 @@ class RedisKeyValueStore(KeyValueStore):
         self.redis.set(name, self._encode_value(value), ex=ex)
         return value
 
+    def increment_value(self, name: str, amount: int = 1) -> int:
+        return self.redis.incrby(name, amount)
+
     def delete_value(self, name: str):
         self.redis.delete(name)
 
+    def get_hash_values(self, name: str, fields: List[str]) -> List[Optional[JsonableType]]:
+        if not fields:
+            return []
+        return [self._decode_value(value) if value else None for value in self.redis.hmget(name, fields)]
+
+    def set_hash_values(self, name: str, values: Dict[str, JsonableType]):
+        if values:
+            self.redis.hset(name, mapping={field: self._encode_value(value) for field, value in values.items()})
+
+    def delete_hash_values(self, name: str, fields: List[str]):
+        if fields:
+            self.redis.hdel(name, *fields)
+
     def delete_values(self, pattern: str):
         for key in self.redis.scan_iter(pattern):
             self.redis.delete(key)
@@ -3,6 +3,7 @@ from pydantic import ValidationError
 
 from structlog import get_logger
 from gitential2.core import GitentialContext
+from gitential2.core.authors import reset_author_indexes
 
 from gitential2.datatypes.authors import AuthorInDB
 from gitential2.datatypes.authors import AuthorAlias
@@ -23,6 +24,8 @@ def import_teams_and_authors(
     g.backend.initialize_workspace(workspace_id)
     for author in legacy_authors:
         _import_author(g, author, workspace_id, legacy_aliases)
+    # The authors are inserted directly
+    reset_author_indexes(g, workspace_id)
     for team in legacy_teams:
         _import_team(g, team, workspace_id)
     for team_author in legacy_teams_authors:
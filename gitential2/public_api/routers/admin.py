@@ -1,11 +1,12 @@
 from typing import List
 from structlog import get_logger
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from gitential2.datatypes.access_approvals import AccessApprovalCreate, AccessApprovalInDB
+from gitential2.datatypes.stats import IbisPoolMetrics
 from gitential2.datatypes.users import UserInAdminRepr
 from gitential2.core.context import GitentialContext
 from gitential2.core.permissions import check_is_admin
-from gitential2.core.admin import admin_list_users, admin_create_access_approval
+from gitential2.core.admin import admin_list_users, admin_create_access_approval, admin_get_ibis_pool_metrics
 
 from ..dependencies import gitential_context, current_user
 
@@ -32,3 +33,15 @@ def access_approvals_(
 ):
     check_is_admin(g, current_user)
     return admin_create_access_approval(g, access_approval_create, current_user)
+
+
+@router.get("/admin/ibis-pool-metrics", response_model=IbisPoolMetrics)
+def ibis_pool_metrics_(
+    current_user=Depends(current_user),
+    g: GitentialContext = Depends(gitential_context),
+):
+    check_is_admin(g, current_user)
+    metrics = admin_get_ibis_pool_metrics(g)
+    if metrics is None:
+        raise HTTPException(404, "The ibis connection pool is disabled.")
+    return metrics
@@ -6,7 +6,7 @@ from gitential2.datatypes.stats import Query
 from gitential2.datatypes.permissions import Entity, Action
 from gitential2.core.context import GitentialContext
 from gitential2.core.permissions import check_permission
-from gitential2.core.stats_v2 import collect_stats_v2
+from gitential2.core.stats_v2 import collect_stats_v2, collect_multi_stats_v2
 
 from gitential2.core.subscription import limit_filter_time
 from gitential2.core.workspaces import is_workspace_subs_prof
@@ -37,14 +37,9 @@ def workspace_multi_stats(
 ):
     check_permission(g, current_user, Entity.workspace, Action.read, workspace_id=workspace_id)
 
-    ret: dict = {}
-    is_professional = is_workspace_subs_prof(g, workspace_id)
-    for name, val in stats_request.items():
-        if not is_professional:
-            val = limit_filter_time(workspace_id, val)
-        result = collect_stats_v2(g, workspace_id, val)
-        ret[name] = result
-    return ret
+    if not is_workspace_subs_prof(g, workspace_id):
+        stats_request = {name: limit_filter_time(workspace_id, val) for name, val in stats_request.items()}
+    return collect_multi_stats_v2(g, workspace_id, stats_request)
 
 
 # @router.get("/workspaces/{workspace_id}/projects/{project_id}/outlier")
@@ -0,0 +1,64 @@
+import copy
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from gitential2.kvstore import KeyValueStore
+from gitential2.settings import GitentialSettings, StatsCacheType
+
+
+class ResultCache(ABC):
+    @abstractmethod
+    def get(self, key: str) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: dict):
+        pass
+
+
+class KeyValueStoreResultCache(ResultCache):
+    def __init__(self, kvstore: KeyValueStore, expire_seconds: Optional[int] = None):
+        self.kvstore = kvstore
+        self.expire_seconds = expire_seconds
+
+    def get(self, key: str) -> Optional[dict]:
+        value = self.kvstore.get_value(key)
+        return value if isinstance(value, dict) else None
+
+    def set(self, key: str, value: dict):
+        self.kvstore.set_value(key, value, ex=self.expire_seconds)
+
+
+class InMemResultCache(ResultCache):
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                return None
+            self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: dict):
+        value = jsonable_encoder(value)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def init_result_cache(settings: GitentialSettings, kvstore: KeyValueStore) -> Optional[ResultCache]:
+    if settings.cache.stats_cache_type == StatsCacheType.kvstore:
+        return KeyValueStoreResultCache(kvstore, expire_seconds=settings.cache.stats_cache_expire_hours * 3600)
+    elif settings.cache.stats_cache_type == StatsCacheType.in_memory:
+        return InMemResultCache(max_entries=settings.cache.stats_cache_max_entries)
+    return None
@@ -141,9 +141,44 @@ class WebSettings(BaseModel):
 class ExtractionSettings(BaseModel):
     executor: Executor = Executor.process_pool
     process_pool_size: int = 4
+    process_pool_batch_size: int = 1  # > 1: the outputs come back in spilled batches, see extraction/transport.py
+    process_pool_max_batches_in_flight: int = 8
     show_progress: bool = False
     repo_analysis_limit_in_days: Optional[int] = None
     its_project_analysis_limit_in_days: Optional[int] = None
+    mirror_store_path: Optional[str] = None
+    mirror_store_size_limit_mb: int = 20 * 1024
+    mirror_store_ssh_accept_unknown_hosts: bool = False
+    pr_collection_workers: int = 4
+
+
+class StatsSettings(BaseModel):
+    multi_stats_pool_size: int = 8
+    multi_stats_max_concurrency_per_request: int = 4
+    query_timeout_seconds: Optional[float] = 60
+    ibis_pool_size: int = 10
+    ibis_pool_max_overflow: int = 5
+    ibis_pool_timeout_seconds: float = 30
+
+
+class RecalculationSettings(BaseModel):
+    process_pool_size: int = 1  # 1: the intervals are recalculated one after another, in the calling process
+    memory_budget_mb: int = 4096
+    process_memory_mb: int = 256
+    memory_per_commit_kb: int = 1024
+    max_tasks_per_process: Optional[int] = 8
+
+
+class OutputSettings(BaseModel):
+    bulk_copy: bool = True
+    flush_rows: int = 10000
+    flush_memory_mb: int = 64
+
+
+class StatsCacheType(str, Enum):
+    disabled = "disabled"
+    kvstore = "kvstore"
+    in_memory = "in_memory"
 
 
 class CacheSettings(BaseModel):
@@ -155,6 +190,9 @@ class CacheSettings(BaseModel):
     scheduled_its_projects_cache_refresh_enabled: bool = False
     scheduled_its_projects_cache_refresh_hour_of_day: str = "*/3"
     scheduled_its_projects_cache_refresh_is_force_refresh: bool = True
+    stats_cache_type: StatsCacheType = StatsCacheType.disabled
+    stats_cache_max_entries: int = 2048  # in_memory only
+    stats_cache_expire_hours: int = 24  # kvstore only, the entries are invalidated by the data version anyway
 
 
 class RefreshSettings(BaseModel):
@@ -220,6 +258,9 @@ class GitentialSettings(BaseModel):
     notifications: NotificationSettings = NotificationSettings()
     web: WebSettings = WebSettings()
     extraction: ExtractionSettings = ExtractionSettings()
+    output: OutputSettings = OutputSettings()
+    stats: StatsSettings = StatsSettings()
+    recalculation: RecalculationSettings = RecalculationSettings()
     cache: CacheSettings = CacheSettings()
     refresh: RefreshSettings = RefreshSettings()
     cleanup: CleanupSettings = CleanupSettings()
@@ -1,12 +1,15 @@
 import inspect
 import functools
-from typing import Iterable, Callable
+import shutil
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 import abc
 from tqdm import tqdm
 from structlog import get_logger
 from billiard import Pool  # pylint: disable=no-name-in-module
 from gitential2.settings import GitentialSettings, Executor as ExecutorSettings
 from gitential2.extraction.output import DataCollector
+from gitential2.extraction.transport import create_spill_directory, load_batch, run_batch, chunks
 
 from .logging import log_memory_usage
 
@@ -18,6 +21,9 @@ class Executor(abc.ABC):
     def __init__(self, **kwargs):
         self._show_progress = kwargs.pop("show_progress", True)
         self._description = kwargs.pop("description", None)
+        # Called once in every worker before processing the items, to set up per worker state
+        self._initializer = kwargs.pop("initializer", None)
+        self._initargs = kwargs.pop("initargs", ())
         self._context = kwargs
 
     def map(self, fn: Callable, items: Iterable):
@@ -48,6 +54,8 @@ def construct_partial(fn: Callable, context: dict):
 
 class SingleThreadExecutor(Executor):
     def _process(self, fn_partial: Callable, items: Iterable, progress_bar):
+        if self._initializer is not None:
+            self._initializer(*self._initargs)
         for item in items:
             progress_bar.update(1)
             fn_partial(item)
@@ -56,12 +64,23 @@ class SingleThreadExecutor(Executor):
 class ProcessPoolExecutor(Executor):
     def __init__(self, **kwargs):
         self.pool_size = kwargs.pop("pool_size", 8)
+        # With batch_size > 1 the workers process the items in batches, and give back the outputs
+        # as columnar batches through shared memory files instead of pickled DataCollectors
+        self.batch_size = kwargs.pop("batch_size", 1)
+        # The workers wait with the next batch while this many are spilled and not yet loaded by the parent
+        self.max_batches_in_flight = kwargs.pop("max_batches_in_flight", 2 * self.pool_size)
         self.original_output = kwargs.pop("output", DataCollector())
         kwargs["output"] = DataCollector()
         super().__init__(**kwargs)
 
     def _process(self, fn_partial: Callable, items: Iterable, progress_bar):
-        pool = Pool(self.pool_size)  # pylint: disable=not-callable
+        if self.batch_size > 1:
+            self._process_batches(fn_partial, items, progress_bar)
+            return
+
+        pool = Pool(  # pylint: disable=not-callable
+            self.pool_size, initializer=self._initializer, initargs=self._initargs
+        )
         counter = 0
         for output in pool.imap_unordered(fn_partial, items):
             # We use pop() to avoid memory leak using double generators + pydantic
@@ -83,13 +102,126 @@ class ProcessPoolExecutor(Executor):
         logger.info("Process pool imap_unordered finished", counter=counter)
         log_memory_usage("Process pool imap_unordered finished")
 
+    def _process_batches(self, fn_partial: Callable, items: Iterable, progress_bar):
+        spill_directory = create_spill_directory()
+        pool = Pool(  # pylint: disable=not-callable
+            self.pool_size, initializer=self._initializer, initargs=self._initargs
+        )
+        counter = 0
+        try:
+            run = functools.partial(run_batch, fn_partial=fn_partial, spill_directory=spill_directory)
+            for descriptor in _imap_bounded(pool, run, chunks(items, self.batch_size), self.max_batches_in_flight):
+                for kind, values in load_batch(descriptor):
+                    self.original_output.write_many(kind, values)
+
+                progress_bar.update(descriptor.item_count)
+                if not self._show_progress and (counter + descriptor.item_count) // 1000 > counter // 1000:
+                    logger.info("Process pool counter", counter=counter + descriptor.item_count)
+                    log_memory_usage(f"Process pool counter at {counter + descriptor.item_count}")
+                counter += descriptor.item_count
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            shutil.rmtree(spill_directory, ignore_errors=True)
+        pool.close()
+        pool.join()
+        logger.info("Process pool batches finished", counter=counter)
+        log_memory_usage("Process pool batches finished")
+
+
+def _imap_bounded(pool, fn: Callable, items: Iterable, max_in_flight: int) -> Iterator:
+    """Like imap, but at most max_in_flight items are submitted and not yet consumed"""
+    in_flight: Deque = deque()
+    for item in items:
+        if len(in_flight) >= max_in_flight:
+            yield in_flight.popleft().get()
+        in_flight.append(pool.apply_async(fn, (item,)))
+    while in_flight:
+        yield in_flight.popleft().get()
+
 
 def create_executor(settings: GitentialSettings, **kwargs) -> Executor:
     kwargs.setdefault("show_progress", settings.extraction.show_progress)
     if settings.extraction.executor == ExecutorSettings.process_pool:
         kwargs.setdefault("pool_size", settings.extraction.process_pool_size)
+        kwargs.setdefault("batch_size", settings.extraction.process_pool_batch_size)
+        kwargs.setdefault("max_batches_in_flight", settings.extraction.process_pool_max_batches_in_flight)
         return ProcessPoolExecutor(**kwargs)
     elif settings.extraction.executor == ExecutorSettings.single_tread:
         return SingleThreadExecutor(**kwargs)
     else:
         raise ValueError("Invalid executor settings")
+
+
+def _first_fitting(pending: List[Tuple[Any, float]], budget_left: float) -> Optional[int]:
+    for i, (_, estimate) in enumerate(pending):
+        if estimate <= budget_left:
+            return i
+    return None
+
+
+def _start_fitting(
+    pool,
+    fn: Callable[[Any], Any],
+    pending: List[Tuple[Any, float]],
+    running: Dict[int, Tuple[Any, float]],
+    pool_size: int,
+    memory_budget_mb: float,
+):
+    """Moves the pending items fitting into the remaining budget to the pool, while it has free processes"""
+    while pending and len(running) < pool_size:
+        used = sum(estimate for _, estimate in running.values())
+        i = _first_fitting(pending, memory_budget_mb - used) if running else 0
+        if i is None:
+            break
+        (index, item), estimate = pending.pop(i)
+        running[index] = (pool.apply_async(fn, (item,)), estimate)
+        logger.debug("Started item", index=index, estimate_mb=estimate, used_mb=used + estimate)
+
+
+def run_with_memory_budget(
+    fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    estimate_memory_mb: Callable[[Any], float],
+    pool_size: int,
+    memory_budget_mb: float,
+    initializer: Optional[Callable] = None,
+    initargs: tuple = (),
+    max_tasks_per_child: Optional[int] = None,
+) -> List[Any]:
+    """Runs `fn` for the items on a process pool, while the estimated memory of the running items fits
+    into the budget. The items are started in their original order, except when a later one fits into the
+    remaining budget and the next one doesn't. An item larger than the whole budget runs alone.
+
+    The results are returned in the order of the items, the first failure is raised after the running
+    items are finished, and no new items are started after it.
+    """
+    pending: List[Tuple[Any, float]] = [((index, item), estimate_memory_mb(item)) for index, item in enumerate(items)]
+    results: Dict[int, Any] = {}
+    running: Dict[int, Tuple[Any, float]] = {}
+    error: Optional[BaseException] = None
+    pool = Pool(  # pylint: disable=not-callable
+        pool_size, initializer=initializer, initargs=initargs, maxtasksperchild=max_tasks_per_child
+    )
+    try:
+        while running or (pending and error is None):
+            if error is None:
+                _start_fitting(pool, fn, pending, running, pool_size, memory_budget_mb)
+            next(iter(running.values()))[0].wait(0.1)
+            for index, (async_result, _) in list(running.items()):
+                if async_result.ready():
+                    del running[index]
+                    try:
+                        results[index] = async_result.get()
+                    except Exception as e:  # pylint: disable=broad-except
+                        logger.exception("Item failed", index=index)
+                        error = error or e
+    except BaseException:
+        pool.terminate()
+        raise
+    pool.close()
+    pool.join()
+    if error is not None:
+        raise error
+    return [results[index] for index in sorted(results)]
@@ -1,5 +1,7 @@
 from typing import List
 
+BUGFIX_KEYWORDS = ("fix", "bug")
+
 
 def calculate_is_bugfix(labels: List[str], title: str) -> bool:
     """
@@ -10,6 +12,7 @@ def calculate_is_bugfix(labels: List[str], title: str) -> bool:
     """
 
     def __is_bugfix__(row: str) -> bool:
-        return "fix" in row.lower() or "bug" in row.lower()
+        lowered = row.lower()
+        return any(keyword in lowered for keyword in BUGFIX_KEYWORDS)
 
     return __is_bugfix__(title) or (len(list(filter(__is_bugfix__, labels))) > 0)
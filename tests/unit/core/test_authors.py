@@ -1,6 +1,27 @@
 import pytest
-from gitential2.datatypes.authors import AuthorAlias, AuthorInDB
-from gitential2.core.authors import alias_matching_author, authors_matching, tokenize_alias, aliases_matching
+from gitential2.core import GitentialContext
+from gitential2.datatypes.authors import AuthorAlias, AuthorInDB, AuthorUpdate
+from gitential2.datatypes.repositories import RepositoryInDB
+from gitential2.core.authors import (
+    alias_matching_author,
+    authors_matching,
+    tokenize_alias,
+    aliases_matching,
+    get_or_create_author_for_alias,
+    get_or_create_authors_for_aliases,
+    update_author,
+)
+from gitential2.core.alias_index import get_author_by_alias
+from gitential2.core.calculation_intervals import get_analyzed_interval_indexes, get_dirty_interval_indexes
+from gitential2.core import author_similarity
+from gitential2.core.author_similarity import (
+    get_authors_to_deduplicate,
+    get_similar_author_ids,
+    reset_similarity_index,
+)
+from gitential2.core.deduplication import deduplicate_changed_authors
+from gitential2.kvstore import InMemKeyValueStore
+from gitential2.license import dummy_license
 
 
 @pytest.mark.parametrize(
@@ -109,3 +130,160 @@ def test_alias_matching_author(alias, author, expected):
 )
 def test_authors_matching(first, second, expected):
     assert authors_matching(first, second) == expected
+
+
+class _AuthorRepository:
+    def __init__(self, authors):
+        self.authors = {author.id: author for author in authors}
+        self.bulk_calls = 0
+
+    def all(self, workspace_id):
+        return list(self.authors.values())
+
+    def get(self, workspace_id, id_):
+        return self.authors.get(id_)
+
+    def get_authors_by_author_ids(self, workspace_id, author_ids):
+        return [self.authors[author_id] for author_id in author_ids if author_id in self.authors]
+
+    def create(self, workspace_id, author_create):
+        author = AuthorInDB(id=max(self.authors, default=0) + 1, **author_create.dict())
+        self.authors[author.id] = author
+        return author
+
+    def update(self, workspace_id, id_, author_update):
+        self.authors[id_] = AuthorInDB(id=id_, **author_update.dict())
+        return self.authors[id_]
+
+    def create_and_update_many(self, workspace_id, authors_to_create, authors_to_update):
+        self.bulk_calls += 1
+        updated = [self.update(workspace_id, id_, author_update) for id_, author_update in authors_to_update.items()]
+        return [self.create(workspace_id, author_create) for author_create in authors_to_create], updated
+
+
+class _RepositoryRepository:
+    def all(self, workspace_id):  # pylint: disable=unused-argument
+        return [RepositoryInDB(id=1, clone_url="https://example.com/a.git", protocol="https", name="a")]
+
+
+def _authors_context(minimal_settings):
+    class _Backend:
+        def __init__(self):
+            self.authors = _AuthorRepository(
+                [
+                    AuthorInDB(id=1, active=True, name="John Doe", aliases=[AuthorAlias(name="John Doe")]),
+                    AuthorInDB(id=2, active=True, name="Jane Roe", aliases=[AuthorAlias(email="jane.roe@example.com")]),
+                ]
+            )
+            self.repositories = _RepositoryRepository()
+
+    return GitentialContext(
+        settings=minimal_settings,
+        integrations={},
+        backend=_Backend(),
+        fernet=None,
+        kvstore=InMemKeyValueStore(minimal_settings),
+        license_=dummy_license,
+    )
+
+
+def test_bulk_author_resolution_same_as_one_by_one(minimal_settings):
+    aliases = [
+        AuthorAlias(name="John Doe", email="john@example.com"),
+        AuthorAlias(name="John Doe"),
+        AuthorAlias(name="Jane Roe", email="jane.roe@example.com"),
+        AuthorAlias(name="Brand New", email="brand.new@example.com"),
+        AuthorAlias(name="Brand New", email="brand@example.com"),
+        AuthorAlias(name="Someone Else", email="else@example.com"),
+    ]
+
+    g_one_by_one = _authors_context(minimal_settings)
+    expected = {(a.name, a.email, a.login): get_or_create_author_for_alias(g_one_by_one, 1, a) for a in aliases}
+
+    g_bulk = _authors_context(minimal_settings)
+    result = get_or_create_authors_for_aliases(g_bulk, 1, aliases)
+
+    assert g_bulk.backend.authors.bulk_calls == 1
+    assert {key: author.id for key, author in result.items()} == {key: author.id for key, author in expected.items()}
+    assert g_bulk.backend.authors.all(1) == g_one_by_one.backend.authors.all(1)
+    assert {key: author.id for key, author in get_or_create_authors_for_aliases(g_bulk, 1, aliases).items()} == {
+        key: author.id for key, author in result.items()
+    }
+    assert g_bulk.backend.authors.bulk_calls == 1
+
+
+def test_new_aliases_are_added_to_the_similarity_index(minimal_settings):
+    g = _authors_context(minimal_settings)
+    assert get_similar_author_ids(g, 1, [AuthorAlias(name="Jon Doe")]) == {1}
+
+    author = get_or_create_author_for_alias(g, 1, AuthorAlias(name="Jon Doe", email="jane.roe@example.com"))
+    assert author.id == 1
+    assert get_similar_author_ids(g, 1, [AuthorAlias(email="jane.roe@example.com")]) == {1, 2}
+    assert get_authors_to_deduplicate(g, 1) == {1}
+
+    new_author = get_or_create_author_for_alias(g, 1, AuthorAlias(name="Brand New"))
+    assert get_similar_author_ids(g, 1, [AuthorAlias(name="Brand Newer")]) == {new_author.id}
+    assert get_authors_to_deduplicate(g, 1) == {1}
+
+    assert [[a.id for a in cluster] for cluster in deduplicate_changed_authors(g, 1, dry_run=True)] == [[1, 2]]
+
+
+def test_common_ngrams_are_looked_up_in_their_full_posting_lists(minimal_settings, monkeypatch):
+    g = _authors_context(minimal_settings)
+    g.backend.authors = _AuthorRepository(
+        [
+            AuthorInDB(id=i, active=True, name=name, aliases=[AuthorAlias(name=name)])
+            for i, name in enumerate(["Anna Karenina", "Anna Kovacs", "Anna Kim"], start=1)
+        ]
+    )
+    monkeypatch.setattr(author_similarity, "MAX_AUTHORS_PER_NGRAM", 2)
+    # "ann" is shared by every author, its posting list is stored apart
+    assert get_similar_author_ids(g, 1, [AuthorAlias(name="Anna Kovacs")]) == {1, 2, 3}
+    assert get_or_create_author_for_alias(g, 1, AuthorAlias(name="Anna Karenin")).id == 1
+
+    new_author = get_or_create_author_for_alias(g, 1, AuthorAlias(name="Annabel Lee"))
+    assert new_author.id == 4
+    assert get_similar_author_ids(g, 1, [AuthorAlias(name="Annabel Leigh")]) >= {4}
+
+    # An index without the full posting lists is rebuilt
+    g.kvstore.delete_value("ws-1:author-similarity-v1-common")
+    assert get_similar_author_ids(g, 1, [AuthorAlias(name="Anna Kovacs")]) == {1, 2, 3, 4}
+
+
+def test_alias_index_is_updated_incrementally(minimal_settings):
+    g = _authors_context(minimal_settings)
+    new_author = get_or_create_author_for_alias(g, 1, AuthorAlias(name="Brand New"))
+
+    def _no_full_reads(workspace_id):
+        raise AssertionError("The authors are read from the indexes")
+
+    g.backend.authors.all = _no_full_reads
+    assert get_or_create_author_for_alias(g, 1, AuthorAlias(name="Brand New")).id == new_author.id
+    assert get_or_create_author_for_alias(g, 1, AuthorAlias(name="Jon Doe")).id == 1
+    assert get_author_by_alias(g, 1, AuthorAlias(name="Jon Doe")).id == 1
+
+    update_author(
+        g, 1, new_author.id, AuthorUpdate(active=True, name="Someone", aliases=[AuthorAlias(name="Someone Else")])
+    )
+    assert get_author_by_alias(g, 1, AuthorAlias(name="Brand New")) is None
+    assert get_author_by_alias(g, 1, AuthorAlias(name="Someone Else")).name == "Someone"
+
+
+def test_expired_alias_index_is_rebuilt(minimal_settings):
+    g = _authors_context(minimal_settings)
+    assert get_author_by_alias(g, 1, AuthorAlias(name="John Doe")).id == 1
+
+    # Written directly, then the index expires
+    g.backend.authors.update(1, 1, AuthorUpdate(active=True, name="Johnny", aliases=[AuthorAlias(name="Johnny")]))
+    g.kvstore.delete_value("ws-1:author-aliases-built")
+    assert get_author_by_alias(g, 1, AuthorAlias(name="John Doe")) is None
+    assert get_author_by_alias(g, 1, AuthorAlias(name="Johnny")).name == "Johnny"
+
+
+def test_author_edits_mark_the_calculated_intervals_dirty(minimal_settings):
+    g = _authors_context(minimal_settings)
+    get_or_create_author_for_alias(g, 1, AuthorAlias(name="Brand New"))
+    assert get_dirty_interval_indexes(g, 1, 1) == set()
+
+    update_author(g, 1, 2, AuthorUpdate(active=True, name="Jane Roe", aliases=[AuthorAlias(name="John Doe")]))
+    assert get_dirty_interval_indexes(g, 1, 1) == set(get_analyzed_interval_indexes(g.current_time()))
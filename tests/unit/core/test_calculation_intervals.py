@@ -0,0 +1,128 @@
+import datetime as dt
+
+import pytest
+
+from gitential2.core import GitentialContext, calculations
+from gitential2.core.calculation_intervals import (
+    DirtyIntervalRecorder,
+    get_analyzed_interval_indexes,
+    get_dirty_interval_indexes,
+    get_interval_bounds,
+    get_interval_index,
+)
+from gitential2.datatypes.extraction import ExtractedKind
+from gitential2.extraction.output import DataCollector, OutputHandler
+from gitential2.kvstore import InMemKeyValueStore
+from gitential2.license import dummy_license
+
+
+class _Commit:
+    def __init__(self, repo_id, atime):
+        self.repo_id = repo_id
+        self.atime = atime
+
+
+class _FlushingOutput(OutputHandler):
+    """Writes out every second value on its own like the bulk SQL handler, the second flush fails"""
+
+    def __init__(self):
+        self.buffer = []
+        self.written = []
+
+    def write(self, kind, value):
+        self.buffer.append(value)
+        if len(self.buffer) == 2:
+            self.flush()
+
+    def flush(self):
+        if self.written:
+            raise RuntimeError("flush failed")
+        self.written, self.buffer = self.buffer, []
+
+
+def _context(settings, backend):
+    return GitentialContext(
+        settings=settings,
+        integrations={},
+        backend=backend,
+        fernet=None,
+        kvstore=InMemKeyValueStore(settings),
+        license_=dummy_license,
+    )
+
+
+def test_intervals_are_aligned():
+    atime = dt.datetime(2021, 6, 1, 12, 30)
+    from_, to_ = get_interval_bounds(get_interval_index(atime))
+    assert from_ <= atime < to_
+    assert to_ - from_ == dt.timedelta(days=100)
+    assert get_interval_index(atime.replace(tzinfo=dt.timezone(dt.timedelta(hours=2)))) == get_interval_index(
+        atime - dt.timedelta(hours=2)
+    )
+
+    indexes = get_analyzed_interval_indexes(atime)
+    assert indexes[0] == get_interval_index(atime)
+    assert get_interval_bounds(indexes[-1])[0] <= atime - dt.timedelta(days=3200)
+    assert indexes == list(range(indexes[0], indexes[-1] - 1, -1))
+
+
+def test_only_dirty_intervals_are_recalculated(minimal_settings, inmem_backend, monkeypatch):
+    g = _context(minimal_settings, inmem_backend)
+    recalculated = []
+    monkeypatch.setattr(
+        calculations,
+        "plan_interval_recalculations",
+        lambda g, workspace_id, repository_id, from_, to_: [
+            calculations.IntervalRecalculation(workspace_id, repository_id, from_, to_, 1)
+        ],
+    )
+    monkeypatch.setattr(
+        calculations,
+        "_recalculate_interval",
+        lambda g, recalculation: recalculated.append((recalculation.repository_id, recalculation.from_)),
+    )
+
+    yesterday = dt.datetime.utcnow() - dt.timedelta(days=1)
+    old = dt.datetime.utcnow() - dt.timedelta(days=5000)
+    collector = DataCollector()
+    output = DirtyIntervalRecorder(g, 1, collector)
+    output.write(ExtractedKind.EXTRACTED_COMMIT, _Commit(1, yesterday))
+    output.write(ExtractedKind.EXTRACTED_COMMIT, _Commit(1, old))
+    output.write(ExtractedKind.EXTRACTED_COMMIT, _Commit(2, yesterday))
+    output.write(ExtractedKind.EXTRACTED_COMMIT_BRANCH, _Commit(3, yesterday))
+    output.flush()
+    assert len(list(collector)) == 4
+    assert get_dirty_interval_indexes(g, 1, 1) == {get_interval_index(yesterday), get_interval_index(old)}
+    assert not get_dirty_interval_indexes(g, 1, 3)
+
+    calculations.recalculate_repository_values(g, 1, 1, full_rebuild=False)
+    assert recalculated == [(1, get_interval_bounds(get_interval_index(yesterday))[0])]
+    assert not get_dirty_interval_indexes(g, 1, 1)
+    assert get_dirty_interval_indexes(g, 1, 2) == {get_interval_index(yesterday)}
+
+    recalculated.clear()
+    calculations.recalculate_repository_values(g, 1, 1, full_rebuild=False)
+    assert not recalculated
+
+    calculations.recalculate_repository_values(g, 1, 2, full_rebuild=True)
+    assert len(recalculated) == len(get_analyzed_interval_indexes(dt.datetime.utcnow()))
+    assert not get_dirty_interval_indexes(g, 1, 2)
+
+
+def test_intervals_of_values_written_before_a_failed_flush_are_recorded(minimal_settings, inmem_backend):
+    g = _context(minimal_settings, inmem_backend)
+    first = dt.datetime.utcnow() - dt.timedelta(days=1)
+    second = dt.datetime.utcnow() - dt.timedelta(days=300)
+    third = dt.datetime.utcnow() - dt.timedelta(days=600)
+    inner = _FlushingOutput()
+
+    with pytest.raises(RuntimeError):
+        with DirtyIntervalRecorder(g, 1, inner) as output:
+            output.write(ExtractedKind.EXTRACTED_COMMIT, _Commit(1, first))
+            output.write(ExtractedKind.EXTRACTED_COMMIT, _Commit(1, second))
+            output.write(ExtractedKind.EXTRACTED_COMMIT, _Commit(1, third))
+            output.write(ExtractedKind.EXTRACTED_COMMIT, _Commit(1, third))
+
+    # The automatic flush of the first batch went through before the failure
+    assert len(inner.written) == 2
+    assert {get_interval_index(first), get_interval_index(second)} <= get_dirty_interval_indexes(g, 1, 1)
@@ -0,0 +1,310 @@
+import datetime as dt
+import random
+from typing import cast
+
+import pandas as pd
+import pytest
+
+from gitential2.core import calculations
+from gitential2.datatypes.extraction import Langtype
+from gitential2.utils.is_bugfix import calculate_is_bugfix
+
+EMAIL_AUTHOR_MAP = {"alice@example.com": 1, "bob@example.com": 2, "carol@example.com": 3}
+
+# The row by row implementations the vectorized calculations have to be identical to
+
+
+def _legacy_prepare_extracted_commits_df(extracted_commits_df, parents_df):
+    email_author_map = EMAIL_AUTHOR_MAP
+    extracted_commits_df["aid"] = extracted_commits_df.apply(lambda row: email_author_map.get(row["aemail"]), axis=1)
+    extracted_commits_df["cid"] = extracted_commits_df.apply(lambda row: email_author_map.get(row["cemail"]), axis=1)
+    extracted_commits_df["date"] = extracted_commits_df["atime"]
+    extracted_commits_df["is_merge"] = extracted_commits_df["nparents"] > 1
+    extracted_commits_df["is_bugfix"] = extracted_commits_df.apply(
+        lambda x: calculate_is_bugfix(labels=[], title=x["message"]), axis=1
+    )
+    age_df = _legacy_calculate_age_df(extracted_commits_df, parents_df)
+    ret = extracted_commits_df.set_index(["commit_id"]).join(age_df)
+    hourse_measured_df = calculations._measure_hours(ret)
+    return ret.join(hourse_measured_df)
+
+
+def _legacy_prepare_extracted_patches_df(extracted_patches_df):
+    def _calc_is_test(row):
+        return row["langtype"] == "PROGRAMMING" and "test" in row["newpath"]
+
+    def _fix_lang_type(row):
+        return row["langtype"].name
+
+    def _zero_if_unknown(field_name):
+        def _inner(row):
+            return row[field_name] if row["langtype"] != "UNKNOWN" else 0
+
+        return _inner
+
+    extracted_patches_df["outlier"] = 0
+    extracted_patches_df["anomaly"] = 0
+    extracted_patches_df["langtype"] = extracted_patches_df.apply(_fix_lang_type, axis=1)
+    extracted_patches_df["is_test"] = extracted_patches_df.apply(_calc_is_test, axis=1)
+    extracted_patches_df["comp_i"] = extracted_patches_df.apply(_zero_if_unknown("comp_i"), axis=1)
+    extracted_patches_df["comp_d"] = extracted_patches_df.apply(_zero_if_unknown("comp_d"), axis=1)
+    extracted_patches_df["loc_i"] = extracted_patches_df.apply(_zero_if_unknown("loc_i"), axis=1)
+    extracted_patches_df["loc_d"] = extracted_patches_df.apply(_zero_if_unknown("loc_d"), axis=1)
+
+    return extracted_patches_df.set_index(["commit_id"])
+
+
+def _legacy_calculate_age_df(extracted_commit_df, parents_df):
+    author_times = cast(dict, extracted_commit_df.set_index(["commit_id"])[["atime"]].to_dict(orient="dict"))["atime"]
+
+    def _calc_age(row):
+        if row["commit_id"] in author_times and row["parent_commit_id"] in author_times:
+            delta = (author_times[row["commit_id"]] - author_times[row["parent_commit_id"]]).total_seconds()
+            return delta
+        else:
+            return -1
+
+    parents_df["age"] = parents_df.apply(_calc_age, axis=1)
+    return parents_df.groupby("commit_id").min()["age"].to_frame()
+
+
+def _legacy_prepare_commits_patches_df(prepared_commits_df, prepared_patches_df, uploc_df):
+    df = (
+        prepared_commits_df.drop(labels=["message"], axis=1)
+        .join(prepared_patches_df, lsuffix="__commit", rsuffix="__patch")
+        .reset_index()
+        .set_index(["commit_id", "parent_commit_id", "newpath"])
+    )
+    if not uploc_df.empty:
+        df_with_uploc = df.join(uploc_df, on=["commit_id", "newpath"])
+    else:
+        df_with_uploc = df
+        df_with_uploc["uploc"] = 0
+
+    def _finalize_uploc(row):
+        if row["is_merge"]:
+            return 0
+        else:
+            return min(row["uploc"], row["loc_i"])
+
+    df_with_uploc["uploc"] = df_with_uploc.apply(_finalize_uploc, axis=1)
+    return df_with_uploc
+
+
+def _legacy_calculate_commit_level(prepared_commits_df, commits_patches_df, outlier_df, pull_request_commits_df):
+    calculated_commits = calculations._calculate_commit_level(
+        prepared_commits_df, commits_patches_df, outlier_df, pull_request_commits_df
+    )
+    calculated_commits["is_pr_exists"] = calculated_commits.apply(
+        lambda x: len(pull_request_commits_df[pull_request_commits_df["commit_id"] == x.name]) > 0, axis=1
+    )
+    calculated_commits["is_pr_open"] = calculated_commits.apply(
+        lambda x: x["is_pr_exists"]
+        and len(
+            pull_request_commits_df[
+                (pull_request_commits_df["commit_id"] == x.name) & (pull_request_commits_df["state"] == "open")
+            ]
+        )
+        > 0,
+        axis=1,
+    )
+    calculated_commits["is_pr_closed"] = calculated_commits.apply(
+        lambda x: x["is_pr_exists"]
+        and len(pull_request_commits_df[pull_request_commits_df["commit_id"] == x.name])
+        == len(
+            pull_request_commits_df[
+                (pull_request_commits_df["commit_id"] == x.name) & (pull_request_commits_df["state"] == "closed")
+            ]
+        )
+        > 0,
+        axis=1,
+    )
+    return calculated_commits
+
+
+def _legacy_calculate_patch_level(commits_patches_df):
+    calculated_patches_df = calculations._calculate_patch_level(commits_patches_df).reset_index()
+    # pylint: disable=singleton-comparison,compare-to-zero
+    collaboration_df = calculated_patches_df[calculated_patches_df["is_merge"] == False][
+        ["repo_id", "newpath", "date", "aid"]
+    ]
+
+    def _is_collaboration(x) -> bool:
+        sub_df = collaboration_df[
+            (collaboration_df["repo_id"] == x["repo_id"]) & (collaboration_df["newpath"] == x["newpath"])
+        ].sort_values(["date"])
+        from_date = x["date"] - pd.Timedelta("21 days")
+        to_date = x["date"] + pd.Timedelta("21 days")
+        for _, row in sub_df.iterrows():
+            if row["date"] < from_date:
+                continue
+            elif row["date"] > to_date:
+                break
+            elif row["aid"] != x["aid"]:
+                return True
+        return False
+
+    calculated_patches_df["is_collaboration"] = calculated_patches_df.apply(_is_collaboration, axis=1)
+    return calculated_patches_df.set_index(["repo_id", "commit_id", "parent_commit_id", "newpath"])
+
+
+LEGACY_STAGES = {
+    "prepare_extracted_commits_df": _legacy_prepare_extracted_commits_df,
+    "prepare_extracted_patches_df": _legacy_prepare_extracted_patches_df,
+    "prepare_commits_patches_df": _legacy_prepare_commits_patches_df,
+    "calculate_commit_level": _legacy_calculate_commit_level,
+    "calculate_patch_level": _legacy_calculate_patch_level,
+}
+
+CURRENT_STAGES = {
+    "prepare_extracted_commits_df": lambda commits_df, parents_df: calculations._prepare_extracted_commits_df(
+        None, 1, commits_df, parents_df
+    ),
+    "prepare_extracted_patches_df": calculations._prepare_extracted_patches_df,
+    "prepare_commits_patches_df": calculations._prepare_commits_patches_df,
+    "calculate_commit_level": calculations._calculate_commit_level,
+    "calculate_patch_level": calculations._calculate_patch_level,
+}
+
+
+def _calculate(
+    stages, extracted_commits_df, extracted_patches_df, extracted_patch_rewrites_df, pull_request_commits_df
+):
+    # Same steps as recalculate_repo_values_in_interval, on copies of the inputs
+    extracted_commits_df = extracted_commits_df.copy()
+    extracted_patches_df = extracted_patches_df.copy()
+    parents_df = extracted_patches_df.reset_index()[["commit_id", "parent_commit_id"]].drop_duplicates()
+    prepared_commits_df = stages["prepare_extracted_commits_df"](extracted_commits_df, parents_df)
+    prepared_patches_df = stages["prepare_extracted_patches_df"](extracted_patches_df)
+    uploc_df = calculations._calculate_uploc_df(extracted_commits_df, extracted_patch_rewrites_df.copy())
+    commits_patches_df = stages["prepare_commits_patches_df"](prepared_commits_df, prepared_patches_df, uploc_df)
+    outlier_df = calculations._calc_outlier_detection_df(prepared_patches_df)
+    calculated_commits_df = stages["calculate_commit_level"](
+        prepared_commits_df, commits_patches_df, outlier_df, pull_request_commits_df.copy()
+    )
+    calculated_patches_df = stages["calculate_patch_level"](commits_patches_df)
+    return calculated_commits_df, calculated_patches_df
+
+
+def _generate_extracted_dataframes(seed: int, commit_count: int):
+    rnd = random.Random(seed)
+    start = dt.datetime(2021, 1, 1, tzinfo=dt.timezone.utc)
+    emails = list(EMAIL_AUTHOR_MAP.keys()) + ["unknown@example.com"]
+    messages = ["Fix the parser", "add feature", "BUGFIX: typo", "refactor", "Prefix handling", "debug logging"]
+    paths = ["src/main.py", "src/parser.py", "tests/test_parser.py", "README.md", "data/fixture.json", "Makefile"]
+    langtypes = {
+        "src/main.py": Langtype.PROGRAMMING,
+        "src/parser.py": Langtype.PROGRAMMING,
+        "tests/test_parser.py": Langtype.PROGRAMMING,
+        "README.md": Langtype.PROSE,
+        "data/fixture.json": Langtype.DATA,
+        "Makefile": Langtype.UNKNOWN,
+    }
+
+    commits, patches, rewrites = [], [], []
+    commit_ids = [f"{i:040x}" for i in range(commit_count)]
+    atimes = {}
+    for i, commit_id in enumerate(commit_ids):
+        atime = start + dt.timedelta(minutes=rnd.randint(0, 60 * 24 * 365))
+        atimes[commit_id] = atime
+        # the first commits' parents are out of the interval
+        parent_ids = (
+            [f"{commit_count + i:040x}"] if i < 3 else rnd.sample(commit_ids[:i], min(i, rnd.choice([1, 1, 2])))
+        )
+        commits.append(
+            {
+                "repo_id": 1,
+                "commit_id": commit_id,
+                "atime": atime,
+                "aemail": rnd.choice(emails),
+                "aname": "Author",
+                "ctime": atime,
+                "cemail": rnd.choice(emails),
+                "cname": "Committer",
+                "message": rnd.choice(messages),
+                "nparents": len(parent_ids),
+                "tree_id": "0" * 40,
+            }
+        )
+        for parent_id in parent_ids:
+            for path in rnd.sample(paths, rnd.randint(1, 3)):
+                patches.append(
+                    {
+                        "repo_id": 1,
+                        "commit_id": commit_id,
+                        "parent_commit_id": parent_id,
+                        "status": "M",
+                        "newpath": path,
+                        "oldpath": path,
+                        "newsize": rnd.randint(0, 5000),
+                        "oldsize": rnd.randint(0, 5000),
+                        "is_binary": False,
+                        "lang": "Python",
+                        "langtype": langtypes[path],
+                        "loc_i": rnd.randint(0, 40),
+                        "loc_d": rnd.randint(0, 40),
+                        "comp_i": rnd.randint(0, 20),
+                        "comp_d": rnd.randint(0, 20),
+                        "nhunks": rnd.randint(1, 5),
+                        "nrewrites": 0,
+                        "rewrites_loc": 0,
+                    }
+                )
+        if i > 0 and rnd.random() < 0.5:
+            rewritten_commit_id = rnd.choice(commit_ids[:i])
+            rewrites.append(
+                {
+                    "repo_id": 1,
+                    "commit_id": commit_id,
+                    "atime": atime,
+                    "aemail": commits[-1]["aemail"],
+                    "newpath": rnd.choice(paths),
+                    "rewritten_commit_id": rewritten_commit_id,
+                    "rewritten_atime": atimes[rewritten_commit_id],
+                    "rewritten_aemail": rnd.choice(emails),
+                    "loc_d": rnd.randint(0, 60),
+                }
+            )
+
+    pull_request_commits = []
+    for pr_number, state in enumerate(["open", "closed", "merged", "closed", "open"], start=1):
+        for commit_id in rnd.sample(commit_ids, 8):
+            pull_request_commits.append({"repo_id": 1, "pr_number": pr_number, "commit_id": commit_id, "state": state})
+
+    return (
+        pd.DataFrame(commits),
+        pd.DataFrame(patches),
+        pd.DataFrame(rewrites),
+        pd.DataFrame(pull_request_commits),
+    )
+
+
+@pytest.fixture
+def fixed_authors(monkeypatch):
+    monkeypatch.setattr(
+        calculations, "_get_or_create_authors_from_commits", lambda g, workspace_id, df: dict(EMAIL_AUTHOR_MAP)
+    )
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_calculations_same_as_row_by_row_implementation(fixed_authors, seed):
+    extracted = _generate_extracted_dataframes(seed, commit_count=120)
+
+    expected_commits_df, expected_patches_df = _calculate(LEGACY_STAGES, *extracted)
+    calculated_commits_df, calculated_patches_df = _calculate(CURRENT_STAGES, *extracted)
+
+    pd.testing.assert_frame_equal(calculated_commits_df, expected_commits_df)
+    pd.testing.assert_frame_equal(calculated_patches_df, expected_patches_df)
+
+
+def test_calculations_without_patch_rewrites(fixed_authors):
+    extracted_commits_df, extracted_patches_df, _, pull_request_commits_df = _generate_extracted_dataframes(
+        4, commit_count=30
+    )
+    extracted = (extracted_commits_df, extracted_patches_df, pd.DataFrame(), pull_request_commits_df.iloc[0:0])
+
+    expected_commits_df, expected_patches_df = _calculate(LEGACY_STAGES, *extracted)
+    calculated_commits_df, calculated_patches_df = _calculate(CURRENT_STAGES, *extracted)
+
+    pd.testing.assert_frame_equal(calculated_commits_df, expected_commits_df)
+    pd.testing.assert_frame_equal(calculated_patches_df, expected_patches_df)
@@ -0,0 +1,83 @@
+import random
+from itertools import combinations
+
+from gitential2.core.authors import aliases_matching, authors_matching
+from gitential2.core.author_similarity import alias_signatures, find_similar_tokens
+from gitential2.core.deduplication import UnionFind, _create_author_clusters
+from gitential2.datatypes.authors import AuthorAlias, AuthorInDB
+from gitential2.utils import levenshtein_ratio
+
+
+def _mutate(rnd, value):
+    chars = list(value)
+    for _ in range(rnd.randint(0, 3)):
+        position = rnd.randrange(len(chars))
+        operation = rnd.choice(["insert", "delete", "replace"])
+        if operation == "insert":
+            chars.insert(position, rnd.choice("abcdeilnorst"))
+        elif operation == "delete" and len(chars) > 1:
+            del chars[position]
+        else:
+            chars[position] = rnd.choice("abcdeilnorst")
+    return "".join(chars)
+
+
+def _generate_authors(rnd, count):
+    first_names = ["anna", "bela", "laszlo", "kristof", "eszter", "alexander", "roberta", "jon"]
+    last_names = ["andrasi", "kovacs", "nagy", "toth", "szabo", "horvath", "panchenko", "smith"]
+    authors = []
+    for author_id in range(1, count + 1):
+        aliases = []
+        for _ in range(rnd.randint(1, 2)):
+            first_name, last_name = _mutate(rnd, rnd.choice(first_names)), _mutate(rnd, rnd.choice(last_names))
+            aliases.append(
+                AuthorAlias(
+                    name=rnd.choice([f"{first_name} {last_name}", first_name, None]),
+                    email=rnd.choice([f"{last_name}.{first_name}@example.com", f"{first_name}@example.com", None]),
+                    login=rnd.choice([f"{first_name}{last_name}", None]),
+                )
+            )
+        authors.append(AuthorInDB(id=author_id, active=True, aliases=aliases))
+    return authors
+
+
+def _brute_force_clusters(all_authors):
+    union_find = UnionFind(len(all_authors))
+    for i, j in combinations(range(len(all_authors)), 2):
+        if authors_matching(all_authors[i], all_authors[j]):
+            union_find.union(i, j)
+    clusters = {}
+    for i, author in enumerate(all_authors):
+        clusters.setdefault(union_find.find(i), []).append(author.id)
+    return sorted(cluster for cluster in clusters.values() if len(cluster) > 1)
+
+
+def test_find_similar_tokens_same_as_brute_force():
+    rnd = random.Random(42)
+    base_tokens = ["andrasi laszlo", "loverboy1984", "kovacs", "aaaaaaab", "panchenko", "jon", "abcdefghijklmnopqrst"]
+    tokens = sorted({_mutate(rnd, rnd.choice(base_tokens)) for _ in range(300)})
+    expected = {
+        frozenset(pair)
+        for pair in combinations(tokens, 2)
+        if len(pair[0]) >= 3 and len(pair[1]) >= 3 and levenshtein_ratio(*pair) > 0.8
+    }
+    found = [frozenset(pair) for pair in find_similar_tokens(tokens)]
+    assert len(found) == len(set(found))
+    assert set(found) == expected
+
+
+def test_author_clusters_same_as_brute_force():
+    rnd = random.Random(7)
+    all_authors = _generate_authors(rnd, 150)
+    clusters = _create_author_clusters(all_authors)
+    assert sorted([author.id for author in cluster] for cluster in clusters) == _brute_force_clusters(all_authors)
+    for cluster in clusters:
+        assert [author.id for author in cluster] == sorted(author.id for author in cluster)
+
+
+def test_matching_aliases_share_a_signature():
+    rnd = random.Random(3)
+    aliases = [alias for author in _generate_authors(rnd, 80) for alias in author.aliases]
+    for first, second in combinations(aliases, 2):
+        if aliases_matching(first, second):
+            assert alias_signatures(first) & alias_signatures(second)
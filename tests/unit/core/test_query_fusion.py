@@ -0,0 +1,119 @@
+import sqlite3
+
+import ibis
+import pandas as pd
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.pool import QueuePool
+
+from gitential2.backends.sql.ibis_pool import IbisConnectionPool
+from gitential2.core.stats_v2 import FusedIbisQuery, IbisQuery, plan_query_fusion
+from gitential2.datatypes.stats import DimensionName, FilterName, IbisTables, MetricName, Query, QueryType
+
+
+class IbisTablesBackend:
+    def __init__(self, ibis_tables):
+        self.ibis_tables = ibis_tables
+        self.executed = 0
+
+    def get_ibis_tables(self, workspace_id):
+        backend = self
+
+        class _CountingConnection:
+            def execute(self, expr):
+                backend.executed += 1
+                return backend.ibis_tables.conn.execute(expr)
+
+        ret = IbisTables()
+        ret.conn = _CountingConnection()
+        ret.commits = self.ibis_tables.commits
+        ret.patches = self.ibis_tables.patches
+        return ret
+
+
+class Context:
+    def __init__(self, backend):
+        self.backend = backend
+
+
+@pytest.fixture
+def ibis_context(tmp_path):
+    path = str(tmp_path / "stats.db")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE calculated_commits (repo_id INTEGER, commit_id TEXT, aid INTEGER, date TIMESTAMP,"
+        " is_merge BOOLEAN, hours REAL, loc_i_c INTEGER, uploc_c INTEGER, loc_effort_c REAL, comp_i_c INTEGER,"
+        " comp_d_c INTEGER, velocity REAL)"
+    )
+    db.execute("CREATE TABLE calculated_patches (repo_id INTEGER, commit_id TEXT, newpath TEXT, loc_i INTEGER)")
+    db.executemany(
+        "INSERT INTO calculated_commits VALUES (?, ?, ?, '2021-01-01 00:00:00', 0, ?, ?, ?, ?, 0, 0, 1.0)",
+        [(1 + i % 2, f"c{i}", 1 + i % 3, 0.5 * i, 10 * i, i, 1.2 * i) for i in range(10)],
+    )
+    db.commit()
+    db.close()
+
+    conn = ibis.sqlite.connect(path)
+    ibis_tables = IbisTables()
+    ibis_tables.conn = conn
+    ibis_tables.commits = conn.table("calculated_commits")
+    ibis_tables.patches = conn.table("calculated_patches")
+    return Context(IbisTablesBackend(ibis_tables))
+
+
+def _query(metrics, repo_ids=None, dimensions=None, type_=QueryType.aggregate):
+    return Query(
+        metrics=metrics,
+        dimensions=dimensions or [DimensionName.repo_id],
+        filters={FilterName.repo_ids: repo_ids or [1, 2]},
+        type=type_,
+    )
+
+
+def test_plan_query_fusion_groups_queries_differing_only_in_metrics():
+    queries = {
+        "commits": _query([MetricName.count_commits]),
+        "hours": _query([MetricName.sum_hours, MetricName.avg_hours], repo_ids=[2, 1]),
+        "other_filter": _query([MetricName.sum_hours], repo_ids=[1]),
+        "other_dimension": _query([MetricName.count_commits], dimensions=[DimensionName.aid]),
+        "prs": _query([MetricName.sum_pr_count]),
+        "select": _query([MetricName.count_commits], type_=QueryType.select),
+    }
+    groups = [sorted(group.keys()) for group in plan_query_fusion(queries)]
+    assert sorted(groups) == [["commits", "hours"], ["other_dimension"], ["other_filter"], ["prs"], ["select"]]
+
+
+def test_fused_query_results_same_as_separate_queries(ibis_context):
+    queries = {
+        "commits": _query([MetricName.count_commits, MetricName.sum_hours]),
+        "hours": _query([MetricName.sum_hours, MetricName.avg_hours, MetricName.loc_sum]),
+        "ploc": _query([MetricName.sum_ploc]),
+    }
+    (group,) = plan_query_fusion(queries)
+
+    fused_results = FusedIbisQuery(ibis_context, 1, group).execute_all()
+    assert ibis_context.backend.executed == 1
+
+    for name, query in queries.items():
+        expected = IbisQuery(ibis_context, 1, query).execute().values
+        assert list(fused_results[name].values.columns) == list(expected.columns)
+        pd.testing.assert_frame_equal(
+            fused_results[name].values.reset_index(drop=True), expected.reset_index(drop=True)
+        )
+
+
+def test_stats_query_results_same_through_the_connection_pool(ibis_context, tmp_path):
+    path = str(tmp_path / "stats.db")
+    ibis_tables = ibis_context.backend.ibis_tables
+    query = _query([MetricName.count_commits, MetricName.sum_hours, MetricName.loc_sum])
+    expected = IbisQuery(ibis_context, 1, query).execute().values
+
+    engine = sa.create_engine(f"sqlite:///{path}", poolclass=QueuePool, pool_size=1, max_overflow=0)
+    # the sqlite backend of ibis refers to the tables of the attached database
+    sa.event.listen(engine, "connect", lambda dbapi_conn, _: dbapi_conn.execute(f"ATTACH DATABASE '{path}' AS base"))
+    ibis_tables.conn = IbisConnectionPool(ibis_backend=ibis_tables.conn, engine=engine)
+    result = IbisQuery(ibis_context, 1, query).execute().values
+
+    assert len(result) == 2
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True))
+    assert ibis_tables.conn.metrics().checkouts == 1
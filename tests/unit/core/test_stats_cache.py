@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+
+from gitential2.core import GitentialContext, stats_v2
+from gitential2.core.stats_cache import bump_data_version, get_data_version, query_hash, stats_cache_key
+from gitential2.datatypes.stats import Query, FilterName, MetricName, QueryType
+from gitential2.kvstore import InMemKeyValueStore
+from gitential2.license import dummy_license
+from gitential2.result_cache import InMemResultCache, KeyValueStoreResultCache
+
+
+def _query(repo_ids, day=None):
+    filters = {FilterName.repo_ids: repo_ids}
+    if day:
+        filters[FilterName.day] = day
+    return Query(metrics=[MetricName.count_commits], filters=filters, type=QueryType.aggregate)
+
+
+def _context(settings, backend, result_cache, kvstore=None):
+    return GitentialContext(
+        settings=settings,
+        integrations={},
+        backend=backend,
+        fernet=None,
+        kvstore=kvstore or InMemKeyValueStore(settings),
+        license_=dummy_license,
+        result_cache=result_cache,
+    )
+
+
+def test_query_hash_is_canonical():
+    assert query_hash(_query([1, 2, 3])) == query_hash(_query([3, 1, 2]))
+    assert query_hash(_query([1, 2])) != query_hash(_query([1, 2, 3]))
+    assert query_hash(_query([1], day=["2021-01-01", "2021-02-01"])) != query_hash(
+        _query([1], day=["2021-02-01", "2021-01-01"])
+    )
+
+
+def test_data_version_changes_the_key(minimal_settings, inmem_backend):
+    g = _context(minimal_settings, inmem_backend, None)
+    version = get_data_version(g, 1)
+    assert version > 0
+    assert get_data_version(g, 1) == version
+    key = stats_cache_key(g, 1, _query([1]))
+
+    assert bump_data_version(g, 1) == version + 1
+    assert stats_cache_key(g, 1, _query([1])) != key
+    # other workspaces are not affected
+    assert bump_data_version(g, 2) != get_data_version(g, 1)
+
+
+def test_in_memory_cache_evicts_least_recently_used():
+    cache = InMemResultCache(max_entries=2)
+    cache.set("a", {"v": [1]})
+    cache.set("b", {"v": [2]})
+    assert cache.get("a") == {"v": [1]}
+    cache.set("c", {"v": [3]})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": [1]}
+
+    # cached values are not shared with the callers
+    cache.get("a")["v"].append(2)
+    assert cache.get("a") == {"v": [1]}
+
+
+@pytest.mark.parametrize("cache_type", ["in_memory", "kvstore"])
+def test_collect_stats_v2_cached_until_data_version_changes(minimal_settings, inmem_backend, monkeypatch, cache_type):
+    kvstore = InMemKeyValueStore(minimal_settings)
+    result_cache = InMemResultCache(max_entries=16) if cache_type == "in_memory" else KeyValueStoreResultCache(kvstore)
+    g = _context(minimal_settings, inmem_backend, result_cache, kvstore)
+    executed = []
+
+    def _execute_prepared_query(g, workspace_id, prepared_query):
+        executed.append(prepared_query)
+        return stats_v2.QueryResult(query=prepared_query, values=pd.DataFrame({"count_commits": [len(executed)]}))
+
+    monkeypatch.setattr(stats_v2, "prepare_query", lambda g, workspace_id, query: query)
+    monkeypatch.setattr(stats_v2, "_execute_prepared_query", _execute_prepared_query)
+
+    assert stats_v2.collect_stats_v2(g, 1, _query([1, 2])) == {"count_commits": [1]}
+    assert stats_v2.collect_stats_v2(g, 1, _query([2, 1])) == {"count_commits": [1]}
+    assert len(executed) == 1
+
+    bump_data_version(g, 1)
+    assert stats_v2.collect_stats_v2(g, 1, _query([1, 2])) == {"count_commits": [2]}
+    assert len(executed) == 2
@@ -0,0 +1,91 @@
+import threading
+import time
+
+from gitential2.core.stats_executor import MultiQueryExecutor
+from gitential2.exceptions import QueryTimeoutException
+
+
+def test_multi_query_executor_returns_partial_results():
+    executor = MultiQueryExecutor(pool_size=4)
+
+    def _fail():
+        raise ValueError("bad query")
+
+    try:
+        results = executor.run(
+            {"a": lambda: 1, "slow": lambda: time.sleep(1) or 2, "failing": _fail, "b": lambda: 3},
+            max_concurrency=4,
+            timeout=0.2,
+        )
+    finally:
+        executor.shutdown()
+
+    assert list(results.keys()) == ["a", "slow", "failing", "b"]
+    assert results["a"] == 1
+    assert results["b"] == 3
+    assert isinstance(results["slow"], QueryTimeoutException)
+    assert isinstance(results["failing"], ValueError)
+
+
+def test_multi_query_executor_respects_concurrency_cap():
+    executor = MultiQueryExecutor(pool_size=8)
+    lock = threading.Lock()
+    running, max_running = [0], [0]
+
+    def _query(i):
+        with lock:
+            running[0] += 1
+            max_running[0] = max(max_running[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return i
+
+    try:
+        results = executor.run({str(i): lambda i=i: _query(i) for i in range(10)}, max_concurrency=3)
+    finally:
+        executor.shutdown()
+
+    assert results == {str(i): i for i in range(10)}
+    assert max_running[0] <= 3
+
+
+def test_multi_query_executor_counts_timed_out_queries_against_the_concurrency():
+    executor = MultiQueryExecutor(pool_size=4)
+    lock = threading.Lock()
+    running, max_running = [0], [0]
+
+    def _query(seconds):
+        with lock:
+            running[0] += 1
+            max_running[0] = max(max_running[0], running[0])
+        time.sleep(seconds)
+        with lock:
+            running[0] -= 1
+        return seconds
+
+    try:
+        results = executor.run(
+            {"slow": lambda: _query(0.5), "a": lambda: _query(0.1), "b": lambda: _query(0.1)},
+            max_concurrency=1,
+            timeout=0.2,
+        )
+    finally:
+        executor.shutdown()
+
+    assert isinstance(results["slow"], QueryTimeoutException)
+    assert results["a"] == 0.1 and results["b"] == 0.1
+    assert max_running[0] == 1
+
+
+def test_multi_query_executor_starts_the_timeout_when_the_query_runs():
+    # The pool is busy with another request, the queued time doesn't count against the timeout
+    executor = MultiQueryExecutor(pool_size=1)
+    try:
+        blocker = executor._pool.submit(time.sleep, 0.3)  # pylint: disable=protected-access
+        results = executor.run({"a": lambda: time.sleep(0.1) or 1}, max_concurrency=1, timeout=0.2)
+        blocker.result()
+    finally:
+        executor.shutdown()
+
+    assert results == {"a": 1}
@@ -0,0 +1,25 @@
+from gitential2.core import refresh_v2, tasks
+from gitential2.datatypes.refresh import RefreshStrategy
+from gitential2.datatypes.repositories import RepositoryInDB
+
+
+def test_forced_branch_extraction_is_forced_in_the_scheduled_tasks(monkeypatch):
+    extracted = []
+    g = object()
+    monkeypatch.setattr(tasks, "_gitential_context", g)
+    monkeypatch.setattr(tasks.core_task, "apply_async", lambda kwargs, countdown: tasks.core_task(**kwargs))
+    monkeypatch.setattr(
+        refresh_v2,
+        "list_project_repositories",
+        lambda g, workspace_id, project_id: [
+            RepositoryInDB(id=2, clone_url="https://example.com/repo.git", protocol="https", name="repo")
+        ],
+    )
+    monkeypatch.setattr(
+        refresh_v2,
+        "extract_repository_branches",
+        lambda g, workspace_id, repository_id, force=False: extracted.append((workspace_id, repository_id, force)),
+    )
+
+    refresh_v2.extract_project_branches(g, 1, 3, strategy=RefreshStrategy.parallel, force=True)
+    assert extracted == [(1, 2, True)]
@@ -1,6 +1,7 @@
 import os
 import pathlib
 import pytest
+import pygit2
 
 from gitential2.datatypes.extraction import LocalGitRepository
 from gitential2.datatypes.repositories import RepositoryInDB, GitProtocol
@@ -23,3 +24,33 @@ def test_repositories():
             ret[name] = clone_repository(repository=repo, destination_path=local_path)
 
     return ret
+
+
+class LocalOriginRepository:
+    """A small git repository built on the fly, usable as a remote through its file:// url"""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self.repo = pygit2.init_repository(str(path), bare=False, initial_head="main")
+        self.signature = pygit2.Signature("Test Author", "author@example.com", 1600000000, 0)
+
+    @property
+    def clone_url(self) -> str:
+        return f"file://{self.path}"
+
+    def commit(self, files: dict, message: str = "commit", branch: str = "main", timestamp: int = 1600000000) -> str:
+        ref = f"refs/heads/{branch}"
+        parents = [self.repo.references[ref].target] if ref in self.repo.references else []
+        builder = self.repo.TreeBuilder(self.repo[parents[0]].tree) if parents else self.repo.TreeBuilder()
+        for filename, content in files.items():
+            builder.insert(filename, self.repo.create_blob(content.encode()), pygit2.GIT_FILEMODE_BLOB)
+        signature = pygit2.Signature(self.signature.name, self.signature.email, timestamp, 0)
+        return str(self.repo.create_commit(ref, signature, signature, message, builder.write(), parents))
+
+    def create_branch(self, name: str, from_branch: str = "main"):
+        self.repo.references.create(f"refs/heads/{name}", self.repo.references[f"refs/heads/{from_branch}"].target)
+
+
+@pytest.fixture
+def local_origin_repository(tmp_path):
+    return LocalOriginRepository(tmp_path / "origin")
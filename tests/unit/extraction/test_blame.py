@@ -0,0 +1,68 @@
+from gitential2.extraction.blame import BlameEngine
+from gitential2.extraction.repository import blame_porcelain
+
+FILE_VERSIONS = [
+    "a\nb\nc\nd\ne\nf\ng\nh\ni\nj\nk\nl\n",
+    "a\nB\nc\nd\ne\nf\ng\nh\ni\nj\nk\nl\nm\n",
+    "x\na\nB\nc\nd\nf\ng\nh\nI\nJ\nk\nl\nm\n",
+    "x\na\nB\nc\nd\nf\ng\nh\nI\nJ\nk\nl\nm",
+    "a\nB\nc\nd\nnew\nf\ng\nh\nI\nj\nk\nl\nm\n",
+]
+
+
+def test_blame_engine_matches_git_blame(local_origin_repository):
+    origin = local_origin_repository
+    commit_ids = [
+        origin.commit({"file.txt": content, "other.txt": str(i)}, timestamp=1600000000 + i)
+        for i, content in enumerate(FILE_VERSIONS)
+    ]
+    g2_repo = origin.repo
+    engine = BlameEngine()
+
+    for commit_id in commit_ids[1:]:
+        commit = g2_repo.get(commit_id)
+        parent = commit.parents[0]
+        expected = blame_porcelain(g2_repo.path, "file.txt", str(parent.id))
+        for patch in g2_repo.diff(parent, commit):
+            if patch.delta.new_file.path != "file.txt":
+                continue
+            deleted = engine.deleted_line_origins(g2_repo, commit, parent, patch)
+            deleted_linenos = [line.old_lineno for hunk in patch.hunks for line in hunk.lines if line.origin == "-"]
+            assert deleted == {lineno: expected[lineno] for lineno in deleted_linenos}
+
+    # The blame of the last version was derived from the patches, without blaming the history again
+    last_blob_id = str(g2_repo.get(commit_ids[-1]).tree["file.txt"].id)
+    derived = engine._cache[("file.txt", last_blob_id)].line_origins  # pylint: disable=protected-access
+    expected = blame_porcelain(g2_repo.path, "file.txt", commit_ids[-1])
+    assert derived == [expected[lineno] for lineno in range(1, len(expected) + 1)]
+
+
+def test_blame_engine_cache_is_bounded(local_origin_repository):
+    origin = local_origin_repository
+    origin.commit({f"file{i}.txt": "a\nb\n" for i in range(5)})
+    second = origin.commit({f"file{i}.txt": "a\nc\n" for i in range(5)}, timestamp=1600000001)
+    g2_repo = origin.repo
+    commit = g2_repo.get(second)
+    engine = BlameEngine(cache_size=3)
+    for patch in g2_repo.diff(commit.parents[0], commit):
+        assert engine.deleted_line_origins(g2_repo, commit, commit.parents[0], patch) == {2: str(commit.parents[0].id)}
+    assert len(engine._cache) == 3  # pylint: disable=protected-access
+
+
+def test_blame_engine_does_not_reuse_the_blame_of_a_restored_blob(local_origin_repository):
+    origin = local_origin_repository
+    versions = ["a\nb\nc\n", "a\nX\nc\n", "a\nb\nc\n", "a\nc\n"]
+    commit_ids = [origin.commit({"file.txt": content}, timestamp=1600000000 + i) for i, content in enumerate(versions)]
+    g2_repo = origin.repo
+    engine = BlameEngine()
+
+    # The blame of the first version gets cached, then the file is changed and restored
+    for commit_id in [commit_ids[1], commit_ids[3]]:
+        commit = g2_repo.get(commit_id)
+        parent = commit.parents[0]
+        patch = next(iter(g2_repo.diff(parent, commit)))
+        deleted = engine.deleted_line_origins(g2_repo, commit, parent, patch)
+
+    # The restored line is attributed to the restoring commit, like git does
+    assert deleted == {2: commit_ids[2]}
+    assert blame_porcelain(g2_repo.path, "file.txt", commit_ids[2])[2] == commit_ids[2]
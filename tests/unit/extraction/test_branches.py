@@ -0,0 +1,79 @@
+import pygit2
+
+from gitential2.extraction.branches import BranchMembershipIndex, get_branch_tips, get_stale_branches
+
+
+def _with_commit_membership(g2_repo):
+    ret = set()
+    walker = g2_repo.walk(None, pygit2.GIT_SORT_NONE)
+    for name in g2_repo.branches:
+        walker.push(g2_repo.branches[name].target)
+    for commit in walker:
+        for branch in g2_repo.branches.with_commit(commit=commit):
+            ret.add((str(commit.id), branch))
+    return ret
+
+
+def _index_membership(index):
+    return {(row.commit_id, row.branch) for row in index.rows(repo_id=1)}
+
+
+def test_branch_membership_same_as_with_commit(local_origin_repository):
+    origin = local_origin_repository
+    origin.commit({"a": "1"}, timestamp=1600000000)
+    origin.create_branch("feature")
+    origin.create_branch("stale")
+    origin.commit({"a": "2"}, timestamp=1600000100)
+    origin.commit({"b": "1"}, branch="feature", timestamp=1600000200)
+    origin.create_branch("feature-2", from_branch="feature")
+    origin.commit({"c": "1"}, branch="feature-2", timestamp=1600000300)
+    g2_repo = origin.repo
+
+    # merging feature into main
+    main_tip, feature_tip = g2_repo.branches["main"].target, g2_repo.branches["feature"].target
+    tree = g2_repo.merge_trees(g2_repo.merge_base(main_tip, feature_tip), main_tip, feature_tip).write_tree(g2_repo)
+    signature = pygit2.Signature("Test Author", "author@example.com", 1600000400, 0)
+    g2_repo.create_commit("refs/heads/main", signature, signature, "merge", tree, [main_tip, feature_tip])
+
+    index = BranchMembershipIndex(g2_repo)
+    tips = get_branch_tips(g2_repo)
+    index.update(tips)
+    assert _index_membership(index) == _with_commit_membership(g2_repo)
+    assert sorted(index.branches) == ["feature", "feature-2", "main", "stale"]
+
+    # Only the moved and the new branches are processed on the next run
+    new_commit = origin.commit({"d": "1"}, branch="feature-2", timestamp=1600000500)
+    origin.create_branch("feature-3", from_branch="stale")
+    next_index = BranchMembershipIndex(g2_repo)
+    next_index.update(get_branch_tips(g2_repo), previous_tips=tips)
+    assert sorted(next_index.branches) == ["feature-2", "feature-3"]
+    assert _index_membership(next_index) == {(new_commit, "feature-2")} | {
+        (commit_id, branch) for commit_id, branch in _with_commit_membership(g2_repo) if branch == "feature-3"
+    }
+
+
+def test_deleted_and_rewound_branches_are_stale(local_origin_repository):
+    origin = local_origin_repository
+    first_commit = origin.commit({"a": "1"}, timestamp=1600000000)
+    origin.create_branch("feature")
+    origin.create_branch("deleted")
+    origin.commit({"a": "2"}, timestamp=1600000100)
+    origin.commit({"b": "1"}, branch="feature", timestamp=1600000200)
+    g2_repo = origin.repo
+    tips = get_branch_tips(g2_repo)
+
+    origin.commit({"a": "3"}, timestamp=1600000300)
+    g2_repo.references["refs/heads/deleted"].delete()
+    g2_repo.references["refs/heads/feature"].set_target(first_commit)
+    rewound_commit = origin.commit({"c": "1"}, branch="feature", timestamp=1600000400)
+    next_tips = get_branch_tips(g2_repo)
+    assert sorted(get_stale_branches(g2_repo, next_tips, tips)) == ["deleted", "feature"]
+
+    # The rewound branch is walked again from its new tip
+    index = BranchMembershipIndex(g2_repo)
+    index.update(next_tips, previous_tips=tips)
+    assert sorted(index.branches) == ["feature", "main"]
+    assert {commit_id for commit_id, branch in _index_membership(index) if branch == "feature"} == {
+        first_commit,
+        rewound_commit,
+    }
@@ -0,0 +1,62 @@
+import random
+
+import numpy as np
+import pytest
+
+from gitential2.extraction.hunkstats import hunk_stats, indentation
+
+
+def _reference_hunk_stats(patch):
+    stats = np.zeros((len(patch.hunks), 4), dtype=np.int32)
+    for i, hunk in enumerate(patch.hunks):
+        for line in hunk.lines:
+            if line.origin == "-":
+                stats[i, 0] += 1
+                stats[i, 2] += indentation(line.raw_content)
+            elif line.origin == "+":
+                stats[i, 1] += 1
+                stats[i, 3] += indentation(line.raw_content)
+    return stats
+
+
+def _random_content(rnd):
+    pieces = ["", " ", "  ", "    ", "\t", " \t", "\t  ", " " * 70, "\t" * 3 + " " * 5]
+    lines = []
+    for _ in range(rnd.randint(0, 40)):
+        text = rnd.choice(["", "x", "foo()", "  bar", "\r", "# comment", "ü"])
+        lines.append(rnd.choice(pieces) + text)
+    content = "\n".join(lines)
+    return content + rnd.choice(["", "\n", "\r\n", "  "])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_hunk_stats_same_as_line_by_line(local_origin_repository, seed):
+    rnd = random.Random(seed)
+    origin = local_origin_repository
+    commit_ids = [
+        origin.commit({f"file{j}.txt": _random_content(rnd) for j in range(3)}, timestamp=1600000000 + i)
+        for i in range(6)
+    ]
+    g2_repo = origin.repo
+    for commit_id in commit_ids[1:]:
+        commit = g2_repo.get(commit_id)
+        for patch in g2_repo.diff(commit.parents[0], commit):
+            expected = _reference_hunk_stats(patch)
+            assert np.array_equal(hunk_stats(patch.data), expected)
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        (b"foo\n", 0),
+        (b"    foo\n", 1),
+        (b"     foo\n", 2),
+        (b"\tfoo", 1),
+        (b"  \t  foo", 3),
+        (b"      \n", 2),
+        (b"      ", 0),
+        (b"", 0),
+    ],
+)
+def test_indentation(line, expected):
+    assert indentation(line) == expected
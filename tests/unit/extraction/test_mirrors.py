@@ -0,0 +1,83 @@
+import os
+import subprocess
+
+import pytest
+
+from gitential2.datatypes.credentials import UserPassCredential
+from gitential2.datatypes.repositories import RepositoryInDB, GitProtocol
+from gitential2.extraction.mirrors import RepositoryMirrorStore, _askpass_env, _directory_size, _run_git
+from gitential2.extraction.repository import get_repository_state, get_commits
+from gitential2.utils.tempdir import TemporaryDirectory
+
+
+def _repository(origin):
+    return RepositoryInDB(id=1, clone_url=origin.clone_url, protocol=GitProtocol.https)
+
+
+def test_mirror_fetches_new_commits_incrementally(tmp_path, local_origin_repository):
+    origin = local_origin_repository
+    first = origin.commit({"README.md": "hello\n"})
+    store = RepositoryMirrorStore(root=tmp_path / "mirrors", size_limit_bytes=100 * 1024 * 1024)
+    repository = _repository(origin)
+
+    with store.mirror(repository) as local_repo:
+        assert local_repo.repo_id == 1
+        state = get_repository_state(local_repo)
+        assert state.branches == {"main": first}
+        assert list(get_commits(local_repo)) == [first]
+
+    second = origin.commit({"README.md": "hello\nworld\n"})
+    origin.create_branch("feature")
+    with store.mirror(repository) as local_repo:
+        state = get_repository_state(local_repo)
+        assert state.branches == {"main": second, "feature": second}
+        assert list(get_commits(local_repo, previous_state=state.copy(update={"branches": {"main": first}}))) == [
+            second
+        ]
+
+
+def test_mirror_store_evicts_least_recently_used(tmp_path, local_origin_repository):
+    origin = local_origin_repository
+    origin.commit({"README.md": "hello\n"})
+    store = RepositoryMirrorStore(root=tmp_path / "mirrors", size_limit_bytes=100 * 1024 * 1024)
+    first_repository = _repository(origin)
+    second_repository = RepositoryInDB(id=2, clone_url=origin.clone_url + "/", protocol=GitProtocol.https)
+
+    with store.mirror(first_repository):
+        pass
+    with store.mirror(second_repository):
+        pass
+    first_path, second_path = store.mirror_path(first_repository), store.mirror_path(second_repository)
+    os.utime(first_path / "gitential-last-used", (1, 1))
+
+    # Only one of the mirrors fits, the least recently used one has to go
+    store.size_limit_bytes = _directory_size(second_path) + 1024
+    store.evict()
+    assert not first_path.exists()
+    assert second_path.exists()
+
+    store.size_limit_bytes = 1
+    store.evict()
+    assert not second_path.exists()
+
+
+def test_credentials_are_passed_to_git_out_of_band(tmp_path):
+    password = 'pa"ss $(touch injected) `touch injected` \\ $HOME'
+    credentials = UserPassCredential(username="user", password=password)
+
+    with TemporaryDirectory() as workdir:
+        env = _askpass_env(workdir, credentials)
+
+        def run(prompt):
+            return subprocess.run(
+                [env["GIT_ASKPASS"], prompt], env=env, cwd=tmp_path, capture_output=True, text=True, check=True
+            ).stdout
+
+        assert run("Username for 'https://example.com': ") == "user\n"
+        assert run("Password for 'https://user@example.com': ") == password + "\n"
+    assert not (tmp_path / "injected").exists()
+
+    # The arguments of a failed git command are not kept, they end up in the logs
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        _run_git(["-c", "credential.helper=secret", "no-such-command"], cwd=tmp_path)
+    assert e.value.cmd == ["git", "no-such-command"]
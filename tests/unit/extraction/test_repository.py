@@ -16,6 +16,8 @@ from gitential2.extraction.repository import (
     blame_porcelain,
     extract_incremental,
     extract_commit_branches,
+    extract_incremental_local,
+    clone_repository_pygit2,
 )
 
 TEST_PUBLIC_REPOSITORY = "https://github.com/benbal87/unicode-string-converter.git"
@@ -207,3 +209,27 @@ def test_extract_commit_branches(test_repositories):
     assert len(extracted_commit_branches) >= 4
     assert "main" in [x.branch for x in output.values["extracted_commit_branch"]]
     assert "origin/main" in [x.branch for x in output.values["extracted_commit_branch"]]
+
+
+def test_extract_incremental_local_with_worker_state(settings, tmp_path, local_origin_repository):
+    origin = local_origin_repository
+    origin.commit({"main.py": "def main():\n    pass\n"}, timestamp=1600000000)
+    origin.commit({"main.py": "def main():\n    return 1\n", "lib.py": "x = 1\n"}, timestamp=1600000100)
+    last = origin.commit({"main.py": "def main():\n    return 2\n"}, timestamp=1600000200)
+    local_repo = clone_repository_pygit2(
+        RepositoryInDB(id=1, clone_url=origin.clone_url, protocol=GitProtocol.https),
+        destination_path=tmp_path / "clone",
+    )
+    output = DataCollector()
+
+    result = extract_incremental_local(
+        local_repo,
+        output,
+        settings.copy(update={"extraction": settings.extraction.copy(update={"executor": "single_thread"})}),
+    )
+
+    assert result.branches == {"main": last}
+    assert len(output.values["extracted_commit"]) == 3
+    assert len(output.values["extracted_patch"]) == 4
+    rewrites = output.values["extracted_patch_rewrite"]
+    assert sorted((r.loc_d, r.rewritten_atime.timestamp()) for r in rewrites) == [(1, 1600000000), (1, 1600000100)]
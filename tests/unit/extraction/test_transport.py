@@ -0,0 +1,86 @@
+import os
+from datetime import datetime, timezone
+
+from gitential2.datatypes.extraction import ExtractedCommit, ExtractedPatchRewrite, ExtractedKind
+from gitential2.extraction.output import DataCollector
+from gitential2.extraction.transport import (
+    SHARED_MEMORY_DIRECTORY,
+    ColumnarBatch,
+    create_spill_directory,
+    spill_batch,
+    load_batch,
+    run_batch,
+    chunks,
+)
+
+
+def _extract(commit_id: str, output: DataCollector):
+    atime = datetime(2021, 1, 1, tzinfo=timezone.utc)
+    output.write(
+        ExtractedKind.EXTRACTED_COMMIT.value,
+        ExtractedCommit(
+            repo_id=1,
+            commit_id=commit_id,
+            atime=atime,
+            aemail="a@example.com",
+            aname="A",
+            ctime=atime,
+            cemail="c@example.com",
+            cname="C",
+            message="message",
+            nparents=1,
+            tree_id="0" * 40,
+        ),
+    )
+    output.write(
+        ExtractedKind.EXTRACTED_PATCH_REWRITE.value,
+        ExtractedPatchRewrite(
+            repo_id=1,
+            commit_id=commit_id,
+            atime=atime,
+            aemail="a@example.com",
+            newpath="README.md",
+            rewritten_commit_id="1" * 40,
+            rewritten_atime=1600000000,
+            rewritten_aemail="b@example.com",
+            loc_d=3,
+        ),
+    )
+    return output
+
+
+def test_columnar_batch_round_trip(tmp_path):
+    expected = DataCollector()
+    for commit_id in ["a" * 40, "b" * 40]:
+        _extract(commit_id, expected)
+
+    batch = ColumnarBatch()
+    batch.extend(iter(expected))
+    descriptor = spill_batch(batch, str(tmp_path))
+    assert descriptor.row_count == 4
+
+    loaded = dict(load_batch(descriptor))
+    assert not os.path.exists(descriptor.path)
+    for kind, values in expected.values.items():
+        assert loaded[kind] == values
+        assert [v.__fields_set__ for v in loaded[kind]] == [v.__fields_set__ for v in values]
+
+
+def test_run_batch_collects_all_items(tmp_path):
+    items = [c * 40 for c in "abcde"]
+    descriptors = [
+        run_batch(chunk, fn_partial=lambda item: _extract(item, DataCollector()), spill_directory=str(tmp_path))
+        for chunk in chunks(items, 2)
+    ]
+    assert [d.item_count for d in descriptors] == [2, 2, 1]
+
+    commits = [v for d in descriptors for kind, values in load_batch(d) if kind == "extracted_commit" for v in values]
+    assert sorted(c.commit_id for c in commits) == items
+
+
+def test_spill_directory_falls_back_to_the_disk_without_enough_shared_memory():
+    spill_directory = create_spill_directory(min_free_bytes=2**62)
+    try:
+        assert not spill_directory.startswith(SHARED_MEMORY_DIRECTORY)
+    finally:
+        os.rmdir(spill_directory)
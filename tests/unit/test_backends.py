@@ -1,4 +1,20 @@
-from gitential2.backends.sql import SQLGitentialBackend
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+import ibis
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.pool import QueuePool
+
+from gitential2.backends.sql import SQLGitentialBackend, BulkSQLOutputHandler
+from gitential2.backends.sql.copy import format_csv
+from gitential2.backends.sql.ibis_pool import IbisConnectionPool
+from gitential2.backends.sql import schema_cache
+from gitential2.backends.sql.schema_cache import WorkspaceSchemaCache
+from gitential2.datatypes.extraction import ExtractedCommitBranch
+from gitential2.extraction.output import DataCollector
+from gitential2.kvstore import InMemKeyValueStore
 from gitential2.settings import GitentialSettings, ConnectionSettings
 from gitential2.datatypes import UserCreate, UserUpdate
 
@@ -32,3 +48,144 @@ def test_sql_backend():
     assert deleted_user_count_second == 0
 
     assert backend.users.get(new_user.id) is None
+
+
+def test_bulk_output_handler_buffers_rows_by_kind():
+    settings = GitentialSettings(
+        backend="sql",
+        connections=ConnectionSettings(database_url="sqlite:///:memory:"),
+        secret="test" * 8,
+        integrations={},
+    )
+    backend = SQLGitentialBackend(settings)
+    output = BulkSQLOutputHandler(workspace_id=1, backend=backend, flush_rows=100, flush_bytes=1024 * 1024)
+    atime = datetime(2021, 1, 1, tzinfo=timezone.utc)
+    output.write("extracted_commit_branch", ExtractedCommitBranch(repo_id=1, commit_id="a", atime=atime, branch="x"))
+    output.write("extracted_commit_branch", ExtractedCommitBranch(repo_id=1, commit_id="a", atime=atime, branch="y"))
+    # The same primary key again, the last one wins
+    output.write(
+        "extracted_commit_branch",
+        ExtractedCommitBranch(repo_id=1, commit_id="a", atime=datetime(2022, 1, 1, tzinfo=timezone.utc), branch="x"),
+    )
+
+    ((key, rows),) = output._buffer.items()  # pylint: disable=protected-access
+    assert key == ("extracted_commit_branch", ("repo_id", "commit_id", "atime", "branch"), ("atime",))
+    assert [row[2].year for row in rows.values()] == [2022, 2021]
+
+    output.clear()
+    assert not output._buffer  # pylint: disable=protected-access
+
+
+def test_output_handler_is_flushed_when_the_collection_fails():
+    class _RecordingOutput(DataCollector):
+        flushed = False
+
+        def flush(self):
+            self.flushed = True
+
+    output = _RecordingOutput()
+    with pytest.raises(ValueError):
+        with output:
+            output.write("extracted_commit_branch", "row")
+            raise ValueError("collection failed")
+    assert output.flushed
+
+
+def test_format_csv_for_copy():
+    rows = [(None, "", 'say "hi"\n', True, 3, 1.5, float("nan"), datetime(2021, 1, 1, tzinfo=timezone.utc))]
+    assert format_csv(rows).getvalue() == (',"","say ""hi""\n",true,3,1.5,NaN,"2021-01-01 00:00:00+00:00"\n')
+
+
+def test_workspace_schema_cache_builds_once_until_invalidated():
+    cache = WorkspaceSchemaCache()
+    reflected = []
+
+    def _reflect(table_name, schema):
+        reflected.append((schema, table_name))
+        return object()
+
+    metadata, _ = cache.get_metadata("ws_1")
+    assert cache.get_metadata("ws_1")[0] is metadata
+    assert cache.get_metadata("ws_2")[0] is not metadata
+
+    commits = cache.get_ibis_table("ws_1", "calculated_commits", reflect=_reflect)
+    assert cache.get_ibis_table("ws_1", "calculated_commits", reflect=_reflect) is commits
+    cache.get_ibis_table("ws_2", "calculated_commits", reflect=_reflect)
+    assert reflected == [("ws_1", "calculated_commits"), ("ws_2", "calculated_commits")]
+
+    cache.invalidate("ws_1")
+    assert cache.get_metadata("ws_1")[0] is not metadata
+    assert cache.get_ibis_table("ws_1", "calculated_commits", reflect=_reflect) is not commits
+    cache.get_ibis_table("ws_2", "calculated_commits", reflect=_reflect)
+    assert len(reflected) == 3
+
+
+def test_workspace_schema_cache_is_invalidated_by_other_processes(monkeypatch):
+    monkeypatch.setattr(schema_cache, "SCHEMA_REVISION_CHECK_INTERVAL_SECONDS", 0)
+    kvstore = InMemKeyValueStore(GitentialSettings(secret="test" * 8, integrations={}))
+    cache, other_process_cache = WorkspaceSchemaCache(), WorkspaceSchemaCache()
+    cache.share_revision(kvstore)
+    other_process_cache.share_revision(kvstore)
+
+    metadata, _ = cache.get_metadata("ws_1")
+    assert cache.get_metadata("ws_1")[0] is metadata
+    other_process_cache.invalidate("ws_1")
+    assert cache.get_metadata("ws_1")[0] is not metadata
+
+
+def test_workspace_schema_cache_invalidation_picks_up_the_unchecked_revisions():
+    kvstore = InMemKeyValueStore(GitentialSettings(secret="test" * 8, integrations={}))
+    cache, other_process_cache = WorkspaceSchemaCache(), WorkspaceSchemaCache()
+    cache.share_revision(kvstore)
+    other_process_cache.share_revision(kvstore)
+
+    metadata, _ = cache.get_metadata("ws_2")
+    cache.invalidate("ws_1")
+    assert cache.get_metadata("ws_2")[0] is metadata
+
+    # Within the check interval the other process migrates ws_2, then this one changes ws_1
+    other_process_cache.invalidate("ws_2")
+    cache.invalidate("ws_1")
+    assert cache.get_metadata("ws_2")[0] is not metadata
+
+
+def test_ibis_connection_pool_checks_out_a_connection_per_query(tmp_path):
+    path = str(tmp_path / "ibis.db")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE calculated_commits (repo_id INTEGER, loc_i INTEGER)")
+    db.executemany("INSERT INTO calculated_commits VALUES (?, ?)", [(1, 10), (1, 5), (2, 1)])
+    db.commit()
+    db.close()
+
+    ibis_backend = ibis.sqlite.connect(path)
+    engine = sa.create_engine(f"sqlite:///{path}", poolclass=QueuePool, pool_size=1, max_overflow=0)
+    # the sqlite backend of ibis refers to the tables of the attached database
+    sa.event.listen(engine, "connect", lambda dbapi_conn, _: dbapi_conn.execute(f"ATTACH DATABASE '{path}' AS base"))
+    pool = IbisConnectionPool(ibis_backend=ibis_backend, engine=engine)
+    commits = ibis_backend.table("calculated_commits")
+
+    result = pool.execute(commits.group_by("repo_id").aggregate(commits.loc_i.sum().name("loc_i")).sort_by("repo_id"))
+    assert result.to_dict(orient="list") == {"repo_id": [1, 2], "loc_i": [15, 1]}
+    assert pool.execute(commits.count()) == 3
+
+    checked_out = threading.Event()
+    release = threading.Event()
+
+    def _hold_connection():
+        with pool.checkout():
+            checked_out.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=_hold_connection)
+    holder.start()
+    checked_out.wait(5)
+    assert pool.metrics().saturation == 1.0
+    threading.Timer(0.1, release.set).start()
+    assert pool.execute(commits.count()) == 3
+    holder.join()
+
+    metrics = pool.metrics()
+    assert metrics.checkouts == 4
+    assert metrics.saturated_checkouts == 1
+    assert metrics.checked_out == 0
+    assert metrics.max_wait_seconds >= 0.05
@@ -0,0 +1,499 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+from authlib.integrations.requests_client import OAuth2Session
+from requests import Response
+
+from gitential2.datatypes.extraction import ExtractedKind
+from gitential2.datatypes.pull_requests import PullRequestData
+from gitential2.datatypes.repositories import RepositoryInDB
+from gitential2.exceptions import RateLimitException
+from gitential2.extraction.output import DataCollector
+from gitential2.integrations.base import GitProviderMixin
+from gitential2.integrations.common import walk_next_link
+from gitential2.integrations.github import GithubIntegration
+from gitential2.integrations.http_cache import MAX_CACHED_BODY_BYTES, get_json_revalidated
+from gitential2.integrations.rate_limit import UNKNOWN_RESET_WAIT_SECONDS, InMemTokenBucket, _take_tokens
+from gitential2.integrations.session_pool import HTTPSessionPool, PooledOAuth2Session
+from gitential2.kvstore import InMemKeyValueStore
+from gitential2.settings import GitentialSettings, IntegrationSettings, IntegrationType, OAuthClientSettings
+
+PARAMS = {"client_id": "client", "client_secret": "secret", "api_base_url": "https://api.example.com/"}
+
+
+def test_sessions_are_reused_by_integration_and_credential():
+    pool = HTTPSessionPool()
+    token = {"access_token": "a1", "token_type": "bearer"}
+
+    session = pool.get_session("github", {**PARAMS, "token": token})
+    assert isinstance(session, PooledOAuth2Session)
+    session.close()
+    assert pool.get_session("github", {**PARAMS, "token": dict(token)}) is session
+    assert pool.get_session("gitlab", {**PARAMS, "token": token}) is not session
+    assert pool.get_session("github", {**PARAMS, "token": {**token, "access_token": "a2"}}) is not session
+    assert len(pool) == 3
+
+    # Without a token every session is a new one, and it is not pooled
+    assert not isinstance(pool.get_session("github", PARAMS), PooledOAuth2Session)
+    assert len(pool) == 3
+
+    pool.close_all()
+    assert len(pool) == 0
+
+
+def test_refreshed_session_stays_in_the_pool():
+    pool = HTTPSessionPool()
+    session = pool.get_session("gitlab", {**PARAMS, "token": {"access_token": "old", "token_type": "bearer"}})
+
+    session.token = {"access_token": "new", "token_type": "bearer"}
+    pool.rekey(session)
+
+    assert pool.get_session("gitlab", {**PARAMS, "token": {"access_token": "new", "token_type": "bearer"}}) is session
+    assert (
+        pool.get_session("gitlab", {**PARAMS, "token": {"access_token": "old", "token_type": "bearer"}}) is not session
+    )
+
+
+def test_expired_token_is_refreshed_once_by_the_threads_sharing_the_session(monkeypatch):
+    refreshed_with = []
+
+    def _refresh_token(session, url, refresh_token=None, **kwargs):  # pylint: disable=unused-argument
+        refreshed_with.append(refresh_token)
+        time.sleep(0.05)
+        session.token = {
+            "access_token": f"a{len(refreshed_with) + 1}",
+            "refresh_token": f"r{len(refreshed_with) + 1}",
+            "token_type": "bearer",
+            "expires_at": int(time.time()) + 3600,
+        }
+        return session.token
+
+    monkeypatch.setattr(OAuth2Session, "refresh_token", _refresh_token)
+    pool = HTTPSessionPool()
+    expired = {"access_token": "a1", "refresh_token": "r1", "token_type": "bearer", "expires_at": 1}
+    session = pool.get_session("gitlab", {**PARAMS, "token": expired, "token_endpoint": "https://example.com/token"})
+
+    threads = [threading.Thread(target=session.token_auth.ensure_active_token) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert refreshed_with == ["r1"]
+
+    # A refresh with the already rotated refresh token returns the current token
+    assert session.refresh_token("https://example.com/token", refresh_token="r1")["access_token"] == "a2"
+    assert refreshed_with == ["r1"]
+
+
+def _response(status_code=200, **headers):
+    response = Response()
+    response.status_code = status_code
+    response.headers.update(headers)
+    response._content = b"{}"  # pylint: disable=protected-access
+    return response
+
+
+def test_token_bucket_is_synced_from_the_rate_limit_headers():
+    bucket = InMemTokenBucket()
+    reset_at = time.time() + 3600
+
+    # Unknown until the first response
+    assert bucket.take("github-a") == (0.0, False)
+
+    bucket.sync("github-a", _response(**{"X-RateLimit-Remaining": "3", "X-RateLimit-Reset": str(reset_at)}), False)
+    # A late response of the same window does not give the tokens back
+    bucket.sync("github-a", _response(**{"X-RateLimit-Remaining": "5", "X-RateLimit-Reset": str(reset_at)}), False)
+    assert bucket.take("github-a") == (0.0, False)
+    assert bucket.take("github-a", tokens=0, reserve=1) == (0.0, False)
+    wait_seconds, exhausted = bucket.take("github-a", reserve=2)
+    assert exhausted and 3590 < wait_seconds <= 3600
+    assert bucket.take("github-b") == (0.0, False)
+
+    # The bucket is refilled to the limit at the reset
+    bucket.sync(
+        "github-c",
+        _response(**{"X-RateLimit-Remaining": "0", "X-RateLimit-Limit": "2", "X-RateLimit-Reset": "1"}),
+        False,
+    )
+    assert bucket.take("github-c") == (0.0, False)
+    assert bucket.take("github-c") == (0.0, False)
+    # Without a known reset time the wait is bounded
+    wait_seconds, exhausted = bucket.take("github-c")
+    assert exhausted and UNKNOWN_RESET_WAIT_SECONDS - 1 < wait_seconds <= UNKNOWN_RESET_WAIT_SECONDS
+
+    # A rate limited response pauses the bucket without exhausting it
+    bucket.sync("github-b", _response(429, **{"Retry-After": "30"}), True)
+    wait_seconds, exhausted = bucket.take("github-b")
+    assert not exhausted and 29 < wait_seconds <= 30
+
+
+def test_exhausted_bucket_without_reset_time_is_tried_again():
+    now = time.time()
+    state = {"remaining": 0, "reset_at": None}
+    assert _take_tokens(state, now, 1, 0) == (UNKNOWN_RESET_WAIT_SECONDS, True)
+    assert _take_tokens(state, now + 10, 1, 0) == (UNKNOWN_RESET_WAIT_SECONDS - 10, True)
+    assert _take_tokens(state, now + UNKNOWN_RESET_WAIT_SECONDS, 1, 0) == (0.0, False)
+    assert state["remaining"] is None
+
+
+def test_pooled_session_requests_dont_wait_out_long_backoffs():
+    pool = HTTPSessionPool()
+    session = pool.get_session(
+        "github", {**PARAMS, "token": {"access_token": "a1", "token_type": "bearer"}}, token_bucket=InMemTokenBucket()
+    )
+    session.rate_limit_budget.update_from_response(_response(429, **{"Retry-After": "120"}))
+    started_at = time.monotonic()
+    with pytest.raises(RateLimitException):
+        session.get("https://api.example.com/user")
+    assert time.monotonic() - started_at < 1
+
+
+def test_pooled_sessions_stop_when_the_bucket_is_exhausted():
+    pool = HTTPSessionPool()
+    bucket = InMemTokenBucket()
+    params = {**PARAMS, "token": {"access_token": "a1", "token_type": "bearer"}}
+    session = pool.get_session("github", params, token_bucket=bucket)
+    other_session = pool.get_session(
+        "github", {**params, "api_base_url": "https://other.example.com/"}, token_bucket=bucket
+    )
+
+    # The sessions of a credential share its bucket
+    session.rate_limit_budget.update_from_response(
+        _response(403, **{"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(time.time() + 3600)})
+    )
+    with pytest.raises(RateLimitException):
+        other_session.get("https://api.example.com/user")
+
+
+class _Client:
+    def __init__(self):
+        self.hooks = {"response": []}
+
+    def respond(self, status_code=200, **headers):
+        response = _response(status_code, **headers)
+        for hook in self.hooks["response"]:
+            hook(response)
+
+    def close(self):
+        pass
+
+
+class _Provider(GitProviderMixin):
+    def __init__(self, raw_prs, rate_limited_prs=(), reset_at=0):
+        self.client = _Client()
+        self.reset_at = reset_at
+        self.raw_prs = raw_prs
+        self.rate_limited_prs = set(rate_limited_prs)
+        self.fetched = []
+
+    def get_client(self, token, update_token):
+        return self.client
+
+    def _collect_raw_pull_requests(self, repository, client, repo_analysis_limit_in_days=None):
+        return self.raw_prs
+
+    def _raw_pr_number_and_updated_at(self, raw_pr):
+        return raw_pr["number"], raw_pr["updated_at"]
+
+    def _collect_raw_pull_request(self, repository, pr_number, client, repo_analysis_limit_in_days=None):
+        self.fetched.append(pr_number)
+        if pr_number in self.rate_limited_prs:
+            self.rate_limited_prs.remove(pr_number)
+            client.respond(403, **{"Retry-After": "0"})
+        else:
+            client.respond(
+                200, **{"X-RateLimit-Remaining": str(100 - len(self.fetched)), "X-RateLimit-Reset": str(self.reset_at)}
+            )
+        return {"number": pr_number}
+
+    def _tranform_to_pr_data(self, repository, pr_number, raw_data, author_callback):
+        return PullRequestData.construct(pr=pr_number, commits=[], comments=[], labels=[])
+
+    def get_newest_repos_since_last_refresh(self, *args, **kwargs):
+        return []
+
+    def list_available_private_repositories(self, *args, **kwargs):
+        return []
+
+    def search_public_repositories(self, *args, **kwargs):
+        return []
+
+
+def _collect(provider, **kwargs):
+    output = DataCollector()
+    repository = RepositoryInDB(
+        id=1, clone_url="https://example.com/repo.git", protocol="https", name="repo", namespace="team"
+    )
+    result = provider.collect_pull_requests(
+        repository, {}, None, output, None, prs_we_already_have={}, max_workers=4, **kwargs
+    )
+    return result, [value for kind, value in output if kind == ExtractedKind.PULL_REQUEST]
+
+
+def test_pull_requests_are_collected_concurrently_in_order():
+    raw_prs = [{"number": n, "updated_at": None, "created_at": "2021-01-01"} for n in range(1, 21)]
+    provider = _Provider(raw_prs, rate_limited_prs=[5])
+
+    result, written = _collect(provider, limit=15)
+
+    assert written == list(range(1, 16))
+    assert result.prs_collected == list(range(1, 16))
+    assert result.prs_left == list(range(16, 21))
+    assert provider.fetched.count(5) == 2
+
+
+def test_pull_request_collection_stops_when_the_budget_is_exhausted():
+    raw_prs = [{"number": n, "updated_at": None, "created_at": "2021-01-01"} for n in range(1, 11)]
+    provider = _Provider(raw_prs, reset_at=int(time.time()) + 3600)
+    provider.rate_limit_reserve = 97
+
+    result, written = _collect(provider)
+
+    assert len(written) == len(result.prs_collected) >= 3
+    assert sorted(result.prs_collected + result.prs_left) == list(range(1, 11))
+    assert not result.prs_failed
+
+
+class _PollingClient:
+    credential_key = "github-a"
+
+    def __init__(self, response_cache, pages):
+        self.response_cache = response_cache
+        self.pages = pages
+        self.requests = []
+
+    def request(self, method, url, headers=None):
+        self.requests.append((url, headers or {}))
+        body, etag, link = self.pages[url]
+        if etag == (headers or {}).get("If-None-Match"):
+            return _response(304, ETag=etag)
+        response = _response(200, ETag=etag, **({"Link": f'<{link}>; rel="next"'} if link else {}))
+        response._content = json.dumps(body).encode()  # pylint: disable=protected-access
+        return response
+
+
+def test_polled_lists_are_revalidated_with_etags():
+    kvstore = InMemKeyValueStore(GitentialSettings(secret="test" * 8, integrations={}))
+    client = _PollingClient(
+        kvstore,
+        {
+            "https://api.example.com/repos?page=1": ([{"id": 1}], '"p1"', "https://api.example.com/repos?page=2"),
+            "https://api.example.com/repos?page=2": ([{"id": 2}], '"p2"', None),
+        },
+    )
+
+    assert walk_next_link(client, "https://api.example.com/repos?page=1", revalidate=True) == [{"id": 1}, {"id": 2}]
+    assert [headers for _, headers in client.requests] == [{}, {}]
+
+    # The unchanged pages are served from the cache, the next page link included
+    client.requests = []
+    client.pages["https://api.example.com/repos?page=2"] = ([{"id": 2}, {"id": 3}], '"p2-changed"', None)
+    assert walk_next_link(client, "https://api.example.com/repos?page=1", revalidate=True) == [
+        {"id": 1},
+        {"id": 2},
+        {"id": 3},
+    ]
+    assert [headers for _, headers in client.requests] == [{"If-None-Match": '"p1"'}, {"If-None-Match": '"p2"'}]
+
+    # Within the max age there is no request at all
+    client.requests = []
+    result = get_json_revalidated(
+        client, kvstore, "http-cache-test", "https://api.example.com/repos?page=2", max_age_seconds=60
+    )
+    result = get_json_revalidated(
+        client, kvstore, "http-cache-test", "https://api.example.com/repos?page=2", max_age_seconds=60
+    )
+    assert result.body == [{"id": 2}, {"id": 3}] and result.from_cache and result.response is None
+    assert len(client.requests) == 1
+
+
+_REPOSITORY_URL_FIELDS = (
+    "archive assignees blobs branches collaborators comments commits compare contents contributors deployments "
+    "downloads events forks git_commits git_refs git_tags hooks issue_comment issue_events issues keys labels "
+    "languages merges milestones notifications pulls releases stargazers statuses subscribers subscription tags "
+    "teams trees"
+).split()
+
+
+def _github_user(login: str) -> dict:
+    user_url = f"https://api.github.com/users/{login}"
+    return {
+        "login": login,
+        "id": sum(map(ord, login)),
+        "node_id": f"MDQ6VXNlcj{login}",
+        "avatar_url": f"https://avatars.githubusercontent.com/u/{login}?v=4",
+        "url": user_url,
+        "html_url": f"https://github.com/{login}",
+        **{
+            f"{name}_url": f"{user_url}/{name}"
+            for name in ["followers", "following", "gists", "starred", "subscriptions", "organizations", "repos"]
+        },
+        "type": "User",
+        "site_admin": False,
+    }
+
+
+def _github_branch(number: int, ref: str, sha: str) -> dict:
+    repository_url = "https://api.github.com/repos/octocat/Hello-World"
+    return {
+        "label": f"octocat:{ref}",
+        "ref": ref,
+        "sha": sha,
+        "user": _github_user("octocat"),
+        "repo": {
+            "id": 1296269,
+            "name": "Hello-World",
+            "full_name": "octocat/Hello-World",
+            "owner": _github_user("octocat"),
+            "description": f"This your first repo! Fork number {number}",
+            "url": repository_url,
+            **{f"{name}_url": f"{repository_url}/{name}{{/sha}}" for name in _REPOSITORY_URL_FIELDS},
+            "created_at": "2011-01-26T19:01:12Z",
+            "pushed_at": f"2021-01-26T19:{number % 60:02}:12Z",
+            "default_branch": "main",
+            "topics": ["octocat", "atom", "electron", "api"],
+        },
+    }
+
+
+def _github_pull_request(number: int) -> dict:
+    """An item of the GitHub pull request list with the same fields as the API returns"""
+    pull_url = f"https://api.github.com/repos/octocat/Hello-World/pulls/{number}"
+    head_sha = f"{number:040x}"
+    return {
+        "url": pull_url,
+        "id": 1000000 + number,
+        "number": number,
+        "state": "open" if number % 3 else "closed",
+        "title": f"Amazing new feature #{number}",
+        "user": _github_user(f"contributor{number % 7}"),
+        "body": f"Please pull these awesome changes in! Fixes #{number * 3}\n" * 10,
+        "labels": [{"id": 208045946, "name": "bug", "color": "f29513", "default": True}],
+        "created_at": f"2021-01-{number % 28 + 1:02}T19:01:12Z",
+        "updated_at": f"2021-02-{number % 28 + 1:02}T19:01:12Z",
+        "merge_commit_sha": f"{number * 7:040x}",
+        "head": _github_branch(number, f"feature-{number}", head_sha),
+        "base": _github_branch(number, "main", f"{number * 13:040x}"),
+        "_links": {
+            name: {"href": f"{pull_url}/{name}"}
+            for name in ["self", "html", "issue", "comments", "commits", "statuses"]
+        },
+        "author_association": "CONTRIBUTOR",
+    }
+
+
+def test_large_pull_request_pages_are_revalidated():
+    kvstore = InMemKeyValueStore(GitentialSettings(secret="test" * 8, integrations={}))
+    page_url = "https://api.github.com/repos/octocat/Hello-World/pulls?per_page=100&state=all"
+    page = [_github_pull_request(number) for number in range(100, 0, -1)]
+    assert len(json.dumps(page)) > 2 * MAX_CACHED_BODY_BYTES
+    client = _PollingClient(kvstore, {page_url: (page, '"p1"', None)})
+    integration = GithubIntegration(
+        "github",
+        settings=IntegrationSettings(type=IntegrationType.github, oauth=OAuthClientSettings(client_id="id")),
+        kvstore=kvstore,
+    )
+    repository = RepositoryInDB(
+        id=1,
+        clone_url="https://github.com/octocat/Hello-World.git",
+        protocol="https",
+        name="Hello-World",
+        namespace="octocat",
+    )
+
+    raw_prs = integration._collect_raw_pull_requests(repository, client)  # pylint: disable=protected-access
+    assert raw_prs == [
+        {"number": pr["number"], "created_at": pr["created_at"], "updated_at": pr["updated_at"]} for pr in page
+    ]
+    assert integration._collect_raw_pull_requests(repository, client) == raw_prs  # pylint: disable=protected-access
+    assert [headers for _, headers in client.requests] == [{}, {"If-None-Match": '"p1"'}]
+
+
+def test_too_large_responses_are_not_cached():
+    kvstore = InMemKeyValueStore(GitentialSettings(secret="test" * 8, integrations={}))
+    # Random data, the compression doesn't make it smaller
+    large_page = [{"id": i, "description": os.urandom(512).hex()} for i in range(MAX_CACHED_BODY_BYTES // 512)]
+    client = _PollingClient(kvstore, {"https://api.example.com/repos?page=1": (large_page, '"p1"', None)})
+
+    assert walk_next_link(client, "https://api.example.com/repos?page=1", revalidate=True) == large_page
+    assert walk_next_link(client, "https://api.example.com/repos?page=1", revalidate=True) == large_page
+    assert [headers for _, headers in client.requests] == [{}, {}]
+    assert kvstore.get_value("http-cache-github-a-https://api.example.com/repos?page=1") is None
+
+
+class _RecordedGraphQLClient:
+    """Replays the recorded GitHub GraphQL responses of github_graphql_recorded.json"""
+
+    def __init__(self):
+        with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), "github_graphql_recorded.json")) as f:
+            self.recorded = json.load(f)
+        self.hooks = {"response": []}
+
+    def post(self, url, **kwargs):
+        assert url == "https://api.github.com/graphql"
+        exchange = self.recorded.pop(0)
+        assert kwargs["json"]["variables"] == exchange["variables"]
+        response = _response(200)
+        response._content = json.dumps(exchange["response"]).encode()  # pylint: disable=protected-access
+        return response
+
+    def close(self):
+        pass
+
+
+class _GithubIntegration(GithubIntegration):
+    def __init__(self, client):
+        super().__init__(
+            "github",
+            settings=IntegrationSettings(type=IntegrationType.github, oauth=OAuthClientSettings(client_id="id")),
+            kvstore=InMemKeyValueStore(GitentialSettings(secret="test" * 8, integrations={})),
+        )
+        self.client = client
+
+    def get_client(self, token, update_token):
+        return self.client
+
+    def _check_rate_limit(self, token, update_token):
+        return True
+
+    def _collect_raw_pull_requests(self, repository, client, repo_analysis_limit_in_days=None):
+        return [{"number": n, "updated_at": "2021-03-04T10:00:00Z", "created_at": "2021-03-01"} for n in [7, 8, 9]]
+
+    def _collect_raw_pull_request(self, repository, pr_number, client, repo_analysis_limit_in_days=None):
+        raise RuntimeError(f"PR {pr_number} not found")
+
+
+def test_pull_requests_are_collected_in_bulk_with_graphql():
+    client = _RecordedGraphQLClient()
+    output = DataCollector()
+    repository = RepositoryInDB(
+        id=1,
+        clone_url="https://github.com/octo-org/hello-world.git",
+        protocol="https",
+        name="hello-world",
+        namespace="octo-org",
+    )
+    author_ids = {"octocat": 1, "monalisa": 2, "dependabot[bot]": 3}
+
+    result = _GithubIntegration(client).collect_pull_requests(
+        repository, {}, None, output, lambda alias: author_ids.get(alias.login), max_workers=2
+    )
+
+    assert not client.recorded
+    # The PR missing from the GraphQL response is fetched by the REST API
+    assert result.prs_collected == [7, 8] and result.prs_failed == [9]
+    written = list(output)
+    merged, opened = [value for kind, value in written if kind == ExtractedKind.PULL_REQUEST]
+    assert (merged.state, merged.user_aid, merged.merged_by_aid, merged.commits) == ("merged", 1, 2, 2)
+    assert merged.user_name_external == "The Octocat"
+    assert merged.first_reaction_at.isoformat() == "2021-03-02T08:00:00+00:00"
+    assert (opened.state, opened.draft, opened.user_aid, opened.user_name_external) == ("open", True, 3, None)
+    comments = [value for kind, value in written if kind == ExtractedKind.PULL_REQUEST_COMMENT]
+    assert [(c.comment_id, c.author_aid) for c in comments] == [("10", 2), ("11", None)]
+    commits = [value for kind, value in written if kind == ExtractedKind.PULL_REQUEST_COMMIT]
+    assert [(c.pr_number, c.commit_id[:7]) for c in commits] == [(7, "6dcb09b"), (7, "e83c516"), (8, "7629413")]
+    labels = [value for kind, value in written if kind == ExtractedKind.PULL_REQUEST_LABEL]
+    assert [(label.pr_number, label.name) for label in labels] == [(7, "bug")]
@@ -1,7 +1,11 @@
+import time
 from datetime import datetime
 import pytest
 
 from gitential2.utils import calc_repo_namespace, levenshtein_ratio, split_timerange, add_url_params
+from billiard import Pool  # pylint: disable=no-name-in-module
+
+from gitential2.utils.executors import _first_fitting, _imap_bounded, run_with_memory_budget
 
 
 @pytest.mark.parametrize(
@@ -77,3 +81,51 @@ def test_split_timerange(from_, to_, parts, intervals):
 )
 def test_add_url_params(original, params, expected):
     assert expected == add_url_params(original, params)
+
+
+def _square(value):
+    time.sleep(0.05)
+    return value * value
+
+
+def _fail_on_three(value):
+    if value == 3:
+        raise ValueError("three")
+    return value
+
+
+def test_run_with_memory_budget_returns_results_in_order():
+    results = run_with_memory_budget(
+        _square, [5, 1, 4, 2, 3], estimate_memory_mb=lambda value: value * 100, pool_size=3, memory_budget_mb=500
+    )
+    assert results == [25, 1, 16, 4, 9]
+
+
+def test_run_with_memory_budget_raises_the_first_failure():
+    with pytest.raises(ValueError):
+        run_with_memory_budget(
+            _fail_on_three, [1, 2, 3, 4], estimate_memory_mb=lambda value: 1, pool_size=2, memory_budget_mb=10
+        )
+
+
+def test_first_fitting_skips_items_over_the_budget():
+    assert _first_fitting([("a", 300.0), ("b", 100.0), ("c", 50.0)], 200) == 1
+    assert _first_fitting([("a", 300.0)], 200) is None
+
+
+def test_imap_bounded_limits_the_items_in_flight():
+    submitted = []
+
+    def _items():
+        for value in range(10):
+            submitted.append(value)
+            yield value
+
+    pool = Pool(2)  # pylint: disable=not-callable
+    results = []
+    for result in _imap_bounded(pool, _square, _items(), max_in_flight=3):
+        assert len(submitted) - len(results) <= 4
+        results.append(result)
+    pool.close()
+    pool.join()
+    assert results == [value * value for value in range(10)]